@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Description: 分享链接编解码的微基准
+"""
+生成 N 条 hy2:// / nekoray:// 链接写入临时文件，再用 hy2d.core.links 流式解析并转换，
+输出每秒处理的链接数与进程的峰值常驻内存：
+
+    ```bash
+    python examples/bench_links.py -n 1000000 --to nekoray
+    ```
+
+峰值内存不随 N 增长，说明转换过程是流式的。
+"""
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from hy2d.core import links  # noqa: E402
+
+
+def write_links(path: Path, n: int):
+    with path.open("w", encoding="utf8") as f:
+        for i in range(n):
+            link = links.HysteriaLink(
+                server=f"203.0.{i // 250 % 250}.{i % 250 + 1}",
+                port=10000 + i % 50000,
+                password=f"pw{i:030x}",
+                name=f"node-{i}",
+                sni=f"n{i}.example.com",
+                obfs="salamander" if i % 2 else None,
+                obfs_password=f"ob{i}" if i % 2 else None,
+                mport="20000-30000" if i % 3 == 0 else None,
+            )
+            f.write((link.to_nekoray() if i % 4 == 0 else link.to_uri()) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=200_000, help="链接数量")
+    parser.add_argument("--to", default="hy2", choices=links.OUTPUT_FORMATS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "links.txt"
+        write_links(source, args.n)
+        size = source.stat().st_size
+
+        started = time.perf_counter()
+        count = 0
+        with source.open("r", encoding="utf8") as src, open(os.devnull, "w") as out:
+            for link in links.iter_links(src):
+                out.write(links.format_link(link, args.to) + "\n")
+                count += 1
+        elapsed = time.perf_counter() - started
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"links: {count}, input: {size / 1024 / 1024:.1f} MiB, to: {args.to}")
+    print(f"{count / elapsed:,.0f} links/s ({elapsed:.2f}s), peak RSS {peak_mb:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
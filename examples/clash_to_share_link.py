@@ -10,12 +10,17 @@
 # Author     : QIN2DIM
 # GitHub     : https://github.com/QIN2DIM
 # Description:
+import sys
 from pathlib import Path
 
 import yaml
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from hy2d.core import links  # noqa: E402
+
+# hysteria2 节点由 hy2d.core.links 编码（含 obfs、pinSHA256、端口跳跃等参数）
 type2tpl = {
-    "hysteria2": "hy2://{password}@{server}:{port}?sni={sni}#{name}",
     "anytls": "anytls://{password}@{server}:{port}?sni={sni}#{name}",
 }
 
@@ -43,8 +48,11 @@ def main(
         )
         return
 
-    links = []
+    share_links = []
     for proxy in data.get("proxies", []):
+        if proxy["type"] == "hysteria2":
+            share_links.append(links.HysteriaLink.from_clash_proxy(proxy).to_uri())
+            continue
         if proxy["type"] not in type2tpl:
             continue
         share_link = type2tpl[proxy["type"]].format(
@@ -54,11 +62,10 @@ def main(
             sni=proxy["sni"],
             name=proxy["name"],
         )
-        links.append(share_link)
+        share_links.append(share_link)
 
-    if links:
-        links = sorted(links)
-        fulltext = "\n".join(links)
+    if share_links:
+        fulltext = "\n".join(sorted(share_links))
         links_path.write_text(fulltext, encoding="utf8")
 
         print(fulltext)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# Description: 在本地 Unix socket 上模拟 Docker Engine API，用于验证 hy2d.core.dockerapi
+"""
+在临时目录中启动一个模拟 Docker 守护进程，并用 DockerClient 执行状态查询、启停、重建与日志读取。
+无需安装 Docker，也不需要 root 权限：
+
+    ```bash
+    python examples/fake_docker_socket.py
+    ```
+"""
+
+import hashlib
+import io
+import json
+import os
+import socketserver
+import struct
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from hy2d.core import configs  # noqa: E402
+from hy2d.core.dockerapi import DockerAPIError, DockerClient  # noqa: E402
+
+CONTAINERS: dict[str, dict] = {}
+IMAGES = {"metacubex/mihomo:latest"}
+PULLS: list[str] = []
+CONNECTIONS = set()
+
+
+def _tar_repo_tags(data: bytes) -> set[str]:
+    with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+        repositories = json.load(tar.extractfile("repositories"))
+    return {f"{repo}:{tag}" for repo, tags in repositories.items() for tag in tags}
+
+
+def _image_id(image: str) -> str:
+    return "sha256:" + hashlib.sha256(image.encode()).hexdigest()
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000000000Z", time.gmtime())
+
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        return "unix"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body=None, content_type="application/json"):
+        CONNECTIONS.add(id(self.connection))
+        data = b""
+        if body is not None:
+            data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self, method: str):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = url.path.split("/")[2:]  # 去掉 API 版本前缀
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if parts == ["images", "load"]:
+            # 模拟 `docker save` 的 tar 包：tar 包中的 repositories 文件列出镜像名
+            IMAGES.update(_tar_repo_tags(raw))
+            return self._reply(200, b'{"stream":"Loaded image"}\n')
+        body = json.loads(raw) if raw else None
+
+        if parts == ["_ping"]:
+            return self._reply(200, b"OK", "text/plain")
+        if parts == ["images", "create"]:
+            tag = query.get("tag") or "latest"
+            sep = "@" if tag.startswith("sha256:") else ":"
+            ref = f"{query['fromImage']}{sep}{tag}"
+            IMAGES.add(ref)
+            PULLS.append(ref)
+            return self._reply(200, b'{"status":"Pull complete"}\n')
+        if parts[:1] == ["images"] and parts[-1] == "tag":
+            source = unquote("/".join(parts[1:-1]))
+            if source not in IMAGES:
+                return self._reply(404, {"message": f"No such image: {source}"})
+            IMAGES.add(f"{query['repo']}:{query['tag']}")
+            return self._reply(201)
+        if parts[:1] == ["images"] and parts[-1] == "json":
+            image = unquote("/".join(parts[1:-1]))
+            if image not in IMAGES:
+                return self._reply(404, {"message": f"No such image: {image}"})
+            return self._reply(200, {"Id": _image_id(image), "RepoTags": [image]})
+        if parts == ["containers", "create"]:
+            CONTAINERS[query["name"]] = {
+                "Id": query["name"],
+                "Image": _image_id(body["Image"]),
+                "Config": {**body, "Tty": False},
+                "State": {"Running": False, "Status": "created"},
+            }
+            return self._reply(201, {"Id": query["name"]})
+
+        name = parts[1] if len(parts) > 1 else ""
+        container = CONTAINERS.get(name)
+        if container is None:
+            return self._reply(404, {"message": f"No such container: {name}"})
+        action = parts[2] if len(parts) > 2 else ""
+        state = container["State"]
+        if method == "DELETE":
+            del CONTAINERS[name]
+            return self._reply(204)
+        if action == "json":
+            return self._reply(200, container)
+        if action in ("start", "restart"):
+            state.update(Running=True, Status="running", StartedAt=_now())
+            return self._reply(204)
+        if action == "stop":
+            state.update(Running=False, Status="exited", ExitCode=0, FinishedAt=_now())
+            return self._reply(204)
+        if action == "logs":
+            frames = b""
+            for kind, line in ((1, b"listener started\n"), (2, b"warn: demo\n")):
+                frames += struct.pack(">BxxxL", kind, len(line)) + line
+            return self._reply(200, frames, "application/vnd.docker.raw-stream")
+        return self._reply(404, {"message": "not implemented"})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+
+class FakeDockerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        sock = os.path.join(tmp, "docker.sock")
+        server = FakeDockerServer(sock, FakeDockerHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        client = DockerClient(socket_path=sock)
+        assert client.ping()
+
+        project = Path(tmp) / "hysteria2"
+        compose = configs.build_compose_config("example.com", "metacubex/mihomo:latest")
+        name = compose["services"]["hysteria2-inbound"]["container_name"]
+
+        print("status (missing):", repr(client.container_status(name)))
+        started = time.perf_counter()
+        client.recreate_from_compose(compose, project)
+        print(f"recreate: {(time.perf_counter() - started) * 1000:.1f}ms")
+        print("status:", client.container_status(name))
+        print("binds:", CONTAINERS[name]["Config"]["HostConfig"]["Binds"])
+
+        # 服务定义与镜像均未变化时沿用现有容器，与 `docker compose up -d` 一致
+        created = CONTAINERS[name]["State"]["StartedAt"]
+        client.recreate_from_compose(compose, project)
+        print("unchanged, container kept:", CONTAINERS[name]["State"]["StartedAt"] == created)
+        compose["services"]["hysteria2-inbound"]["volumes"].append("/srv:/srv:ro")
+        client.recreate_from_compose(compose, project)
+        print("changed, binds:", CONTAINERS[name]["Config"]["HostConfig"]["Binds"])
+        compose["services"]["hysteria2-inbound"]["environment"] = {"TZ": "UTC"}
+        try:
+            client.recreate_from_compose(compose, project)
+        except ValueError as e:
+            print("fallback:", e)
+
+        started = time.perf_counter()
+        for _ in range(100):
+            client.container_status(name)
+        print(f"100 x status: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        client.stop(name)
+        print("status after stop:", client.container_status(name))
+        client.start(name)
+        print("logs:", list(client.logs(name)))
+        try:
+            client.start("missing")
+        except DockerAPIError as e:
+            print("error:", e)
+
+        print("connections opened:", len(CONNECTIONS))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
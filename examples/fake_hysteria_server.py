@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# Description: 在本地启动一个模拟的 hysteria2 服务端（自签名证书），用于验证 heyhy probe
+"""
+在 127.0.0.1 上启动模拟节点并用 hy2d.core.probe 探测它：
+
+    ```bash
+    pip install "heyhy[probe]"   # 可选，未安装 aioquic 时只模拟并探测 UDP 版本协商
+    python examples/fake_hysteria_server.py
+    ```
+
+模拟节点的行为：
+- 对未知 QUIC 版本回复 Version Negotiation；
+- 未认证的 HTTP/3 请求返回伪装页面 (200)；
+- 向 https://hysteria/auth 发送正确的 Hysteria-Auth 时返回 233，否则按伪装站点返回 404。
+"""
+
+import asyncio
+import datetime
+import json
+import struct
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from hy2d.core import probe  # noqa: E402
+
+PASSWORD = "correct-horse"
+SNI = "probe.example.com"
+
+
+class VersionNegotiationServer(asyncio.DatagramProtocol):
+    """只会回复版本协商的最小 QUIC 服务端"""
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr):
+        if len(data) < 1200 or not data[0] & 0x80:
+            return
+        dcid_len = data[5]
+        dcid = data[6 : 6 + dcid_len]
+        scid_len = data[6 + dcid_len]
+        scid = data[7 + dcid_len : 7 + dcid_len + scid_len]
+        reply = b"\x80" + b"\x00" * 4 + bytes([len(scid)]) + scid + bytes([len(dcid)]) + dcid
+        self.transport.sendto(reply + struct.pack("!I", 0x00000001), addr)
+
+
+def self_signed_cert(tmp: Path) -> tuple[str, str]:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, SNI)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(SNI)]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = tmp / "cert.pem", tmp / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return str(cert_path), str(key_path)
+
+
+async def serve_h3(port: int, tmp: Path):
+    from aioquic.asyncio import QuicConnectionProtocol, serve
+    from aioquic.h3.connection import H3_ALPN, H3Connection
+    from aioquic.h3.events import HeadersReceived
+    from aioquic.quic.configuration import QuicConfiguration
+
+    class FakeHysteria(QuicConnectionProtocol):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._http = H3Connection(self._quic)
+
+        def quic_event_received(self, event):
+            for h3_event in self._http.handle_event(event):
+                if not isinstance(h3_event, HeadersReceived):
+                    continue
+                headers = dict(h3_event.headers)
+                authed = (
+                    headers.get(b":authority") == b"hysteria"
+                    and headers.get(b":path") == b"/auth"
+                    and headers.get(b"hysteria-auth") == PASSWORD.encode()
+                )
+                if authed:
+                    status, body = b"233", b""
+                elif headers.get(b":path") == b"/":
+                    status, body = b"200", b"<html><title>masquerade</title></html>"
+                else:
+                    status, body = b"404", b"not found"
+                self._http.send_headers(
+                    h3_event.stream_id, [(b":status", status)], end_stream=not body
+                )
+                if body:
+                    self._http.send_data(h3_event.stream_id, body, end_stream=True)
+                self.transmit()
+
+    configuration = QuicConfiguration(is_client=False, alpn_protocols=H3_ALPN)
+    configuration.load_cert_chain(*self_signed_cert(tmp))
+    return await serve("127.0.0.1", port, configuration=configuration, create_protocol=FakeHysteria)
+
+
+async def main():
+    port = 24433
+    with tempfile.TemporaryDirectory() as tmp:
+        if probe.quic_connect is not None:
+            server = await serve_h3(port, Path(tmp))
+            print("fake hysteria2 server (aioquic) on udp/%d" % port)
+        else:
+            loop = asyncio.get_running_loop()
+            server, _ = await loop.create_datagram_endpoint(
+                VersionNegotiationServer, local_addr=("127.0.0.1", port)
+            )
+            print("aioquic 未安装，仅模拟版本协商: udp/%d" % port)
+
+        targets = [
+            probe.ProbeTarget("good", "127.0.0.1", port, SNI, PASSWORD, insecure=True),
+            probe.ProbeTarget("bad-password", "127.0.0.1", port, SNI, "wrong", insecure=True),
+            probe.ProbeTarget("bad-cert", "127.0.0.1", port, SNI, PASSWORD),
+            probe.ProbeTarget("closed-port", "127.0.0.1", port + 1, SNI, PASSWORD),
+        ]
+        results = await probe.aprobe_many(targets, concurrency=4, timeout=2)
+        print(json.dumps([r.to_dict() for r in results], indent=2, ensure_ascii=False))
+        server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
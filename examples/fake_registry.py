@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# Description: 在本地模拟 registry 与 Docker 守护进程，用于验证 hy2d.core.prefetch
+"""
+启动一个需要匿名 Bearer token 的模拟 registry（提供多架构 manifest list）和一个模拟 Docker 守护进程，
+依次验证：按平台选择 manifest、按 digest 拉取并打标签、从 registry 镜像站拉取、
+从 tar 包载入，以及预取之后 DockerRuntime.prepare 不再拉取镜像。
+无需安装 Docker，也不需要访问网络：
+
+    ```bash
+    python examples/fake_registry.py
+    ```
+
+也可以对接真实的本地 registry 容器 (`docker run -d -p 5000:5000 registry:2`)：
+
+    ```bash
+    heyhy prefetch --image localhost:5000/mihomo:latest --platform linux/amd64/v3
+    ```
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "src"))
+sys.path.insert(0, str(ROOT))
+os.environ["HEYHY_BASE_DIR"] = tempfile.mkdtemp(prefix="heyhy-prefetch-")
+
+import fake_docker_socket  # noqa: E402
+from hy2d.core import prefetch  # noqa: E402
+from hy2d.core.runtime import DockerRuntime  # noqa: E402
+
+TOKEN = "demo-token"
+REPOSITORY = "metacubex/mihomo"
+PLATFORMS = [("amd64", None), ("amd64", "v3"), ("arm64", "v8"), ("unknown", None)]
+MANIFESTS = {}
+
+
+def _digest(data: bytes) -> str:
+    return "sha256:" + hashlib.sha256(data).hexdigest()
+
+
+def _build_index() -> bytes:
+    entries = []
+    for arch, variant in PLATFORMS:
+        body = json.dumps({"schemaVersion": 2, "arch": arch, "variant": variant}).encode()
+        MANIFESTS[_digest(body)] = body
+        platform = {"os": "unknown" if arch == "unknown" else "linux", "architecture": arch}
+        if variant:
+            platform["variant"] = variant
+        entries.append({"digest": _digest(body), "size": len(body), "platform": platform})
+    return json.dumps(
+        {
+            "schemaVersion": 2,
+            "mediaType": "application/vnd.oci.image.index.v1+json",
+            "manifests": entries,
+        }
+    ).encode()
+
+
+class RegistryHandler(BaseHTTPRequestHandler):
+    index = _build_index()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        host = f"http://{self.headers['Host']}"
+        if self.path.startswith("/token"):
+            return self._reply(200, json.dumps({"token": TOKEN}).encode())
+        if self.headers.get("Authorization") != f"Bearer {TOKEN}":
+            challenge = (
+                f'Bearer realm="{host}/token",service="fake",'
+                f'scope="repository:{REPOSITORY}:pull"'
+            )
+            return self._reply(401, b"{}", {"WWW-Authenticate": challenge})
+        prefix = f"/v2/{REPOSITORY}/manifests/"
+        if not self.path.startswith(prefix):
+            return self._reply(404, b"{}")
+        reference = self.path[len(prefix) :]
+        body = self.index if reference == "latest" else MANIFESTS.get(reference)
+        if body is None:
+            return self._reply(404, b"{}")
+        media_type = json.loads(body).get("mediaType", "application/vnd.oci.image.manifest.v1+json")
+        return self._reply(
+            200, body, {"Content-Type": media_type, "Docker-Content-Digest": _digest(body)}
+        )
+
+
+def _docker_save_tar(image: str) -> bytes:
+    repo, tag = image.rsplit(":", 1)
+    data = json.dumps({repo: {tag: "0" * 64}}).encode()
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        info = tarfile.TarInfo("repositories")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def main():
+    registry = ThreadingHTTPServer(("127.0.0.1", 0), RegistryHandler)
+    threading.Thread(target=registry.serve_forever, daemon=True).start()
+    address = f"127.0.0.1:{registry.server_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sock = os.path.join(tmp, "docker.sock")
+        docker = fake_docker_socket.FakeDockerServer(sock, fake_docker_socket.FakeDockerHandler)
+        threading.Thread(target=docker.serve_forever, daemon=True).start()
+        os.environ["DOCKER_HOST"] = f"unix://{sock}"
+
+        image = f"{address}/{REPOSITORY}:latest"
+        for target in ("linux/amd64/v1", "linux/amd64/v3", "linux/arm64/v8", "linux/amd64"):
+            resolved = prefetch.resolve(image, prefetch.Platform.parse(target))
+            print(f"{target:16} -> {resolved.platform:16} {resolved.digest[:19]}")
+        try:
+            prefetch.resolve(image, prefetch.Platform.parse("linux/riscv64"))
+        except prefetch.PrefetchError as e:
+            print("error:", e)
+
+        runtime = DockerRuntime()
+        host = prefetch.host_platform()
+        result = prefetch.prefetch_docker(runtime, image, host)
+        print("prefetched:", result["platform"], result["pull_ref"].split("@")[0])
+        print("tagged:", image in fake_docker_socket.IMAGES)
+
+        pulls = len(fake_docker_socket.PULLS)
+        runtime.prepare(image)
+        print("pulls during prepare:", len(fake_docker_socket.PULLS) - pulls)
+        runtime.prepare(image)
+        print("pulls after record consumed:", len(fake_docker_socket.PULLS) - pulls)
+
+        # 以本地 registry 充当 Docker Hub 镜像的镜像站
+        result = prefetch.prefetch_docker(
+            runtime, f"{REPOSITORY}:latest", host, mirror=f"http://{address}"
+        )
+        print("mirror:", result["source"], result["pull_ref"].split("@")[0])
+
+        tarball = Path(tmp) / "mihomo.tar"
+        tarball.write_bytes(_docker_save_tar("metacubex/mihomo:v1.19.0"))
+        result = prefetch.prefetch_docker(
+            runtime, "metacubex/mihomo:v1.19.0", host, tarball=tarball
+        )
+        print("tarball:", result["source"], "metacubex/mihomo:v1.19.0" in fake_docker_socket.IMAGES)
+
+        docker.shutdown()
+    registry.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,100 +3,18 @@
 # Author     : QIN2DIM
 # GitHub     : https://github.com/QIN2DIM
 # Description:
-import base64
-import json
+import os
 import sys
-import urllib.parse
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import List
-from urllib.parse import urlparse
 from uuid import uuid4
+
 import yaml
 
-links_path = Path("links.txt")
-if not links_path.exists():
-    links_path.write_text("")
-    print("--> 从 NekoRay 导出分享链接（NekoLink）到 ./links.txt 文件中")
-    sys.exit()
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
 
-# 从 NekoRay(v3.23) 批量导出 hysteria2 节点的 NekoLink 分享链接
-# nekoray://custom#eyJf ....
-# nekoray://hysteria2#eyjf ...
-neko_links_put = links_path.read_text(encoding="utf8")
-
-
-@dataclass
-class ProxyNode:
-    name: str = field(default=str)
-    type: str = "hysteria2"
-    server: str = field(default=str)
-    port: int = field(default=int)
-    password: str = field(default=str)
-    sni: str = field(default=str)
-    skip_cert_verify: bool = field(default=bool)
-
-    # down: str = "200 mbps"
-    # up: str = "30 mbps"
-
-    def __post_init__(self):
-        sl = f"hy2://{self.password}@{self.server}:{self.port}?sni={self.sni}#{self.name}"
-        print(sl)
-
-    @classmethod
-    def from_neko(cls, link: str):
-        parse_result = urlparse(link.strip())
-
-        match parse_result.scheme:
-            case "hy2" | "hysteria2":
-                password, serv = parse_result.netloc.split("@")
-                serv_addr, serv_port = serv.split(":")
-                query = parse_result.query.split("&")
-                query_unquote = {"sni": ""}
-                for i in query:
-                    if i.startswith("sni"):
-                        query_unquote["sni"] = i.replace("sni=", "")
-                    elif i.startswith("insecure"):
-                        query_unquote["insecure"] = bool(i.replace("insecure=", ""))
-                return cls(
-                    name=urllib.parse.unquote(parse_result.fragment),
-                    server=serv_addr,
-                    port=int(serv_port),
-                    password=password,
-                    sni=query_unquote["sni"],
-                    skip_cert_verify=query_unquote.get("insecure", False),
-                )
-            case "nekoray":
-                code_part = parse_result.fragment
-                metadata = json.loads(base64.b64decode(code_part).decode("utf8"))
-                # 从自定义配置添加的节点
-                if "cs" in metadata:
-                    cs = json.loads(metadata["cs"])
-                    return cls(
-                        name=metadata["name"],
-                        server=metadata["addr"],
-                        port=metadata["port"],
-                        password=cs["auth"],
-                        sni=cs["tls"]["sni"],
-                        skip_cert_verify=cs["tls"]["insecure"],
-                    )
-                # Hysteria2 NekoLink
-                return cls(
-                    name=metadata["name"],
-                    server=metadata["addr"],
-                    port=metadata["port"],
-                    password=metadata["password"],
-                    sni=metadata["sni"],
-                    skip_cert_verify=metadata["allowInsecure"],
-                )
-            case _:
-                pass
-
-    def to_dict(self):
-        c = self.__dict__.copy()
-        del c["skip_cert_verify"]
-        c["skip-cert-verify"] = self.skip_cert_verify
-        return c
+from hy2d.core import links, renderers  # noqa: E402
 
 
 @dataclass
@@ -106,10 +24,8 @@ class BaseProxyGroup:
     proxies: List[str] = field(default_factory=list)
 
     @classmethod
-    def from_proxies(cls, proxies: List[ProxyNode], **kwargs):
-        return cls(
-            name=cls.name, type=cls.type, proxies=[proxy_node.name for proxy_node in proxies]
-        )
+    def from_proxies(cls, proxies: List[dict], **kwargs):
+        return cls(name=cls.name, type=cls.type, proxies=[proxy["name"] for proxy in proxies])
 
 
 @dataclass
@@ -133,29 +49,37 @@ class SpiderProxyGroup(BaseProxyGroup):
     interval: int = 300
 
 
-def parse_neko_links(neko_links: str) -> List[ProxyNode]:
-    neko_links = [
-        i for i in neko_links.split("\n") if i.startswith("nekoray://") or i.startswith("hy2://")
-    ]
-    return [ProxyNode.from_neko(link) for link in neko_links]
+def parse_neko_links(links_path: Path) -> List[dict]:
+    """从 NekoRay 导出的 NekoLink / hy2 分享链接中读取节点"""
+    with links_path.open("r", encoding="utf8") as f:
+        return [link.to_clash_proxy() for link in links.iter_links(f, errors=links.SkippedLines())]
 
 
 def run():
     template_path = Path("templates/clash_config.yaml")
     output_path = Path("clash_verge_config.yaml")
-
-    if not neko_links_put.strip():
+    links_path = Path("links.txt")
+
+    # 从 NekoRay(v3.23) 批量导出 hysteria2 节点的 NekoLink 分享链接
+    # nekoray://custom#eyJf ....
+    # nekoray://hysteria2#eyjf ...
+    if not links_path.exists():
+        links_path.write_text("")
+    proxies = parse_neko_links(links_path)
+    if not proxies:
         print("--> 从 NekoRay 导出分享链接（NekoLink）到 ./links.txt 文件中")
         return
 
-    proxies = parse_neko_links(neko_links_put)
     select_group = SelectProxyGroup.from_proxies(proxies)
     spider_group = SpiderProxyGroup.from_proxies(proxies)
-    proxies = [p.to_dict() for p in proxies]
     groups = [spider_group.__dict__, select_group.__dict__]
 
     config = yaml.safe_load(template_path.read_text(encoding="utf8"))
     config.update({"proxies": proxies, "proxy-groups": groups, "secret": f"{uuid4()}"})
+    # 以订阅端点 (heyhy subscribe) 的共享规则集代替内联规则，例如 HEYHY_RULESET_URL=https://example.com:7443
+    # 模板中的 rules 需与端点的规则（内置规则或 client-rules.yaml）保持一致
+    if ruleset_url := os.environ.get("HEYHY_RULESET_URL"):
+        renderers.use_rule_providers(config, ruleset_url)
     output_path.write_text(yaml.safe_dump(config, sort_keys=False), encoding="utf8")
 
     print(config)
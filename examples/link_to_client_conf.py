@@ -1,5 +1,7 @@
 """
 从节点分享链接生成 client-config.yaml
+
+将 hy2:// / hysteria2:// / nekoray:// 分享链接贴到 ./links.txt 文件中，每行一条，然后运行脚本。
 """
 
 import sys
@@ -8,38 +10,34 @@ from contextlib import suppress
 from pathlib import Path
 
 import yaml
-from urllib3.util import parse_url
 
-links_path = Path("links.txt")
-if not links_path.exists():
-    links_path.write_text("")
-    print("--> 将分享链接贴到 ./links.txt 文件中")
-    sys.exit()
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from hy2d.core import links  # noqa: E402
 
 
-def get_conf(server: str, port: str, auth: str, sni: str):
-    return {
-        "server": f"{server}:{port}",
-        "auth": auth,
-        "tls": {"sni": sni, "insecure": False},
+def get_conf(link: links.HysteriaLink):
+    # https://v2.hysteria.network/zh/docs/advanced/Full-Client-Config/
+    conf = {
+        "server": f"{link.host}:{link.mport or link.port}",
+        "auth": link.password,
+        "tls": {"sni": link.sni, "insecure": link.insecure},
         "fastOpen": True,
         "lazy": True,
         "http": {"listen": "0.0.0.0:2081"},
     }
+    if link.pin_sha256:
+        conf["tls"]["pinSHA256"] = link.pin_sha256
+    if link.obfs:
+        conf["obfs"] = {"type": link.obfs, link.obfs: {"password": link.obfs_password}}
+    return conf
 
 
-def load_links():
-    for link in filter(None, links_path.read_text().strip().split("\n")):
-        parser = parse_url(link.strip())
-        if parser.scheme not in ["hy2", "hysteria2"]:
-            continue
-        print(f"Load {link}")
-        sni = parser.request_uri.split("sni=")[1].split("=")[0]
-        conf_ = get_conf(server=parser.host, port=parser.port, auth=parser.auth, sni=sni)
-
-        filename = parser.fragment or sni
-
-        yield filename, conf_
+def load_links(links_path: Path):
+    with links_path.open("r", encoding="utf8") as f:
+        for link in links.iter_links(f, errors=links.SkippedLines()):
+            print(f"Load {link.to_uri()}")
+            yield link.name or link.sni or link.server, get_conf(link)
 
 
 def output_confs(config_path: Path, conf_: dict):
@@ -47,11 +45,16 @@ def output_confs(config_path: Path, conf_: dict):
         yaml.safe_dump(conf_, file, sort_keys=False)
 
 
-def main():
+def main(links_path: Path = Path("links.txt")):
+    if not links_path.exists():
+        links_path.write_text("")
+        print("--> 将分享链接贴到 ./links.txt 文件中")
+        return
+
     fdr_conf = Path("configs")
     fdr_conf.mkdir(exist_ok=True, parents=True)
 
-    for filename, conf_ in load_links():
+    for filename, conf_ in load_links(links_path):
         config_path = fdr_conf.joinpath(f"{filename}.yaml")
         output_confs(config_path, conf_)
 
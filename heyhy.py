@@ -8,6 +8,7 @@ from __future__ import annotations
 import argparse
 import getpass
 import inspect
+import ipaddress
 import json
 import logging
 import os
@@ -17,6 +18,7 @@ import shutil
 import socket
 import subprocess
 import sys
+import tempfile
 import time
 import urllib.request
 from contextlib import suppress
@@ -116,29 +118,26 @@ def fork_latest_download_url():
         URL = download_url
 
 
-def get_local_ip() -> dict:
-    """获取本机内网IP地址"""
+def get_local_ip(family: int = socket.AF_INET) -> dict:
+    """获取本机指定地址族 (IPv4 / IPv6) 的出口 IP 地址"""
+    probe = ("8.8.8.8", 80) if family == socket.AF_INET else ("2001:4860:4860::8888", 80)
     try:
         # 创建一个临时 socket 连接，获取本机在该连接中使用的 IP
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s = socket.socket(family, socket.SOCK_DGRAM)
         # 连接任意可达的外部地址，不需要真正建立连接
-        s.connect(("8.8.8.8", 80))
+        s.connect(probe)
         ip = s.getsockname()[0]
         s.close()
 
-        # 验证是否为内网 IP
-        if (
-            ip.startswith("10.")
-            or (ip.startswith("172.") and 16 <= int(ip.split(".")[1]) <= 31)
-            or ip.startswith("192.168.")
-        ):
+        # 验证是否为内网 IP（含 IPv6 ULA 与链路本地地址）
+        if ipaddress.ip_address(ip).is_private:
             logging.info(f"定位内网 IP: {ip}")
             return {"ip": ip, "is_local": True, "error": None}
         else:
             logging.info(f"定位公网 IP: {ip}")
             return {"ip": ip, "is_local": False, "error": None}
     except Exception as e:
-        logging.error(f"获取内网 IP 时出错: {str(e)}")
+        logging.debug(f"获取本机 IP 时出错 ({socket.AddressFamily(family).name}): {str(e)}")
         return {"ip": "", "is_local": None, "error": str(e)}
 
 
@@ -148,6 +147,21 @@ def get_cloudflare_reflex_link(gh_release_download_url: str) -> str:
     return gh_release_download_url
 
 
+def atomic_write_text(path: Path, text: str):
+    """写入临时文件并 fsync，然后原子地替换目标文件，避免中途崩溃留下残缺的配置"""
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w", encoding="utf8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
 def turn_cdn_state(state: bool):
     global enable_cdn
     enable_cdn = state
@@ -292,8 +306,10 @@ class Certificate:
 
 
 class CertBot:
-    def __init__(self, domain: str):
+    def __init__(self, domain: str, webroot: str | None = None):
         self._domain = domain
+        # webroot 模式下由已有的 Web 服务响应 ACME 验证，无需停止 80 端口上的进程
+        self._webroot = webroot
 
         self._should_revive_port_80 = False
         self._is_success = True
@@ -314,11 +330,15 @@ class CertBot:
 
         logging.info("正在为解析到本机的域名申请免费证书")
 
-        logging.info("正在更新包索引")
-        os.system("apt update -y > /dev/null 2>&1 ")
+        if not shutil.which("certbot"):
+            logging.info("正在更新包索引")
+            os.system("apt update -y > /dev/null 2>&1 ")
 
-        logging.info("安装 certbot")
-        os.system("apt install certbot -y > /dev/null 2>&1")
+            logging.info("安装 certbot")
+            os.system("apt install certbot -y > /dev/null 2>&1")
+
+        if self._webroot:
+            return
 
         # Pre-hook strategy: stop process running in port 80
         logging.info("检查 80 端口占用")
@@ -343,9 +363,10 @@ class CertBot:
 
     def _run(self):
         logging.info("开始申请证书")
+        authenticator = f"--webroot -w {self._webroot}" if self._webroot else "--standalone"
         cmd = (
             "certbot certonly "
-            "--standalone "
+            "{authenticator} "
             "--register-unsafely-without-email "
             "--agree-tos "
             "--keep "
@@ -353,7 +374,7 @@ class CertBot:
             "-d {domain}"
         )
         p = subprocess.Popen(
-            cmd.format(domain=self._domain).split(),
+            cmd.format(domain=self._domain, authenticator=authenticator).split(),
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
@@ -606,7 +627,7 @@ class ServerConfig:
             sp_bak = sp.parent.joinpath(f"{sp.name}.bak")
             shutil.copyfile(sp, sp_bak)
 
-        sp.write_text(json.dumps(self.__dict__, indent=4, ensure_ascii=True))
+        atomic_write_text(sp, json.dumps(self.__dict__, indent=4, ensure_ascii=True))
         logging.info(f"保存服务端配置文件 - save_path={sp}")
 
     @classmethod
@@ -637,7 +658,8 @@ class NekoRayConfig:
         auth = user.password
         tls = {"sni": server_addr, "insecure": False}
         socks5 = {"listen": "127.0.0.1:%socks_port%"}
-        return cls(server=f"{server_ip}:{server_port}", auth=auth, tls=tls, socks5=socks5)
+        host = f"[{server_ip}]" if ":" in server_ip else server_ip
+        return cls(server=f"{host}:{server_port}", auth=auth, tls=tls, socks5=socks5)
 
     @classmethod
     def from_json(cls, sp: Path):
@@ -645,7 +667,7 @@ class NekoRayConfig:
         return from_dict_to_cls(cls, data)
 
     def to_json(self, sp: Path):
-        sp.write_text(json.dumps(self.__dict__, indent=4, ensure_ascii=True))
+        atomic_write_text(sp, json.dumps(self.__dict__, indent=4, ensure_ascii=True))
 
     @property
     def showcase(self) -> str:
@@ -658,8 +680,8 @@ class NekoRayConfig:
 
     @property
     def serv_peer(self) -> Tuple[str, str]:
-        serv_addr, serv_port = self.server.split(":")
-        return serv_addr, serv_port
+        serv_addr, _, serv_port = self.server.rpartition(":")
+        return serv_addr.strip("[]"), serv_port
 
 
 @dataclass
@@ -695,7 +717,7 @@ class SingBoxConfig:
         return from_dict_to_cls(cls, data)
 
     def to_json(self, sp: Path):
-        sp.write_text(json.dumps(self.__dict__, indent=4, ensure_ascii=True))
+        atomic_write_text(sp, json.dumps(self.__dict__, indent=4, ensure_ascii=True))
 
     @property
     def showcase(self) -> str:
@@ -750,7 +772,7 @@ class ClashMetaConfig:
         return cls(contents=contents)
 
     def to_yaml(self, sp: Path):
-        sp.write_text(self.contents + "\n")
+        atomic_write_text(sp, self.contents + "\n")
 
 
 # =================================== DataModel ===================================
@@ -902,7 +924,7 @@ class Scaffold:
 
         # 调用 certbot 安装证书或跳过已存在的步骤
         if not Path(cert.fullchain).exists():
-            CertBot(domain).run()
+            CertBot(domain, webroot=params.webroot).run()
         else:
             logging.info(f"证书文件已存在 - path={Path(cert.fullchain).parent}")
 
@@ -918,32 +940,39 @@ class Scaffold:
         if not domain:
             domain = input("> 解析到本机的域名：")
 
-        server_ipv4, my_ip = "", ""
+        server_ips, my_ip = set(), ""
+        # 地址族 -> 该地址族的解析结果，即 A 记录 (AF_INET) 与 AAAA 记录 (AF_INET6)
+        records: Dict[int, list] = {}
 
-        # 查詢傳入的域名鏈接的端點 IPv4
+        # 通过 getaddrinfo 同时查询域名的 A 与 AAAA 记录
         try:
-            server_ipv4 = socket.gethostbyname(domain)
-            logging.info(f"定位公网 IP: {server_ipv4}")
+            infos = socket.getaddrinfo(domain, None, proto=socket.IPPROTO_UDP)
+            for info in infos:
+                ip = ipaddress.ip_address(info[4][0]).compressed
+                if ip not in server_ips:
+                    server_ips.add(ip)
+                    records.setdefault(info[0], []).append(ip)
+            logging.info(f"定位公网 IP: {', '.join(sorted(server_ips))}")
         except socket.gaierror:
             logging.error(f"域名不可达或拼写错误的域名 - domain={domain}")
 
-        # 查詢本機訪問公網的 IPv4
-        report = get_local_ip()
-        my_ip = report.get("ip", "")
-
-        if not report.get("error"):
-            # 获取到 IPv4 且为公网 IP
-            if report.get("is_local") is False:
-                if my_ip == server_ipv4:
-                    return domain, server_ipv4
-            # 获取到 IPv4 但为内网 IP
-            elif report.get("is_local") is True and server_ipv4:
-                return domain, server_ipv4
+        # 查詢本機訪問公網的 IPv4 与 IPv6，任一地址族与域名记录一致即可
+        for family in (socket.AF_INET, socket.AF_INET6):
+            report = get_local_ip(family)
+            if report.get("error"):
+                continue
+            my_ip = ipaddress.ip_address(report["ip"]).compressed
+            # 获取到公网 IP 且与域名记录一致
+            if report.get("is_local") is False and my_ip in server_ips:
+                return domain, my_ip
+            # 获取到内网 IP（NAT 之后），无法比较，信任域名解析结果中与探测地址族相同的记录
+            if report.get("is_local") is True and records.get(family):
+                return domain, records[family][0]
 
         # 域名解析错误，应当阻止用户执行安装脚本
-        if not server_ipv4:
+        if not server_ips:
             logging.error(
-                f"你的主机外网IP与域名解析到的IP不一致 - my_ip={my_ip} domain={domain} server_ip={server_ipv4}"
+                f"你的主机外网IP与域名解析到的IP不一致 - my_ip={my_ip} domain={domain} server_ip={server_ips}"
             )
             sys.exit()
 
@@ -1191,6 +1220,7 @@ def run():
     install_parser.add_argument("-d", "--domain", type=str, help="传参指定域名，否则需要在运行脚本后以交互的形式输入")
     install_parser.add_argument("--cert", type=str, help="/path/to/fullchain.pem")
     install_parser.add_argument("--key", type=str, help="/path/to/privkey.pem")
+    install_parser.add_argument("--webroot", type=str, help="使用 80 端口站点的根目录完成证书验证，无需停止 80 端口上的服务")
     install_parser.add_argument("-U", "--upgrade", action="store_true", help="[DEPRECATED]下载最新版预编译文件")
     install_parser.add_argument("-p", "--password", type=str, help="password")
     install_parser.add_argument("--enable-cdn", action="store_true", help="Brokered downloads via Cloudflare Worker")
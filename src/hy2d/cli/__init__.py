@@ -1,5 +1,45 @@
 """CLI 命令模块"""
 
-from . import install, log, remove, start, stop, update, check, self_
+from . import (
+    install,
+    log,
+    remove,
+    start,
+    stop,
+    update,
+    check,
+    self_,
+    fleet,
+    apply,
+    rollback,
+    validate,
+    cert,
+    subscribe,
+    links,
+    probe,
+    masquerade,
+    capacity,
+    prefetch,
+)
 
-__all__ = ["install", "log", "remove", "start", "stop", "update", "check", "self_"]
+__all__ = [
+    "install",
+    "log",
+    "remove",
+    "start",
+    "stop",
+    "update",
+    "check",
+    "self_",
+    "fleet",
+    "apply",
+    "rollback",
+    "validate",
+    "cert",
+    "subscribe",
+    "links",
+    "probe",
+    "masquerade",
+    "capacity",
+    "prefetch",
+]
@@ -0,0 +1,26 @@
+"""Apply 命令"""
+
+from pathlib import Path
+from typing import Annotated
+
+import typer
+
+from hy2d.core.manager import Hysteria2Manager
+
+app = typer.Typer(help="按声明式期望状态文件调和服务，只执行必要的最小变更。")
+
+
+@app.callback(invoke_without_command=True)
+def apply(
+    file: Annotated[Path, typer.Option("-f", "--file", help="期望状态文件 (state.yaml)")],
+    dry_run: Annotated[bool, typer.Option("--dry-run", help="仅打印变更计划，不执行")] = False,
+):
+    """
+    按声明式期望状态文件调和服务。
+
+    比较期望的 listeners、users、镜像与系统调优参数和实际的配置文件及容器状态，
+    先打印变更计划，再执行收敛所需的最小动作（改写文件、热重载或重建容器）。
+    重复执行是幂等的，适合放入 cron 周期运行。
+    """
+    manager = Hysteria2Manager()
+    manager.apply(state_path=file, dry_run=dry_run)
@@ -0,0 +1,79 @@
+"""Capacity 命令"""
+
+import logging
+from typing import Annotated
+
+import typer
+
+from hy2d.core import capacity, output
+
+app = typer.Typer(help="根据本机资源与回环压测估算单节点的用户数与带宽上限。")
+
+
+def _print_report(result: dict, path):
+    from rich.console import Console
+    from rich.table import Table
+
+    host, load, rec = result["host"], result["load"], result["recommendation"]
+    table = Table(title="节点容量估算")
+    table.add_column("项目", justify="right", style="cyan", no_wrap=True)
+    table.add_column("数值", style="magenta")
+    table.add_row("CPU", f"{host['cpu_count']} 核")
+    table.add_row("可用内存", f"{host['memory_available'] / 2**30:.1f} GiB")
+    nic = f"{host['nic_speed']} Mbps" if host["nic_speed"] else "未知"
+    table.add_row("网卡", f"{host['interface'] or '未知'} ({nic})")
+    table.add_row("BBR", "已开启" if host["bbr"] else "未开启")
+    table.add_row("回环吞吐", f"{load['throughput_gbps']:.2f} Gbit/s")
+    table.add_row("CPU/Gbit", f"{load['cpu_per_gbit']:.3f} 核·秒")
+    table.add_row("每连接内存", f"{load['memory_per_connection'] / 1024:.0f} KiB")
+    table.add_row("建议带宽上限", f"[bold green]{rec['bandwidth_mbps']} Mbps[/bold green]")
+    table.add_row(
+        "建议最大用户数",
+        f"[bold green]{rec['max_users']}[/bold green] (瓶颈: {rec['limited_by']})",
+    )
+    console = Console()
+    console.print(table)
+    console.print(
+        f"按每用户 {rec['per_user_mbps']} Mbps、同时活跃比例 {rec['active_ratio']} 估算，"
+        f"结果已保存到 {path}"
+    )
+
+
+@app.callback(invoke_without_command=True)
+def capacity_(
+    duration: Annotated[float, typer.Option("--duration", help="回环压测时长 (秒)")] = 3.0,
+    connections: Annotated[
+        int, typer.Option("--connections", help="测量内存时模拟的并发连接数")
+    ] = 64,
+    per_user_mbps: Annotated[
+        float, typer.Option("--per-user-mbps", help="每个活跃用户的平均带宽 (Mbps)")
+    ] = 20.0,
+    active_ratio: Annotated[
+        float, typer.Option("--active-ratio", help="同时活跃的用户比例 (0-1]")
+    ] = 0.25,
+):
+    """
+    运行短时回环压测，测量 CPU/Gbit 与每连接内存，输出建议的单节点用户数与带宽并保存结果。
+    """
+    if not 0 < active_ratio <= 1 or per_user_mbps <= 0 or duration <= 0 or connections <= 0:
+        logging.error("参数必须为正数，且 --active-ratio 位于 (0, 1] 区间。")
+        raise typer.Exit(code=1)
+
+    try:
+        host = capacity.detect_resources()
+        logging.info(f"正在进行 {duration:g} 秒的回环压测...")
+        load = capacity.run_load(duration, connections, per_user_mbps)
+    except (OSError, RuntimeError) as e:
+        logging.error(f"容量测量失败: {e}")
+        raise typer.Exit(code=1)
+
+    rec = capacity.recommend(host, load, per_user_mbps, active_ratio)
+    for warning in rec.warnings:
+        logging.warning(warning)
+    result = capacity.to_dict(host, load, rec)
+    path = capacity.save(result)
+
+    if output.structured():
+        output.emit("capacity", result)
+    else:
+        _print_report(result, path)
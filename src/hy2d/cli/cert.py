@@ -0,0 +1,48 @@
+"""Cert 命令"""
+
+from pathlib import Path
+from typing import Annotated, Optional
+
+import typer
+
+from hy2d.core.manager import Hysteria2Manager
+
+app = typer.Typer(help="管理 TLS 证书。", no_args_is_help=True)
+
+
+@app.command()
+def status(
+    cert: Annotated[
+        Optional[Path], typer.Option("--cert", help="查看指定 PEM 证书，默认读取服务配置")
+    ] = None,
+):
+    """
+    查看证书有效期。
+    """
+    Hysteria2Manager().cert_status(cert_path=cert)
+
+
+@app.command()
+def renew(
+    force: Annotated[bool, typer.Option("--force", help="即使未临近到期也强制续期")] = False,
+):
+    """
+    续期证书，成功后自动热重载受影响的 listener。
+    """
+    Hysteria2Manager().cert_renew(force=force)
+
+
+@app.command("install-hook")
+def install_hook():
+    """
+    安装 certbot deploy-hook，使自动续期后的证书立即生效。
+    """
+    Hysteria2Manager().cert_install_hook()
+
+
+@app.command("deploy-hook", hidden=True)
+def deploy_hook():
+    """
+    由 certbot 在证书续期成功后调用。
+    """
+    Hysteria2Manager().cert_deploy_hook()
@@ -1,4 +1,6 @@
-"""Start 命令"""
+"""Check 命令"""
+
+from typing import Annotated
 
 import typer
 
@@ -8,9 +10,22 @@ app = typer.Typer(help="检查并输出配置。")
 
 
 @app.callback(invoke_without_command=True)
-def check():
+def check(
+    snapshot: Annotated[
+        bool,
+        typer.Option(
+            "--snapshot",
+            help="优先使用 install/update/check 时保存的快照，不检测公网 IP 或查询服务状态",
+        ),
+    ] = False,
+    refresh: Annotated[
+        bool, typer.Option("--refresh", help="忽略快照，重新采集实时数据并更新快照")
+    ] = False,
+):
     """
-    启动服务。
+    检查服务状态并输出客户端配置。
+
+    快照中的公网 IP 在 24 小时内有效，服务状态在 5 分钟内有效，过期的条目会自动重新采集。
     """
     manager = Hysteria2Manager()
-    manager.check()
+    manager.check(use_snapshot=snapshot, refresh=refresh)
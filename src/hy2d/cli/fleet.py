@@ -0,0 +1,112 @@
+"""Fleet 命令"""
+
+import logging
+from pathlib import Path
+from typing import Annotated, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from hy2d.core import constants
+from hy2d.core.fleet import FleetRunner, load_inventory
+
+app = typer.Typer(help="在 inventory 中的多台主机上并发执行管理命令。", no_args_is_help=True)
+
+# 可在 fleet 中转发的子命令
+FLEET_COMMANDS = {
+    "install": "在所有节点上安装服务（可使用 {domain} 等主机变量）。",
+    "update": "在所有节点上更新服务。",
+    "check": "检查所有节点的服务状态。",
+    "start": "启动所有节点的服务。",
+    "stop": "停止所有节点的服务。",
+    "remove": "移除所有节点的服务。",
+    "version": "查看所有节点的 heyhy 版本。",
+}
+
+
+def _run_fleet(
+    args: list[str], inventory: Path, concurrency: int, timeout: float, limit: Optional[str]
+):
+    console = Console()
+    try:
+        hosts = load_inventory(inventory)
+    except (FileNotFoundError, ValueError, TypeError) as e:
+        logging.error(f"加载 inventory 失败: {e}")
+        raise typer.Exit(code=1)
+
+    if limit:
+        wanted = {name.strip() for name in limit.split(",") if name.strip()}
+        hosts = [h for h in hosts if h.name in wanted]
+    if not hosts:
+        logging.error("没有匹配的主机。")
+        raise typer.Exit(code=1)
+
+    logging.info(f"正在 {len(hosts)} 台主机上执行: heyhy {' '.join(args)}")
+    runner = FleetRunner(hosts, concurrency=concurrency, timeout=timeout)
+
+    results = []
+    for result in runner.run(args):
+        results.append(result)
+        mark = "[green]✔[/green]" if result.ok else "[red]❌[/red]"
+        console.rule(f"{mark} {result.host} ({result.duration:.1f}s)")
+        if result.error:
+            console.print(f"[red]{result.error}[/red]", markup=True)
+        if result.stdout:
+            console.print(result.stdout.rstrip(), markup=False, highlight=False)
+        if result.stderr and not result.ok:
+            console.print(result.stderr.rstrip(), markup=False, highlight=False, style="red")
+
+    table = Table(title="Fleet 执行汇总")
+    table.add_column("主机", style="cyan", no_wrap=True)
+    table.add_column("状态")
+    table.add_column("返回码", justify="right")
+    table.add_column("耗时", justify="right")
+    table.add_column("摘要", overflow="fold")
+    for result in sorted(results, key=lambda r: r.host):
+        status = "[green]✔ 成功[/green]" if result.ok else "[red]❌ 失败[/red]"
+        table.add_row(
+            result.host,
+            status,
+            str(result.returncode),
+            f"{result.duration:.1f}s",
+            result.summary,
+        )
+    console.print(table)
+
+    failed = sum(1 for r in results if not r.ok)
+    console.print(f"成功 {len(results) - failed} / 失败 {failed} / 共 {len(results)}")
+    if failed:
+        raise typer.Exit(code=1)
+
+
+def _register(name: str, help_text: str):
+    @app.command(
+        name,
+        help=help_text,
+        context_settings={"allow_extra_args": True, "ignore_unknown_options": True},
+    )
+    def _command(
+        ctx: typer.Context,
+        inventory: Annotated[
+            Path, typer.Option("-i", "--inventory", help="inventory 文件路径")
+        ] = constants.FLEET_INVENTORY_PATH,
+        concurrency: Annotated[
+            int, typer.Option("-j", "--concurrency", help="最大并发主机数")
+        ] = constants.FLEET_CONCURRENCY,
+        timeout: Annotated[
+            float, typer.Option("--timeout", help="单台主机的执行超时 (秒)")
+        ] = constants.FLEET_COMMAND_TIMEOUT,
+        limit: Annotated[
+            Optional[str], typer.Option("--limit", help="仅在指定主机上执行，逗号分隔")
+        ] = None,
+    ):
+        args = [name] + list(ctx.args)
+        if name == "install" and not any(a in ("-y", "--yes") for a in args):
+            # 远程执行没有交互终端，跳过覆盖确认
+            args.append("--yes")
+        _run_fleet(args, inventory, concurrency, timeout, limit)
+
+
+for _name, _help in FLEET_COMMANDS.items():
+    _register(_name, _help)
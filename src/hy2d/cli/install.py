@@ -5,7 +5,9 @@ from typing import Annotated, Optional
 import typer
 
 from hy2d.core import constants
+from hy2d.core.certs import AcmeOptions
 from hy2d.core.manager import Hysteria2Manager
+from hy2d.core.runtime import Resources, RuntimeConfig
 
 app = typer.Typer(help="安装并启动 Hysteria2 服务。")
 
@@ -28,9 +30,135 @@ def install(
     image: Annotated[
         Optional[str], typer.Option("--image", help="指定用于托管 Hysteria2 server 的服务镜像")
     ] = constants.SERVICE_IMAGE,
+    yes: Annotated[
+        bool, typer.Option("-y", "--yes", help="工作目录已存在时不再确认，直接覆盖")
+    ] = False,
+    verify_image: Annotated[
+        bool,
+        typer.Option("--verify-image", help="在一次性容器中用新镜像试运行新配置后再重启服务"),
+    ] = False,
+    acme_mode: Annotated[
+        str,
+        typer.Option(
+            "--acme-mode",
+            help="证书验证方式: standalone | webroot | dns (webroot/dns 无需占用 80 端口)",
+        ),
+    ] = "standalone",
+    webroot_path: Annotated[
+        Optional[str], typer.Option("--webroot-path", help="webroot 模式下 80 端口站点的根目录")
+    ] = None,
+    dns_plugin: Annotated[
+        Optional[str],
+        typer.Option("--dns-plugin", help="dns 模式使用的 certbot 插件，如 cloudflare"),
+    ] = None,
+    dns_credentials: Annotated[
+        Optional[str], typer.Option("--dns-credentials", help="dns 插件的凭据文件路径")
+    ] = None,
+    acme_server: Annotated[
+        Optional[str],
+        typer.Option("--acme-server", help="自定义 ACME 服务器目录 URL (如 ZeroSSL、内部 CA)"),
+    ] = None,
+    acme_insecure: Annotated[
+        bool,
+        typer.Option(
+            "--acme-insecure", help="不校验 ACME 服务器的 TLS 证书，仅用于 pebble 等测试服务器"
+        ),
+    ] = False,
+    email: Annotated[Optional[str], typer.Option("--email", help="证书账户邮箱 (可选)")] = None,
+    resume: Annotated[
+        bool, typer.Option("--resume/--no-resume", help="从上次中断的步骤继续安装")
+    ] = True,
+    runtime: Annotated[
+        str,
+        typer.Option(
+            "--runtime", help="运行时后端: docker | systemd (systemd 原生运行，无需 Docker)"
+        ),
+    ] = "docker",
+    cpu_affinity: Annotated[
+        Optional[str], typer.Option("--cpu-affinity", help="systemd: 绑定的 CPU，如 0 或 0-1")
+    ] = None,
+    memory_max: Annotated[
+        Optional[str], typer.Option("--memory-max", help="systemd: 内存上限，如 256M")
+    ] = None,
+    limit_nofile: Annotated[
+        int, typer.Option("--limit-nofile", help="systemd: 最大文件描述符数")
+    ] = 1048576,
+    nice: Annotated[
+        Optional[int], typer.Option("--nice", help="systemd: 进程优先级 (-20~19)")
+    ] = None,
+    masquerade: Annotated[
+        str, typer.Option("--masquerade", help="伪装站点 (上游 URL)")
+    ] = constants.MASQUERADE_WEBSITE,
+    masquerade_mirror: Annotated[
+        bool,
+        typer.Option(
+            "--masquerade-mirror/--masquerade-proxy",
+            help="将伪装站点镜像到本地并以静态文件提供，而不是反向代理上游",
+        ),
+    ] = False,
+    obfs: Annotated[
+        Optional[str],
+        typer.Option("--obfs", help="启用流量混淆: salamander (启用后伪装站点不可见)"),
+    ] = None,
+    obfs_password: Annotated[
+        Optional[str], typer.Option("--obfs-password", help="混淆密码 (可选，默认随机生成)")
+    ] = None,
+    alpn: Annotated[Optional[str], typer.Option("--alpn", help="TLS ALPN，逗号分隔，如 h3")] = None,
+    listen: Annotated[
+        Optional[str],
+        typer.Option("--listen", help="监听地址 (可选，默认在启用了 IPv6 的主机上双栈监听 ::)"),
+    ] = None,
+    skip_dns_check: Annotated[
+        bool,
+        typer.Option(
+            "--skip-dns-check", help="跳过安装前的域名解析与 80 端口校验 (如内网测试或 pebble)"
+        ),
+    ] = False,
+    pin_cert: Annotated[
+        bool,
+        typer.Option(
+            "--pin-cert/--no-pin-cert",
+            help="在客户端配置中固定证书指纹 (pinSHA256)，证书续期后需重新分发静态分享链接",
+        ),
+    ] = False,
 ):
     """
     安装并启动 Hysteria2 服务。
     """
     manager = Hysteria2Manager()
-    manager.install(domain=domain, password=password, ip=ip, port=port, image=image)
+    manager.install(
+        domain=domain,
+        password=password,
+        ip=ip,
+        port=port,
+        image=image,
+        assume_yes=yes,
+        verify_image=verify_image,
+        acme=AcmeOptions(
+            mode=acme_mode,
+            webroot_path=webroot_path,
+            dns_plugin=dns_plugin,
+            dns_credentials=dns_credentials,
+            server=acme_server,
+            insecure=acme_insecure,
+            email=email,
+        ),
+        resume=resume,
+        runtime_config=RuntimeConfig(
+            backend=runtime,
+            resources=Resources(
+                cpu_affinity=cpu_affinity,
+                memory_max=memory_max,
+                limit_nofile=limit_nofile,
+                nice=nice,
+            ),
+        ),
+        masquerade_url=masquerade,
+        masquerade_mirror=masquerade_mirror,
+        obfs=obfs,
+        obfs_password=obfs_password,
+        alpn=[p.strip() for p in alpn.split(",") if p.strip()] if alpn else None,
+        pin_certificate=pin_cert,
+        listen=listen,
+        check_dns=not skip_dns_check,
+    )
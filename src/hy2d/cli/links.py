@@ -0,0 +1,94 @@
+"""Links 命令"""
+
+import logging
+import sys
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Annotated, Optional
+
+import typer
+import yaml
+
+from hy2d.core import links
+
+app = typer.Typer(help="分享链接的批量解析与格式转换。", no_args_is_help=True)
+
+INPUT_FORMATS = ("links", "clash")
+
+
+def _read_clash(path: Path):
+    """从 Clash.Meta 配置的 proxies 中读取 hysteria2 节点（YAML 需整体解析，不是流式的）"""
+    data = yaml.safe_load(path.read_text(encoding="utf8")) or {}
+    for proxy in data.get("proxies") or []:
+        if proxy.get("type") == "hysteria2":
+            yield links.HysteriaLink.from_clash_proxy(proxy)
+
+
+@app.command()
+def convert(
+    from_: Annotated[
+        str,
+        typer.Option(
+            "--from",
+            help="输入格式: links (hy2/hysteria2/nekoray 链接，逐行自动识别) | clash",
+        ),
+    ] = "links",
+    to: Annotated[
+        str, typer.Option("--to", help=f"输出格式: {' | '.join(links.OUTPUT_FORMATS)}")
+    ] = "hy2",
+    input_path: Annotated[
+        Optional[Path], typer.Option("-i", "--input", help="输入文件，默认读取标准输入")
+    ] = None,
+    output_path: Annotated[
+        Optional[Path], typer.Option("-o", "--output", help="输出文件，默认写到标准输出")
+    ] = None,
+    strict: Annotated[
+        bool, typer.Option("--strict", help="遇到无法解析的行时立即失败，而不是跳过")
+    ] = False,
+):
+    """
+    转换分享链接格式，逐行流式处理，可用于数百万行的链接文件。
+    """
+    if from_ not in INPUT_FORMATS:
+        logging.error(f"未知的输入格式: {from_}，可选 {', '.join(INPUT_FORMATS)}")
+        raise typer.Exit(code=1)
+    if to not in links.OUTPUT_FORMATS:
+        logging.error(f"未知的输出格式: {to}，可选 {', '.join(links.OUTPUT_FORMATS)}")
+        raise typer.Exit(code=1)
+    if from_ == "clash" and input_path is None:
+        logging.error("--from clash 需要通过 --input 指定配置文件。")
+        raise typer.Exit(code=1)
+
+    errors = None if strict else links.SkippedLines()
+    count = 0
+    with ExitStack() as stack:
+        if from_ == "clash":
+            source = _read_clash(input_path)
+        else:
+            lines = (
+                stack.enter_context(input_path.open("r", encoding="utf8"))
+                if input_path
+                else sys.stdin
+            )
+            source = links.iter_links(lines, errors)
+        out = (
+            stack.enter_context(output_path.open("w", encoding="utf8"))
+            if output_path
+            else sys.stdout
+        )
+
+        if to == "clash":
+            out.write("proxies:\n")
+        try:
+            for link in source:
+                out.write(links.format_link(link, to) + "\n")
+                count += 1
+        except (links.LinkError, KeyError, TypeError, ValueError) as e:
+            logging.error(f"转换失败: {e}")
+            raise typer.Exit(code=1)
+
+    # 结果可能写到标准输出，汇总信息只写到标准错误
+    skipped = len(errors) if errors is not None else 0
+    for lineno, reason in errors.samples if errors is not None else ():
+        typer.echo(f"已跳过第 {lineno} 行: {reason}", err=True)
+    typer.echo(f"已转换 {count} 条链接" + (f"，跳过 {skipped} 行" if skipped else ""), err=True)
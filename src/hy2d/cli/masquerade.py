@@ -0,0 +1,29 @@
+"""Masquerade 命令"""
+
+from typing import Annotated, Optional
+
+import typer
+
+from hy2d.core import constants
+from hy2d.core.manager import Hysteria2Manager
+
+app = typer.Typer(help="管理伪装站点的本地镜像。", no_args_is_help=True)
+
+
+@app.command()
+def sync(
+    source: Annotated[
+        Optional[str],
+        typer.Option("--source", help="上游站点，默认沿用上次同步或当前 listener 的配置"),
+    ] = None,
+    enable: Annotated[
+        bool, typer.Option("--enable", help="同步后将 listener 切换为本地镜像并重建服务")
+    ] = False,
+    max_pages: Annotated[
+        int, typer.Option("--max-pages", help="最多镜像的页面数量")
+    ] = constants.MASQUERADE_MAX_PAGES,
+):
+    """
+    快照并增量刷新伪装站点，未变化的文件不会重新下载。可放入 cron 周期运行。
+    """
+    Hysteria2Manager().masquerade_sync(source=source, enable=enable, max_pages=max_pages)
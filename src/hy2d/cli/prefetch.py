@@ -0,0 +1,97 @@
+"""Prefetch 命令"""
+
+import logging
+from pathlib import Path
+from typing import Annotated, Optional
+
+import typer
+
+from hy2d.core import constants, dockerapi, models, output, prefetch
+from hy2d.core.runtime import create_runtime
+
+app = typer.Typer(help="提前拉取与本机平台匹配的服务镜像，install/update 不再等待 registry。")
+
+
+def _default_image() -> str:
+    """已安装时取服务定义中的镜像，否则为默认镜像"""
+    try:
+        return models.load_service().image
+    except (FileNotFoundError, KeyError, ValueError):
+        return constants.SERVICE_IMAGE
+
+
+@app.callback(invoke_without_command=True)
+def prefetch_(
+    image: Annotated[
+        Optional[str], typer.Option("--image", help="要预取的镜像，默认为当前服务使用的镜像")
+    ] = None,
+    platform: Annotated[
+        Optional[str],
+        typer.Option("--platform", help="目标平台，如 linux/amd64/v3，默认自动识别本机"),
+    ] = None,
+    mirror: Annotated[
+        Optional[str],
+        typer.Option("--mirror", help="从 registry 镜像站拉取，如 registry.example.com:5000"),
+    ] = None,
+    from_tar: Annotated[
+        Optional[Path],
+        typer.Option("--from-tar", help="从 `docker save` 导出的 tar 包载入，无需访问 registry"),
+    ] = None,
+    background: Annotated[
+        bool,
+        typer.Option(
+            "--background",
+            help="在后台运行，输出写入 .cache/prefetch.log；沿用全局 --output，不沿用 --profile",
+        ),
+    ] = False,
+):
+    """
+    解析镜像的 manifest list，按本机平台（含 x86-64 微架构等级）选择并拉取镜像。
+
+    预取完成后，下一次 install / update 直接使用本地镜像。可放入 cron 定期运行。
+    systemd 后端会提前下载 mihomo 二进制。
+    """
+    image = image or _default_image()
+    if mirror and from_tar:
+        logging.error("--mirror 与 --from-tar 不能同时使用。")
+        raise typer.Exit(code=1)
+    if from_tar and not from_tar.is_file():
+        logging.error(f"tar 包不存在: {from_tar}")
+        raise typer.Exit(code=1)
+
+    if background:
+        argv = ["--image", image]
+        for flag, value in (("--platform", platform), ("--mirror", mirror)):
+            if value:
+                argv += [flag, value]
+        if from_tar:
+            argv += ["--from-tar", str(from_tar.resolve())]
+        # --profile / --trace-file 只作用于当前进程，不转发给后台进程
+        pid, log_path = prefetch.start_background(argv, ["--output", output.current()])
+        logging.info(f"已在后台预取 {image} (PID {pid})，日志: {log_path}")
+        output.emit("prefetch", {"image": image, "background": True, "pid": pid})
+        return
+
+    try:
+        target = prefetch.Platform.parse(platform) if platform else prefetch.host_platform()
+    except (ValueError, prefetch.PrefetchError) as e:
+        logging.error(e)
+        raise typer.Exit(code=1)
+
+    runtime = create_runtime()
+    if runtime.name == "systemd":
+        if mirror or from_tar:
+            logging.error("--mirror 与 --from-tar 仅适用于 docker 后端。")
+            raise typer.Exit(code=1)
+        runtime.prepare(image)
+        output.emit("prefetch", {"image": image, "platform": str(target), "source": "release"})
+        return
+
+    logging.info(f"正在为 {target} 预取 {image}...")
+    try:
+        result = prefetch.prefetch_docker(runtime, image, target, mirror=mirror, tarball=from_tar)
+    except (prefetch.PrefetchError, dockerapi.DockerAPIError, OSError) as e:
+        logging.error(f"预取失败: {e}")
+        raise typer.Exit(code=1)
+    logging.info(f"镜像 {image} 已就绪，下一次 install / update 将直接使用。")
+    output.emit("prefetch", result)
@@ -0,0 +1,86 @@
+"""Probe 命令"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Annotated, Optional
+
+import typer
+
+from hy2d.core import constants, links, models, probe
+
+app = typer.Typer(help="并发探测节点的 UDP 可达性、TLS 握手、伪装站点与认证时延。")
+
+
+def _local_targets() -> list[probe.ProbeTarget]:
+    """本机部署的所有 listener，经由域名从公网路径探测"""
+    deployment = models.load_deployment()
+    targets = []
+    for listener in deployment.listeners:
+        _, password = listener.first_user
+        targets.append(
+            probe.ProbeTarget(
+                name=listener.name or deployment.domain,
+                host=deployment.domain,
+                port=listener.port,
+                sni=deployment.domain,
+                password=password,
+                obfs=listener.obfs,
+                obfs_password=listener.obfs_password,
+                masquerade=listener.masquerade,
+            )
+        )
+    return targets
+
+
+@app.callback(invoke_without_command=True)
+def probe_(
+    input_path: Annotated[
+        Optional[Path],
+        typer.Option(
+            "-i", "--input", help="分享链接文件 (hy2/hysteria2/nekoray)，默认探测本机部署"
+        ),
+    ] = None,
+    concurrency: Annotated[
+        int, typer.Option("-j", "--concurrency", help="最大并发探测数")
+    ] = constants.PROBE_CONCURRENCY,
+    timeout: Annotated[
+        float, typer.Option("--timeout", help="单个节点每个阶段的超时 (秒)")
+    ] = constants.PROBE_TIMEOUT,
+    masquerade: Annotated[
+        Optional[str],
+        typer.Option("--masquerade", help="链接中节点的伪装站点，用于对比应答状态码"),
+    ] = None,
+):
+    """
+    探测节点健康状况，结果以 JSON 输出到标准输出；存在失败的节点时返回码为 1。
+    """
+    try:
+        if input_path:
+            with input_path.open("r", encoding="utf8") as f:
+                targets = [
+                    probe.ProbeTarget.from_link(link, masquerade) for link in links.iter_links(f)
+                ]
+        else:
+            targets = _local_targets()
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"加载探测目标失败: {e}")
+        raise typer.Exit(code=1)
+    if not targets:
+        logging.error("没有可探测的节点。")
+        raise typer.Exit(code=1)
+    if probe.quic_connect is None:
+        typer.echo(
+            '未安装 aioquic，仅探测 UDP 可达性。安装 "heyhy[probe]" 以启用完整探测。', err=True
+        )
+
+    results = probe.probe_many(targets, concurrency=concurrency, timeout=timeout)
+    failed = sum(1 for r in results if not r.ok)
+    report = {
+        "total": len(results),
+        "failed": failed,
+        "results": [r.to_dict() for r in results],
+    }
+    typer.echo(json.dumps(report, indent=2, ensure_ascii=False))
+    if failed:
+        raise typer.Exit(code=1)
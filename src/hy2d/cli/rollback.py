@@ -0,0 +1,26 @@
+"""Rollback 命令"""
+
+from typing import Annotated, Optional
+
+import typer
+
+from hy2d.core.manager import Hysteria2Manager
+
+app = typer.Typer(help="将配置回滚到之前的代际。")
+
+
+@app.callback(invoke_without_command=True)
+def rollback(
+    generation: Annotated[
+        Optional[int], typer.Argument(help="目标代际编号 (默认回滚到上一代际)")
+    ] = None,
+    list_only: Annotated[bool, typer.Option("--list", "-l", help="列出所有配置代际")] = False,
+):
+    """
+    将配置回滚到之前的代际。
+
+    每次 install / update / apply 都会以原子写入的方式生成一个新的配置代际。
+    回滚只恢复内容发生变化的文件，并执行最小的重载动作。
+    """
+    manager = Hysteria2Manager()
+    manager.rollback(generation=generation, list_only=list_only)
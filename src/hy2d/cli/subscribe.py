@@ -0,0 +1,76 @@
+"""Subscribe 命令"""
+
+import logging
+from typing import Annotated, Optional
+
+import typer
+
+from hy2d.core import configs, constants, models, utils
+from hy2d.core.subscription import SubscriptionServer, subscription_token
+
+app = typer.Typer(help="启动客户端订阅端点，提供共享规则集与每用户配置。")
+
+
+@app.callback(invoke_without_command=True)
+def subscribe(
+    listen: Annotated[
+        Optional[str],
+        typer.Option("--listen", help="监听地址，默认在启用了 IPv6 的主机上双栈监听 ::"),
+    ] = None,
+    port: Annotated[
+        int, typer.Option("--port", help="监听端口 (TCP)")
+    ] = constants.SUBSCRIPTION_PORT,
+    tls: Annotated[
+        bool, typer.Option("--tls/--no-tls", help="使用服务域名的证书提供 HTTPS")
+    ] = True,
+    public_url: Annotated[
+        Optional[str],
+        typer.Option("--public-url", help="客户端访问订阅端点的基础 URL，默认由域名与端口推导"),
+    ] = None,
+):
+    """
+    启动订阅端点。客户端配置中的规则以 rule-providers 引用共享规则集，不再随每个用户的配置重复下发。
+    """
+    try:
+        deployment = models.load_deployment()
+    except (FileNotFoundError, ValueError, KeyError) as e:
+        logging.error(f"读取服务配置失败: {e}。您是否已经安装了服务？")
+        raise typer.Exit(code=1)
+    if not deployment.secret:
+        logging.error(
+            "服务配置 (config.yaml) 中没有控制器 secret，订阅 token 将可被任何人推算。"
+            "请在 config.yaml 中设置 secret 并重启服务后再启动订阅端点。"
+        )
+        raise typer.Exit(code=1)
+
+    certfile = keyfile = None
+    if tls:
+        certfile, keyfile = configs.cert_paths(deployment.domain)
+    scheme = "https" if tls else "http"
+    base_url = public_url or f"{scheme}://{deployment.domain}:{port}"
+    if listen is None:
+        listen = constants.DUAL_STACK_LISTEN if utils.ipv6_available() else "0.0.0.0"
+
+    try:
+        server = SubscriptionServer(
+            (listen, port), utils.get_public_ip(), base_url, certfile=certfile, keyfile=keyfile
+        )
+    except OSError as e:
+        logging.error(f"启动订阅端点失败: {e}")
+        raise typer.Exit(code=1)
+
+    if not tls:
+        logging.warning("未启用 TLS，订阅内容（含连接密码）将以明文传输。")
+    logging.info(f"订阅端点已启动: {base_url}")
+    secret = deployment.secret
+    for listener in deployment.listeners:
+        for username in listener.users:
+            token = subscription_token(secret, username)
+            logging.info(f"  {username} (:{listener.port}) -> {base_url}/sub/{token}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("订阅端点已停止。")
+    finally:
+        server.server_close()
@@ -17,6 +17,22 @@ def update(
     ] = None,
     port: Annotated[Optional[int], typer.Option("--port", help="更新监听端口")] = None,
     image: Annotated[Optional[str], typer.Option("--image", help="更新服务镜像")] = None,
+    verify_image: Annotated[
+        bool,
+        typer.Option("--verify-image", help="在一次性容器中用新镜像试运行新配置后再重启服务"),
+    ] = False,
+    obfs: Annotated[
+        Optional[str],
+        typer.Option("--obfs", help="启用流量混淆: salamander；none 表示关闭"),
+    ] = None,
+    obfs_password: Annotated[
+        Optional[str], typer.Option("--obfs-password", help="更新混淆密码")
+    ] = None,
+    alpn: Annotated[Optional[str], typer.Option("--alpn", help="TLS ALPN，逗号分隔，如 h3")] = None,
+    pin_cert: Annotated[
+        Optional[bool],
+        typer.Option("--pin-cert/--no-pin-cert", help="在客户端配置中固定证书指纹 (pinSHA256)"),
+    ] = None,
 ):
     """
     更新 Hysteria2 服务。
@@ -27,6 +43,11 @@ def update(
     - `--password`: 更新客户端连接密码。
     - `--port`: 更新服务监听端口。
     - `--image`: 更新使用的 Docker 镜像。
+    - `--obfs` / `--obfs-password`: 启用、关闭 salamander 混淆或更换混淆密码。
+    - `--alpn`: 更新 TLS ALPN。
+    - `--pin-cert`: 在客户端配置中固定服务端证书指纹。
+
+    重启服务之前会先预检新配置，预检失败时不会停止正在运行的实例。
 
     注意：不支持通过此命令修改域名。如需修改域名，请重新运行 `install` 命令。
     """
@@ -39,4 +60,13 @@ def update(
         raise typer.Exit(code=1)
 
     manager = Hysteria2Manager()
-    manager.update(password=password, port=port, image=image)
+    manager.update(
+        password=password,
+        port=port,
+        image=image,
+        verify_image=verify_image,
+        obfs=obfs,
+        obfs_password=obfs_password,
+        alpn=[p.strip() for p in alpn.split(",") if p.strip()] if alpn else None,
+        pin_certificate=pin_cert,
+    )
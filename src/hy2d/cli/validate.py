@@ -0,0 +1,25 @@
+"""Validate 命令"""
+
+from typing import Annotated
+
+import typer
+
+from hy2d.core.manager import Hysteria2Manager
+
+app = typer.Typer(help="预检当前的服务配置。")
+
+
+@app.callback(invoke_without_command=True)
+def validate(
+    verify_image: Annotated[
+        bool, typer.Option("--verify-image", help="在一次性容器中用配置的镜像试运行当前配置")
+    ] = False,
+):
+    """
+    预检当前的服务配置。
+
+    校验 Mihomo listener 与 docker-compose 的结构、UDP 端口、证书与私钥。
+    结果按配置内容哈希缓存，重复预检不会重复执行。
+    """
+    manager = Hysteria2Manager()
+    manager.validate(verify_image=verify_image)
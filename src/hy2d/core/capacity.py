@@ -0,0 +1,327 @@
+"""节点容量规划
+
+根据本机资源与一次短时的回环压测，估算单个节点适合承载的用户数与带宽：
+1. 主机资源：CPU 核数、内存、默认路由网卡的速率，以及 BBR 与 UDP 缓冲区上限等内核参数；
+2. CPU/Gbit：在子进程中运行 UDP 接收端，主进程以 QUIC 常见的包长向回环地址持续发送，
+   以两端消耗的 CPU 时间除以实际收到的流量；
+3. 每连接内存：为每个模拟连接建立一对 UDP 套接字，在接收队列中积压一个 RTT 的在途数据，
+   由 /proc/net/sockstat 读出内核实际占用的缓冲区内存，再加上发送端为重传保留的同等数据量。
+
+回环压测只包含内核 UDP 路径与用户态收发的开销，QUIC 加解密与拥塞控制的额外开销
+以 CAPACITY_QUIC_CPU_FACTOR 折算。结果写入 CAPACITY_PATH，供配额与调优参考。
+"""
+
+import json
+import math
+import multiprocessing
+import os
+import resource
+import socket
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from hy2d.core import constants, journal, tracing, utils
+
+# 与 hysteria2 默认的 QUIC 最大包长相当
+PACKET_SIZE = 1252
+_STOP = b"\x00"
+_SYSCTL_KEYS = (
+    "net.core.default_qdisc",
+    "net.ipv4.tcp_congestion_control",
+    "net.core.rmem_max",
+    "net.core.wmem_max",
+)
+
+
+@dataclass
+class HostResources:
+    cpu_count: int
+    memory_total: int
+    memory_available: int
+    interface: Optional[str] = None
+    # 网卡协商速率 (Mbps)，虚拟网卡通常无法读取
+    nic_speed: Optional[int] = None
+    sysctl: dict[str, Optional[str]] = field(default_factory=dict)
+
+    @property
+    def bbr(self) -> bool:
+        return "bbr" in (self.sysctl.get("net.ipv4.tcp_congestion_control") or "")
+
+    @property
+    def udp_buffer_max(self) -> Optional[int]:
+        values = [self.sysctl.get(k) for k in ("net.core.rmem_max", "net.core.wmem_max")]
+        values = [int(v) for v in values if v and v.isdigit()]
+        return min(values) if values else None
+
+
+@dataclass
+class LoadResult:
+    duration: float
+    bytes_received: int
+    packets_sent: int
+    packets_received: int
+    cpu_seconds: float
+    connections: int
+    # 每个连接的内存占用 (字节)，其中内核部分为实测值
+    kernel_memory_per_connection: int
+    memory_per_connection: int
+    memory_measured: bool
+
+    @property
+    def throughput_gbps(self) -> float:
+        return self.bytes_received * 8 / 1e9 / self.duration if self.duration else 0.0
+
+    @property
+    def cpu_per_gbit(self) -> float:
+        """发送并接收 1 Gbit 数据消耗的 CPU 秒数，即维持 1 Gbit/s 所需的核数"""
+        gbit = self.bytes_received * 8 / 1e9
+        return self.cpu_seconds / gbit if gbit else math.inf
+
+
+@dataclass
+class Recommendation:
+    max_users: int
+    bandwidth_mbps: int
+    per_user_mbps: float
+    active_ratio: float
+    # cpu | memory | nic，决定了 max_users 的瓶颈
+    limited_by: str
+    warnings: list[str] = field(default_factory=list)
+
+
+def _read_meminfo() -> dict[str, int]:
+    info = {}
+    with open("/proc/meminfo", encoding="ascii") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            info[key] = int(value.split()[0]) * 1024
+    return info
+
+
+def _default_interface() -> Optional[str]:
+    try:
+        with open("/proc/net/route", encoding="ascii") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if len(fields) > 2 and fields[1] == "00000000":
+                    return fields[0]
+    except (OSError, StopIteration):
+        pass
+    return None
+
+
+def _nic_speed(interface: Optional[str]) -> Optional[int]:
+    if not interface:
+        return None
+    try:
+        speed = int(Path(f"/sys/class/net/{interface}/speed").read_text().strip())
+    except (OSError, ValueError):
+        return None
+    # 未协商或虚拟网卡返回 -1
+    return speed if speed > 0 else None
+
+
+def detect_resources() -> HostResources:
+    meminfo = _read_meminfo()
+    interface = _default_interface()
+    try:
+        cpu_count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpu_count = os.cpu_count() or 1
+    return HostResources(
+        cpu_count=cpu_count,
+        memory_total=meminfo.get("MemTotal", 0),
+        memory_available=meminfo.get("MemAvailable", meminfo.get("MemFree", 0)),
+        interface=interface,
+        nic_speed=_nic_speed(interface),
+        sysctl=utils.read_sysctl(_SYSCTL_KEYS),
+    )
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _receiver(sock: socket.socket, conn):
+    """子进程：接收数据直到收到停止包，回报收到的字节数、包数与消耗的 CPU 时间"""
+    started = _cpu_seconds()
+    received = packets = 0
+    buffer = bytearray(65535)
+    while True:
+        n = sock.recv_into(buffer)
+        if n == len(_STOP) and buffer[0] == 0:
+            break
+        received += n
+        packets += 1
+    conn.send((received, packets, _cpu_seconds() - started))
+    conn.close()
+
+
+def _measure_throughput(duration: float) -> tuple[int, int, int, float, float]:
+    ctx = multiprocessing.get_context("fork")
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    parent, child = ctx.Pipe(duplex=False)
+    worker = ctx.Process(target=_receiver, args=(server, child), daemon=True)
+    worker.start()
+    child.close()
+
+    payload = os.urandom(PACKET_SIZE)
+    sent = 0
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+        client.connect(server.getsockname())
+        cpu_started = _cpu_seconds()
+        started = time.monotonic()
+        deadline = started + duration
+        while time.monotonic() < deadline:
+            # 每批发送若干个包后再检查时间，减少计时本身的开销
+            for _ in range(64):
+                client.send(payload)
+            sent += 64
+        elapsed = time.monotonic() - started
+        client_cpu = _cpu_seconds() - cpu_started
+        # 停止包可能因为接收队列已满被丢弃，重试直到接收端退出
+        while worker.is_alive():
+            client.send(_STOP)
+            worker.join(0.05)
+    server.close()
+    if not parent.poll(1):
+        raise RuntimeError("回环压测的接收进程异常退出。")
+    received, packets, server_cpu = parent.recv()
+    return received, sent, packets, client_cpu + server_cpu, elapsed
+
+
+def _sockstat_udp_memory() -> Optional[int]:
+    """/proc/net/sockstat 中 UDP 套接字占用的内存 (字节)"""
+    try:
+        with open("/proc/net/sockstat", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("UDP:"):
+                    fields = line.split()
+                    return int(fields[fields.index("mem") + 1]) * resource.getpagesize()
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _measure_connection_memory(connections: int, inflight: int) -> tuple[int, bool]:
+    """返回每个连接积压 inflight 字节时内核缓冲区的占用，以及该值是否为实测"""
+    packets = max(1, inflight // PACKET_SIZE)
+    payload = os.urandom(PACKET_SIZE)
+    sockets = []
+    before = _sockstat_udp_memory()
+    try:
+        for _ in range(connections):
+            receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sockets += [receiver, sender]
+            receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, inflight * 2)
+            receiver.bind(("127.0.0.1", 0))
+            sender.connect(receiver.getsockname())
+            sender.setblocking(False)
+            for _ in range(packets):
+                try:
+                    sender.send(payload)
+                except BlockingIOError:
+                    break
+        after = _sockstat_udp_memory()
+    finally:
+        for s in sockets:
+            s.close()
+    if before is None or after is None or after <= before:
+        # 无法读取时按内核 skb 的典型开销 (约为负载的两倍) 估算
+        return inflight * 2, False
+    return (after - before) // connections, True
+
+
+@tracing.traced("capacity_load", "compute")
+def run_load(duration: float, connections: int, per_user_mbps: float) -> LoadResult:
+    inflight = int(per_user_mbps * 1e6 / 8 * constants.CAPACITY_RTT)
+    received, sent, packets, cpu_seconds, elapsed = _measure_throughput(duration)
+    kernel_memory, measured = _measure_connection_memory(connections, inflight)
+    return LoadResult(
+        duration=elapsed,
+        bytes_received=received,
+        packets_sent=sent,
+        packets_received=packets,
+        cpu_seconds=cpu_seconds,
+        connections=connections,
+        kernel_memory_per_connection=kernel_memory,
+        # 发送端需要为尚未确认的在途数据保留同等大小的重传缓冲
+        memory_per_connection=kernel_memory + inflight,
+        memory_measured=measured,
+    )
+
+
+def recommend(
+    host: HostResources, load: LoadResult, per_user_mbps: float, active_ratio: float
+) -> Recommendation:
+    headroom = constants.CAPACITY_HEADROOM
+    warnings = []
+
+    cores_per_gbit = load.cpu_per_gbit * constants.CAPACITY_QUIC_CPU_FACTOR
+    limits = {"cpu": host.cpu_count / cores_per_gbit * 1000 * headroom}
+    if host.nic_speed:
+        limits["nic"] = host.nic_speed * headroom
+    else:
+        warnings.append("无法读取网卡速率，带宽上限仅由 CPU 估算，请结合服务商标称带宽核对。")
+    limited_by = min(limits, key=limits.get)
+    bandwidth = limits[limited_by]
+
+    users = {
+        limited_by: bandwidth / (per_user_mbps * active_ratio),
+        "memory": host.memory_available * headroom / (load.memory_per_connection * active_ratio),
+    }
+    bottleneck = min(users, key=users.get)
+
+    if not host.bbr:
+        warnings.append("BBR 未开启，高延迟或有丢包的链路上实际吞吐会明显低于估算值。")
+    inflight = per_user_mbps * 1e6 / 8 * constants.CAPACITY_RTT
+    buffer_max = host.udp_buffer_max
+    if buffer_max is not None and buffer_max < inflight:
+        warnings.append(
+            f"net.core.rmem_max/wmem_max ({buffer_max}) 小于单连接的在途数据量 ({inflight:.0f})，"
+            "QUIC 接收窗口会受限，建议在期望状态的 tuning.sysctl 中调大。"
+        )
+    if not load.memory_measured:
+        warnings.append("无法读取 /proc/net/sockstat，每连接内存为估算值。")
+
+    return Recommendation(
+        max_users=max(0, math.floor(users[bottleneck])),
+        bandwidth_mbps=math.floor(bandwidth),
+        per_user_mbps=per_user_mbps,
+        active_ratio=active_ratio,
+        limited_by=bottleneck,
+        warnings=warnings,
+    )
+
+
+def to_dict(host: HostResources, load: LoadResult, rec: Recommendation) -> dict:
+    return {
+        "time": time.time(),
+        "host": {**asdict(host), "bbr": host.bbr},
+        "load": {
+            **asdict(load),
+            "throughput_gbps": round(load.throughput_gbps, 3),
+            "cpu_per_gbit": round(load.cpu_per_gbit, 4),
+        },
+        "recommendation": asdict(rec),
+    }
+
+
+def save(result: dict) -> Path:
+    path = constants.CAPACITY_PATH
+    journal.atomic_write(path, json.dumps(result, indent=2, ensure_ascii=False))
+    return path
+
+
+def load() -> Optional[dict]:
+    """读取上一次 capacity 的结果，不存在时返回 None"""
+    try:
+        return json.loads(constants.CAPACITY_PATH.read_text(encoding="utf8"))
+    except (FileNotFoundError, ValueError):
+        return None
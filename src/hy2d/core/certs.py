@@ -0,0 +1,283 @@
+"""TLS 证书：解析、申请参数与续期钩子"""
+
+import calendar
+import hashlib
+import os
+import shlex
+import ssl
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from hy2d.core import constants, journal
+
+ACME_MODES = ("standalone", "webroot", "dns")
+
+_LIVE_NAMES = {"certificate": "fullchain.pem", "private-key": "privkey.pem"}
+
+# X.509 中常见的 RDN 属性，名称与 ssl.getpeercert() 的输出一致
+_ATTRIBUTE_NAMES = {
+    "2.5.4.3": "commonName",
+    "2.5.4.5": "serialNumber",
+    "2.5.4.6": "countryName",
+    "2.5.4.7": "localityName",
+    "2.5.4.8": "stateOrProvinceName",
+    "2.5.4.10": "organizationName",
+    "2.5.4.11": "organizationalUnitName",
+    "2.5.4.97": "organizationIdentifier",
+    "1.2.840.113549.1.9.1": "emailAddress",
+}
+_OID_SUBJECT_ALT_NAME = "2.5.29.17"
+# GeneralName 中 dNSName 的标签: [2] IMPLICIT IA5String
+_TAG_DNS_NAME = 0x82
+_TAG_UTC_TIME = 0x17
+
+
+@dataclass
+class CertInfo:
+    path: Path
+    subject: str
+    issuer: str
+    not_before: float
+    not_after: float
+    san: list[str]
+
+    @property
+    def days_left(self) -> float:
+        return (self.not_after - time.time()) / 86400
+
+    @property
+    def expired(self) -> bool:
+        return self.not_after <= time.time()
+
+
+def _tlv(data: bytes, offset: int = 0) -> tuple[int, bytes, int]:
+    """读取 offset 处的一个 DER 元素，返回 (标签, 内容, 下一个元素的偏移)"""
+    try:
+        tag, length = data[offset], data[offset + 1]
+        offset += 2
+        if length & 0x80:
+            size = length & 0x7F
+            length = int.from_bytes(data[offset : offset + size], "big")
+            offset += size
+    except IndexError:
+        raise ValueError("DER 数据被截断") from None
+    if offset + length > len(data):
+        raise ValueError("DER 数据被截断")
+    return tag, data[offset : offset + length], offset + length
+
+
+def _children(data: bytes) -> list[tuple[int, bytes]]:
+    items, offset = [], 0
+    while offset < len(data):
+        tag, value, offset = _tlv(data, offset)
+        items.append((tag, value))
+    return items
+
+
+def _oid(value: bytes) -> str:
+    first = min(value[0] // 40, 2)
+    parts = [first, value[0] - 40 * first]
+    n = 0
+    for byte in value[1:]:
+        n = (n << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(n)
+            n = 0
+    return ".".join(map(str, parts))
+
+
+def _name(value: bytes) -> str:
+    """Name: SEQUENCE OF SET OF SEQUENCE { type OID, value 字符串 }"""
+    attributes = []
+    for _, rdn in _children(value):
+        for _, pair in _children(rdn):
+            (_, oid), (_, text) = _children(pair)[:2]
+            key = _ATTRIBUTE_NAMES.get(_oid(oid), _oid(oid))
+            attributes.append(f"{key}={text.decode('utf8', 'replace')}")
+    return ", ".join(attributes)
+
+
+def _time(tag: int, value: bytes) -> float:
+    text = value.decode("ascii")
+    if tag == _TAG_UTC_TIME:
+        # UTCTime: YYMMDDHHMMSSZ，50 及以上表示 19xx 年
+        year = int(text[:2])
+        text = f"{1900 + year if year >= 50 else 2000 + year}{text[2:]}"
+    return calendar.timegm(time.strptime(text[:14], "%Y%m%d%H%M%S"))
+
+
+def _dns_names(extensions: bytes) -> list[str]:
+    for _, extension in _children(extensions):
+        fields = _children(extension)
+        if _oid(fields[0][1]) != _OID_SUBJECT_ALT_NAME:
+            continue
+        # extnValue 为 OCTET STRING，其中是 GeneralNames 的 DER 编码
+        _, names, _ = _tlv(fields[-1][1])
+        return [v.decode("ascii") for tag, v in _children(names) if tag == _TAG_DNS_NAME]
+    return []
+
+
+def _leaf_der(path: Path) -> bytes:
+    text = Path(path).read_text(encoding="ascii")
+    end = text.find(ssl.PEM_FOOTER)
+    if text.find(ssl.PEM_HEADER) < 0 or end < 0:
+        raise ValueError(f"无法解析证书 {path}: 未找到 PEM 证书")
+    return ssl.PEM_cert_to_DER_cert(text[: end + len(ssl.PEM_FOOTER)])
+
+
+def load_cert_info(path: Path) -> CertInfo:
+    """
+    解析 PEM 证书（证书链中的第一张，即叶子证书）。
+    只读取 TBSCertificate 中用到的字段，无需额外依赖。
+    """
+    path = Path(path)
+    if not path.is_file():
+        raise FileNotFoundError(str(path))
+    der = _leaf_der(path)
+    try:
+        _, certificate, _ = _tlv(der)
+        _, tbs, _ = _tlv(certificate)
+        fields = _children(tbs)
+        # version 为可选的 [0]，其后依次是 serialNumber、signature、issuer、validity、subject
+        if fields[0][0] == 0xA0:
+            fields = fields[1:]
+        issuer, validity, subject = fields[2][1], fields[3][1], fields[4][1]
+        not_before, not_after = _children(validity)[:2]
+        # extensions 为 [3]，仅 v3 证书存在
+        extensions = next((v for tag, v in fields[6:] if tag == 0xA3), None)
+        return CertInfo(
+            path=path,
+            subject=_name(subject),
+            issuer=_name(issuer),
+            not_before=_time(*not_before),
+            not_after=_time(*not_after),
+            san=_dns_names(_tlv(extensions)[1]) if extensions else [],
+        )
+    except (IndexError, ValueError) as e:
+        raise ValueError(f"无法解析证书 {path}: {e}") from None
+
+
+def cert_sha256(path: Path) -> str:
+    """
+    叶子证书 (DER) 的 SHA-256 指纹，小写十六进制。
+    即 hysteria2 客户端的 pinSHA256 与 Mihomo 的 fingerprint；证书续期后指纹随之改变。
+    """
+    return hashlib.sha256(_leaf_der(path)).hexdigest()
+
+
+@dataclass
+class AcmeOptions:
+    """
+    证书申请方式。
+    - standalone: certbot 临时监听 80 端口（需要 80 端口空闲）；
+    - webroot: 将验证文件写入已有 Web 服务的站点目录，无需停止占用 80 端口的服务；
+    - dns: 通过 DNS-01 验证（需要安装对应的 certbot-dns-<plugin> 插件），无需 80 端口。
+    """
+
+    mode: str = "standalone"
+    webroot_path: Optional[str] = None
+    dns_plugin: Optional[str] = None
+    dns_credentials: Optional[str] = None
+    server: Optional[str] = None
+    email: Optional[str] = None
+    # 跳过 ACME 服务器的 TLS 证书校验，仅用于 pebble 等本地测试服务器
+    insecure: bool = False
+
+    def validate(self):
+        if self.mode not in ACME_MODES:
+            raise ValueError(f"不支持的证书申请方式: {self.mode}，可选 {', '.join(ACME_MODES)}")
+        if self.mode == "webroot" and not self.webroot_path:
+            raise ValueError("webroot 模式需要指定 --webroot-path。")
+        if self.mode == "dns" and not self.dns_plugin:
+            raise ValueError("dns 模式需要指定 --dns-plugin (例如 cloudflare)。")
+
+    def certbot_args(self, domain: str) -> list[str]:
+        args = ["certbot", "certonly", "--agree-tos", "--non-interactive", "--keep"]
+        if self.mode == "webroot":
+            args += ["--webroot", "-w", self.webroot_path]
+        elif self.mode == "dns":
+            args += [f"--dns-{self.dns_plugin}"]
+            if self.dns_credentials:
+                args += [f"--dns-{self.dns_plugin}-credentials", self.dns_credentials]
+        else:
+            args += ["--standalone"]
+        if self.email:
+            args += ["-m", self.email]
+        else:
+            args += ["--register-unsafely-without-email"]
+        if self.server:
+            # 自定义 ACME 服务器，例如 ZeroSSL、内部 CA 或用于测试的 pebble
+            args += ["--server", self.server]
+        if self.insecure:
+            args += ["--no-verify-ssl"]
+        return args + ["-d", domain]
+
+
+DEPLOY_HOOK_TEMPLATE = """#!/bin/sh
+# Installed by heyhy: reload the listeners that use a renewed certificate.
+HEYHY_BASE_DIR={base_dir} exec {python} -m hy2d.main cert deploy-hook
+"""
+
+
+def install_deploy_hook() -> Path:
+    """安装 certbot deploy-hook，证书续期后自动热重载受影响的 listener"""
+    script = DEPLOY_HOOK_TEMPLATE.format(
+        base_dir=shlex.quote(str(constants.BASE_DIR)), python=shlex.quote(sys.executable)
+    )
+    path = constants.CERTBOT_DEPLOY_HOOK_PATH
+    if not path.is_file() or path.read_text(encoding="utf8") != script:
+        journal.atomic_write(path, script, mode=0o755)
+    return path
+
+
+def affected_listeners(mihomo_cfg: dict, lineage: str) -> list[dict]:
+    """返回使用了指定证书目录 (RENEWED_LINEAGE) 的 listener"""
+    lineage = os.path.realpath(lineage)
+    archive = lineage.replace("/live/", "/archive/")
+    affected = []
+    for listener in mihomo_cfg.get("listeners") or []:
+        if not listener.get("certificate"):
+            continue
+        cert = os.path.realpath(listener["certificate"])
+        if cert.startswith(lineage + os.sep) or cert.startswith(archive + os.sep):
+            affected.append(listener)
+    return affected
+
+
+def pin_renewed_certificate(listener: dict):
+    """
+    将 listener 的证书路径固定为续期后的实际文件 (archive/<name>/fullchainN.pem)。
+    只有路径发生变化的 listener 会在热重载时被重建，其余 listener 的连接不受影响。
+    """
+    for key in ("certificate", "private-key"):
+        path = listener.get(key)
+        if not path:
+            continue
+        lineage = os.path.dirname(path).replace("/archive/", "/live/")
+        live = os.path.join(lineage, _LIVE_NAMES.get(key, os.path.basename(path)))
+        listener[key] = os.path.realpath(live)
+
+
+def keep_pinned_paths(listeners: list[dict], current: list[dict]):
+    """
+    pin_renewed_certificate 把证书路径固定为 archive/ 下的实际文件，而期望状态始终使用 live/ 路径。
+    两者指向同一文件时沿用当前路径，apply 不会把续期后的配置当作漂移；
+    live/ 已指向更新的证书（deploy-hook 未运行）时仍使用 live/ 路径，由热重载换上新证书。
+    """
+    pinned = {(item.get("name"), item.get("port")): item for item in current}
+    for listener in listeners:
+        old = pinned.get((listener.get("name"), listener.get("port")))
+        if not old:
+            continue
+        for key in _LIVE_NAMES:
+            path, current_path = listener.get(key), old.get(key)
+            if (
+                path
+                and current_path
+                and path != current_path
+                and os.path.realpath(path) == os.path.realpath(current_path)
+            ):
+                listener[key] = current_path
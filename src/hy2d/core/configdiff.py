@@ -0,0 +1,96 @@
+"""配置的字段级差异
+
+逐字段比较修改前后的 Mihomo / Docker Compose / 客户端选项字典，
+按路径规则把每一处变化归类为 ServiceAction 中的一级，调用方只需执行所有变化中代价最高的动作：
+- NOOP: 只影响客户端配置，服务端无需任何操作；
+- RELOAD: listener 的变化可以通过 external-controller 热重载；
+- RESTART: external-controller 自身的地址或密钥变化，热重载接口无法生效；
+- RECREATE: 镜像、挂载等服务定义的变化需要重建服务。
+"""
+
+import fnmatch
+from dataclasses import dataclass
+from typing import Any
+
+from hy2d.core.reconciler import ServiceAction
+
+# (路径模式, 动作)，按顺序匹配第一条；路径以 "." 分隔，列表下标写作 [i]
+MIHOMO_RULES = (
+    ("external-controller", ServiceAction.RESTART),
+    ("secret", ServiceAction.RESTART),
+    ("listeners*", ServiceAction.RELOAD),
+    ("*", ServiceAction.RELOAD),
+)
+COMPOSE_RULES = (("*", ServiceAction.RECREATE),)
+CLIENT_OPTIONS_RULES = (("*", ServiceAction.NOOP),)
+
+# 输出差异时需要隐藏取值的字段
+_SECRET_PATTERNS = ("secret", "*.obfs-password", "*.users.*", "*.users")
+
+_MISSING = object()
+
+
+@dataclass
+class FieldChange:
+    source: str
+    path: str
+    old: Any
+    new: Any
+    action: ServiceAction
+
+    @property
+    def kind(self) -> str:
+        if self.old is _MISSING:
+            return "added"
+        if self.new is _MISSING:
+            return "removed"
+        return "changed"
+
+    def to_dict(self) -> dict:
+        secret = any(fnmatch.fnmatchcase(self.path, p) for p in _SECRET_PATTERNS)
+
+        def show(value):
+            if value is _MISSING:
+                return None
+            return "***" if secret else value
+
+        return {
+            "source": self.source,
+            "path": self.path,
+            "kind": self.kind,
+            "old": show(self.old),
+            "new": show(self.new),
+            "action": self.action.name.lower(),
+        }
+
+
+def _walk(old: Any, new: Any, path: str):
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in [*old, *(k for k in new if k not in old)]:
+            child = f"{path}.{key}" if path else str(key)
+            yield from _walk(old.get(key, _MISSING), new.get(key, _MISSING), child)
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        # 长度变化的列表（如增删 listener）作为一个整体报告
+        for i, (a, b) in enumerate(zip(old, new)):
+            yield from _walk(a, b, f"{path}[{i}]")
+    elif old != new:
+        yield path, old, new
+
+
+def _classify(path: str, rules) -> ServiceAction:
+    for pattern, action in rules:
+        if fnmatch.fnmatchcase(path, pattern):
+            return action
+    return ServiceAction.RECREATE
+
+
+def diff(source: str, old: Any, new: Any, rules) -> list[FieldChange]:
+    """比较两个已解析的配置，返回所有叶子字段的变化"""
+    return [
+        FieldChange(source, path, a, b, _classify(path, rules))
+        for path, a, b in _walk(old, new, "")
+    ]
+
+
+def required_action(changes: list[FieldChange]) -> ServiceAction:
+    return max((c.action for c in changes), default=ServiceAction.NOOP)
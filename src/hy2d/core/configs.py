@@ -0,0 +1,136 @@
+"""服务端配置（Mihomo / Docker Compose）的构建与读写"""
+
+import copy
+import hashlib
+import secrets
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from hy2d.core import tracing
+from hy2d.core.constants import (
+    COMPOSE_CONTAINER_PREFIX,
+    COMPOSE_SERVICE_NAME,
+    MASQUERADE_WEBSITE,
+    MIHOMO_CONTROLLER_ADDR,
+    MIHOMO_LISTEN_TYPE,
+    MIHOMO_LISTENER_NAME_PREFIX,
+)
+
+
+def cert_paths(domain: str) -> tuple[str, str]:
+    """返回 certbot 为域名签发的证书链与私钥路径"""
+    return (
+        f"/etc/letsencrypt/live/{domain}/fullchain.pem",
+        f"/etc/letsencrypt/live/{domain}/privkey.pem",
+    )
+
+
+def build_listener(
+    *,
+    domain: str,
+    port: int,
+    users: dict[str, str],
+    name: Optional[str] = None,
+    listen: str = "0.0.0.0",
+    masquerade: str = MASQUERADE_WEBSITE,
+    obfs: Optional[str] = None,
+    obfs_password: Optional[str] = None,
+    alpn: Optional[list[str]] = None,
+) -> dict:
+    """构建单个 Mihomo hysteria2 listener"""
+    fullchain, privkey = cert_paths(domain)
+    listener = {
+        "name": name or f"{MIHOMO_LISTENER_NAME_PREFIX}{port}",
+        "type": MIHOMO_LISTEN_TYPE,
+        "port": port,
+        "listen": listen,
+        "users": dict(users),
+        "masquerade": masquerade,
+        "certificate": fullchain,
+        "private-key": privkey,
+    }
+    if obfs:
+        listener["obfs"] = obfs
+        listener["obfs-password"] = obfs_password
+    if alpn:
+        listener["alpn"] = list(alpn)
+    return listener
+
+
+def build_mihomo_config(listeners: list[dict], controller_secret: Optional[str] = None) -> dict:
+    """
+    构建 Mihomo 配置。
+    external-controller 仅绑定本机回环地址，用于配置热重载。
+    """
+    return {
+        "external-controller": MIHOMO_CONTROLLER_ADDR,
+        "secret": controller_secret or secrets.token_hex(16),
+        "listeners": listeners,
+    }
+
+
+def build_compose_config(domain: str, image: str, masquerade_dir: Optional[Path] = None) -> dict:
+    """
+    构建 docker-compose 配置。
+    使用本地镜像的伪装站点时，镜像目录以只读方式挂载到容器内相同的绝对路径。
+    """
+    compose = {
+        "services": {
+            COMPOSE_SERVICE_NAME: {
+                "image": image,
+                "container_name": f"{COMPOSE_CONTAINER_PREFIX}{domain}",
+                "restart": "always",
+                "network_mode": "host",
+                "working_dir": "/app/proxy-inbound/",
+                "volumes": [
+                    "/etc/letsencrypt/:/etc/letsencrypt/",
+                    "./config.yaml:/app/proxy-inbound/config.yaml",
+                ],
+                "command": ["-f", "config.yaml", "-d", "/"],
+            }
+        }
+    }
+    if masquerade_dir:
+        volumes = compose["services"][COMPOSE_SERVICE_NAME]["volumes"]
+        volumes.append(f"{masquerade_dir}:{masquerade_dir}:ro")
+    return compose
+
+
+def dump_yaml(data) -> str:
+    """以稳定的键顺序序列化为 YAML 文本，保证相同内容得到相同的哈希"""
+    with tracing.span("dump_yaml", "yaml"):
+        return yaml.dump(data, sort_keys=False, allow_unicode=True)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf8")).hexdigest()
+
+
+def file_hash(path: Path) -> Optional[str]:
+    """返回文件内容哈希，文件不存在时返回 None"""
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+_yaml_cache: dict[Path, tuple[tuple, object]] = {}
+
+
+def load_yaml(path: Path):
+    """
+    读取并解析 YAML 文件。
+    解析结果按 inode/mtime/size 缓存，同一次调用中重复读取同一文件不会重复解析；
+    返回的是缓存的深拷贝，调用方可以放心修改。
+    """
+    st = path.stat()
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _yaml_cache.get(path)
+    if cached is None or cached[0] != key:
+        with tracing.span("load_yaml", "yaml", path=str(path)):
+            with path.open("r", encoding="utf8") as f:
+                cached = (key, yaml.safe_load(f))
+        _yaml_cache[path] = cached
+    return copy.deepcopy(cached[1])
@@ -1,17 +1,30 @@
 """全局常量配置"""
 
+import os
 from pathlib import Path
 
-BASE_DIR = Path("/home/hysteria2")
+# 允许通过环境变量覆盖工作目录，便于在同一台主机上模拟多个节点（如 fleet 的本地执行器）
+BASE_DIR = Path(os.environ.get("HEYHY_BASE_DIR", "/home/hysteria2"))
 DOCKER_COMPOSE_PATH = BASE_DIR / "docker-compose.yaml"
 CONFIG_PATH = BASE_DIR / "config.yaml"
 
 LISTEN_PORT = 4433
+# 双栈监听地址：Linux 默认 (bindv6only=0) 下绑定 :: 同时接受 IPv4 与 IPv6
+DUAL_STACK_LISTEN = "::"
 SERVICE_IMAGE = "metacubex/mihomo:latest"
 
 MIHOMO_PROXIES_DOCS = "https://wiki.metacubex.one/config/proxies/hysteria2/#hysteria2"
 
 MASQUERADE_WEBSITE = "https://cocodataset.org/"
+# 伪装站点的本地镜像目录，以相同的绝对路径挂载进容器
+MASQUERADE_DIR = BASE_DIR / "masquerade"
+MASQUERADE_MAX_PAGES = 20
+MASQUERADE_MAX_FILES = 300
+
+# hysteria2 流量混淆。启用后服务端不再响应标准 QUIC，伪装站点随之失效
+OBFS_TYPES = ("salamander",)
+# 客户端选项（如是否在客户端配置中固定证书指纹），与 Mihomo 配置分开保存
+CLIENT_OPTIONS_PATH = BASE_DIR / "client.yaml"
 
 TOOL_NAME = "Hysteria2"
 COMPOSE_SERVICE_NAME = "hysteria2-inbound"
@@ -19,15 +32,55 @@ COMPOSE_CONTAINER_PREFIX = f"{COMPOSE_SERVICE_NAME}-"
 
 MIHOMO_LISTEN_TYPE = "hysteria2"
 MIHOMO_LISTENER_NAME_PREFIX = f"{MIHOMO_LISTEN_TYPE}-in-"
+# 仅绑定回环地址的 RESTful API，用于配置热重载
+MIHOMO_CONTROLLER_ADDR = "127.0.0.1:9097"
+
+DOCKER_SOCKET_PATH = Path("/var/run/docker.sock")
+
+# 运行时后端 (docker | systemd) 及资源限制
+RUNTIME_CONFIG_PATH = BASE_DIR / "runtime.yaml"
+MIHOMO_BINARY_PATH = BASE_DIR / "bin" / "mihomo"
+SYSTEMD_UNIT_NAME = "heyhy-mihomo"
+SYSTEMD_UNIT_DIR = Path("/etc/systemd/system")
+
+CACHE_DIR = BASE_DIR / ".cache"
+# check --snapshot 中缓存条目的有效期 (秒)
+SNAPSHOT_PUBLIC_IP_TTL = 86400
+SNAPSHOT_STATUS_TTL = 300
+# 工作目录之外的运行状态（如断点续装检查点）
+STATE_DIR = Path(os.environ.get("XDG_STATE_HOME", Path.home() / ".local" / "state")) / "heyhy"
+INSTALL_CHECKPOINT_PATH = STATE_DIR / "install-checkpoint.json"
+CERT_EXPIRY_WARNING_DAYS = 14
+CERTBOT_DEPLOY_HOOK_PATH = Path("/etc/letsencrypt/renewal-hooks/deploy/heyhy.sh")
+PREFLIGHT_DRY_RUN_TIMEOUT = 60
+
+SYSCTL_CONF_PATH = Path("/etc/sysctl.d/99-heyhy.conf")
+
+# 客户端订阅端点：共享规则集 + 每用户配置
+SUBSCRIPTION_PORT = 7443
+# 可选的自定义客户端分流规则 (YAML，含 rules 列表)，替换内置规则
+CLIENT_RULES_PATH = BASE_DIR / "client-rules.yaml"
+
+# 安装前 DNS 校验使用的公共解析器 (另外总会查询系统解析器) 与单次查询超时 (秒)
+DNS_RESOLVERS = ("1.1.1.1", "8.8.8.8", "9.9.9.9", "223.5.5.5")
+DNS_TIMEOUT = 3
+
+# heyhy capacity：结果文件、估算用的 RTT (秒)、资源使用上限比例，
+# 以及 QUIC 加解密与拥塞控制相对回环 UDP 收发的 CPU 开销倍数
+CAPACITY_PATH = BASE_DIR / "capacity.json"
+CAPACITY_RTT = 0.1
+CAPACITY_HEADROOM = 0.7
+CAPACITY_QUIC_CPU_FACTOR = 3.0
+
+# heyhy prefetch：预取记录、后台运行的日志与访问 registry 的超时 (秒)
+PREFETCH_RECORD_PATH = CACHE_DIR / "prefetch.json"
+PREFETCH_LOG_PATH = CACHE_DIR / "prefetch.log"
+REGISTRY_TIMEOUT = 30
+
+PROBE_CONCURRENCY = 32
+PROBE_TIMEOUT = 5
 
-SHARE_LINK_TPL = "hy2://{pwd}@{server}:{port}?sni={sni}#{alias}"
-
-DEFAULT_CLIENT_CONFIG = {
-    "name": "{{DOMAIN}}",
-    "type": MIHOMO_LISTEN_TYPE,
-    "server": "{{PUBLIC_IP}}",
-    "port": "{{PORT}}",
-    "password": "{{PASSWORD}}",
-    "sni": "{{SNI}}",
-    "skip_cert_verify": False,
-}
+FLEET_INVENTORY_PATH = Path("fleet.yaml")
+FLEET_CONCURRENCY = 8
+FLEET_COMMAND_TIMEOUT = 600
+FLEET_SSH_CONTROL_PERSIST = "60s"
@@ -0,0 +1,36 @@
+"""Mihomo external-controller 客户端"""
+
+import json
+import logging
+import urllib.error
+import urllib.request
+
+from hy2d.core import tracing
+
+
+def reload_config(mihomo_cfg: dict, timeout: float = 5) -> bool:
+    """
+    通过 external-controller 热重载正在运行的配置文件。
+    Mihomo 仅会重建发生变化的 listener，未变化的连接不受影响。
+    :return: 重载成功返回 True；未启用 controller 或请求失败返回 False。
+    """
+    addr = mihomo_cfg.get("external-controller")
+    if not addr:
+        return False
+
+    request = urllib.request.Request(
+        f"http://{addr}/configs?force=true",
+        data=json.dumps({"path": ""}).encode("utf8"),
+        method="PUT",
+        headers={"Content-Type": "application/json"},
+    )
+    if mihomo_cfg.get("secret"):
+        request.add_header("Authorization", f"Bearer {mihomo_cfg['secret']}")
+
+    try:
+        with tracing.span("PUT /configs", "network", addr=addr):
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return 200 <= response.status < 300
+    except (urllib.error.URLError, OSError) as e:
+        logging.debug(f"热重载请求失败: {e}")
+        return False
@@ -0,0 +1,243 @@
+"""安装前的域名与 DNS 校验
+
+certbot 在拉取镜像、安装依赖之后才会因为解析错误而失败，往往已经过去了数分钟。
+安装的第一个任务以 asyncio 并发完成以下检查，通常在几秒内给出结论：
+1. 向多个公共解析器（以及系统解析器）同时查询 A / AAAA 记录，每个查询独立超时；
+2. 同时检测本机的 IPv4 / IPv6 出口地址，与解析结果比较；
+3. 检查 ACME http-01 验证所需的 80 端口：standalone 需要 80 端口空闲，webroot 需要已有服务在监听。
+
+DNS 查询使用标准库实现的最小 UDP 客户端 (RFC 1035)，不需要额外依赖。
+"""
+
+import asyncio
+import ipaddress
+import os
+import socket
+import struct
+from dataclasses import dataclass, field
+from typing import Optional
+
+from hy2d.core import constants, tracing, utils
+
+QTYPES = {"A": 1, "AAAA": 28}
+_RCODE_NXDOMAIN = 3
+
+
+class DNSError(Exception):
+    pass
+
+
+def build_query(name: str, qtype: int) -> tuple[int, bytes]:
+    query_id = struct.unpack("!H", os.urandom(2))[0]
+    # RD=1，单个问题
+    header = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    qname = b"".join(
+        bytes([len(label)]) + label for label in name.rstrip(".").encode("idna").split(b".")
+    )
+    return query_id, header + qname + b"\x00" + struct.pack("!HH", qtype, 1)
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    while True:
+        length = data[offset]
+        if length == 0:
+            return offset + 1
+        if length & 0xC0 == 0xC0:
+            # 压缩指针占两个字节，之后名称结束
+            return offset + 2
+        offset += 1 + length
+
+
+def parse_response(data: bytes, query_id: int, qtype: int) -> list[str]:
+    """返回应答中与 qtype 匹配的地址；NXDOMAIN 返回空列表，其他错误码抛出 DNSError"""
+    if len(data) < 12:
+        raise DNSError("应答过短")
+    rid, flags, qdcount, ancount, _, _ = struct.unpack("!HHHHHH", data[:12])
+    if rid != query_id:
+        raise DNSError("应答 ID 不匹配")
+    rcode = flags & 0x000F
+    if rcode == _RCODE_NXDOMAIN:
+        return []
+    if rcode:
+        raise DNSError(f"解析失败 (RCODE {rcode})")
+
+    offset = 12
+    for _ in range(qdcount):
+        offset = _skip_name(data, offset) + 4
+    addresses = []
+    for _ in range(ancount):
+        offset = _skip_name(data, offset)
+        rtype, _, _, rdlength = struct.unpack("!HHIH", data[offset : offset + 10])
+        offset += 10
+        rdata = data[offset : offset + rdlength]
+        offset += rdlength
+        # CNAME 链中的其他记录直接跳过，递归解析器会在同一应答中给出最终地址
+        if rtype == qtype == QTYPES["A"] and rdlength == 4:
+            addresses.append(socket.inet_ntop(socket.AF_INET, rdata))
+        elif rtype == qtype == QTYPES["AAAA"] and rdlength == 16:
+            addresses.append(ipaddress.ip_address(rdata).compressed)
+    return addresses
+
+
+class _QueryProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.reply: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data: bytes, addr):
+        if not self.reply.done():
+            self.reply.set_result(data)
+
+    def error_received(self, exc: Exception):
+        if not self.reply.done():
+            self.reply.set_exception(exc)
+
+
+async def aquery(resolver: str, name: str, rtype: str, timeout: float = 2) -> list[str]:
+    """向指定解析器查询一条记录，超时抛出 asyncio.TimeoutError"""
+    loop = asyncio.get_running_loop()
+    query_id, packet = build_query(name, QTYPES[rtype])
+    transport, protocol = await loop.create_datagram_endpoint(
+        _QueryProtocol, remote_addr=(resolver, 53)
+    )
+    try:
+        transport.sendto(packet)
+        data = await asyncio.wait_for(protocol.reply, timeout)
+    finally:
+        transport.close()
+    return parse_response(data, query_id, QTYPES[rtype])
+
+
+@dataclass
+class DomainReport:
+    domain: str
+    # 解析器 -> {"A": [...], "AAAA": [...]}，查询失败的记录类型不出现
+    records: dict[str, dict[str, list[str]]] = field(default_factory=dict)
+    public: utils.PublicAddresses = field(default_factory=utils.PublicAddresses)
+    errors: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def addresses(self, rtype: str) -> set[str]:
+        return {ip for answer in self.records.values() for ip in answer.get(rtype, ())}
+
+
+async def _aresolve(resolver: str, domain: str, timeout: float) -> dict[str, list[str]]:
+    if resolver == "system":
+        records = await asyncio.wait_for(asyncio.to_thread(utils.resolve_domain, domain), timeout)
+        # getaddrinfo 无法区分 NXDOMAIN 与解析失败，没有结果时不参与一致性比较
+        if not records["ipv4"] and not records["ipv6"]:
+            raise DNSError("无解析结果")
+        return {"A": sorted(records["ipv4"]), "AAAA": sorted(records["ipv6"])}
+    answers = await asyncio.gather(
+        *(aquery(resolver, domain, rtype, timeout) for rtype in QTYPES), return_exceptions=True
+    )
+    result = {}
+    for rtype, answer in zip(QTYPES, answers):
+        if not isinstance(answer, BaseException):
+            result[rtype] = answer
+    if not result:
+        error = answers[0]
+        raise DNSError(str(error) or type(error).__name__)
+    return result
+
+
+def _check_port_80(acme_mode: str) -> Optional[str]:
+    """返回错误信息；端口满足 ACME 验证要求时返回 None"""
+    if acme_mode == "standalone":
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                s.bind(("0.0.0.0", 80))
+        except PermissionError:
+            return "无权限绑定 80 端口，standalone 模式需要 root 权限。"
+        except OSError:
+            return "80 端口已被占用，standalone 模式的 certbot 无法监听。请改用 --acme-mode webroot 或 dns。"
+    elif acme_mode == "webroot":
+        try:
+            with socket.create_connection(("127.0.0.1", 80), timeout=2):
+                pass
+        except OSError:
+            return "webroot 模式需要本机 80 端口已有 Web 服务在运行，但无法连接 127.0.0.1:80。"
+    return None
+
+
+def _evaluate(report: DomainReport, acme_mode: str):
+    a_records, aaaa_records = report.addresses("A"), report.addresses("AAAA")
+    public = report.public
+    if not report.records:
+        report.errors.append("所有解析器都无法查询该域名，请检查本机的网络与 DNS 出站。")
+        return
+    if not a_records and not aaaa_records:
+        report.errors.append(f"域名 {report.domain} 没有 A 或 AAAA 记录，请先将其解析到本机。")
+        return
+
+    # 解析器之间的分歧通常意味着记录刚刚修改、尚未在全网生效
+    answers = {tuple(sorted(a.get("A", []))) for a in report.records.values() if "A" in a}
+    if len(answers) > 1:
+        report.warnings.append("不同解析器返回的 A 记录不一致，DNS 变更可能尚未完全生效。")
+
+    if not public.primary:
+        report.warnings.append("无法检测本机出口地址，跳过解析结果与本机地址的比较。")
+        return
+
+    http01 = acme_mode in ("standalone", "webroot")
+    if public.ipv4 and a_records and public.ipv4 not in a_records:
+        report.errors.append(
+            f"A 记录 ({', '.join(sorted(a_records))}) 未指向本机公网 IPv4 {public.ipv4}。"
+            "如果域名开启了 CDN 代理，请先关闭。"
+        )
+    if aaaa_records and public.ipv6 not in aaaa_records:
+        # Let's Encrypt 在存在 AAAA 记录时优先通过 IPv6 验证，连上了错误的主机时不会回退到 IPv4
+        message = (
+            f"AAAA 记录 ({', '.join(sorted(aaaa_records))}) 未指向本机"
+            + (f" IPv6 {public.ipv6}" if public.ipv6 else " (本机没有 IPv6 出口)")
+            + "，IPv6 客户端将无法连接。"
+        )
+        (report.errors if http01 and public.ipv6 else report.warnings).append(message)
+    if not a_records and public.ipv4 and not public.ipv6:
+        report.errors.append("域名只有 AAAA 记录，但本机没有 IPv6 出口。")
+
+
+async def avalidate_domain(
+    domain: str,
+    public: Optional[utils.PublicAddresses] = None,
+    acme_mode: str = "standalone",
+    resolvers: tuple[str, ...] = constants.DNS_RESOLVERS,
+    timeout: float = constants.DNS_TIMEOUT,
+) -> DomainReport:
+    """并发查询所有解析器、检测出口地址与检查 80 端口"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    report = DomainReport(domain=domain)
+    targets = ("system", *resolvers)
+
+    results = await asyncio.gather(
+        *(_aresolve(resolver, domain, timeout) for resolver in targets),
+        utils.adetect_public_addresses(timeout) if public is None else asyncio.sleep(0, public),
+        asyncio.to_thread(_check_port_80, acme_mode),
+        return_exceptions=True,
+    )
+    *answers, report.public, port_error = results
+    for resolver, answer in zip(targets, answers):
+        if isinstance(answer, BaseException):
+            reason = "超时" if isinstance(answer, asyncio.TimeoutError) else str(answer)
+            report.warnings.append(f"解析器 {resolver} 查询失败: {reason}")
+        else:
+            report.records[resolver] = answer
+    if isinstance(report.public, BaseException):
+        report.public = utils.PublicAddresses()
+    if isinstance(port_error, str):
+        report.errors.append(port_error)
+
+    _evaluate(report, acme_mode)
+    report.duration = loop.time() - started
+    return report
+
+
+@tracing.traced("validate_domain", "network")
+def validate_domain(domain: str, **kwargs) -> DomainReport:
+    return asyncio.run(avalidate_domain(domain, **kwargs))
@@ -0,0 +1,429 @@
+"""Docker Engine API 客户端
+
+通过 Unix socket (/var/run/docker.sock) 上的持久 HTTP/1.1 连接直接与 Docker 守护进程通信，
+容器状态、启停、重建与日志都只需一次 API 调用，无需 fork `docker` / `docker compose` 进程。
+守护进程不可达（socket 不存在、无权限、DOCKER_HOST 指向远程主机）时，调用方回退到 CLI。
+
+socket 路径可注入，便于对接本地的模拟服务器（见 examples/fake_docker_socket.py）。
+"""
+
+import hashlib
+import http.client
+import json
+import logging
+import os
+import socket
+import struct
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import quote, urlencode
+
+from hy2d.core import constants, tracing
+from hy2d.core.constants import COMPOSE_SERVICE_NAME
+
+API_VERSION = "v1.41"
+
+# recreate_from_compose 能够翻译为容器参数的 compose 服务键
+COMPOSE_API_KEYS = frozenset(
+    {"image", "container_name", "command", "working_dir", "volumes", "network_mode", "restart"}
+)
+# 容器参数与镜像 ID 的哈希，用于判断服务定义是否发生变化
+SPEC_HASH_LABEL = "io.heyhy.spec-hash"
+
+
+class DockerAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API 错误 ({status}): {message}")
+        self.status = status
+        self.message = message
+
+
+class UnsupportedComposeService(ValueError):
+    """服务定义中包含 API 路径无法表示的键，调用方应回退到 `docker compose`"""
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: Optional[float] = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def default_socket_path() -> Optional[str]:
+    """解析 DOCKER_HOST；指向非 Unix socket 的地址时返回 None（交由 CLI 处理）"""
+    host = os.environ.get("DOCKER_HOST")
+    if not host:
+        return str(constants.DOCKER_SOCKET_PATH)
+    if host.startswith("unix://"):
+        return host[len("unix://") :]
+    return None
+
+
+def human_duration(seconds: float) -> str:
+    """与 `docker ps` 相近的时长描述"""
+    seconds = max(int(seconds), 0)
+    for unit, size in (("days", 86400), ("hours", 3600), ("minutes", 60)):
+        if seconds >= size:
+            return f"{seconds // size} {unit}"
+    return f"{seconds} seconds"
+
+
+def _parse_time(value: str) -> Optional[float]:
+    # Docker 返回纳秒精度的 RFC3339 时间，截断到微秒后解析
+    if not value or value.startswith("0001-"):
+        return None
+    head, _, frac = value.rstrip("Z").partition(".")
+    try:
+        parsed = datetime.fromisoformat(f"{head}.{(frac or '0')[:6]}+00:00")
+    except ValueError:
+        return None
+    return parsed.timestamp()
+
+
+class DockerClient:
+    """基于持久连接的最小 Docker Engine API 客户端"""
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 30):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self._conn: Optional[_UnixHTTPConnection] = None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connection(self) -> _UnixHTTPConnection:
+        if self._conn is None:
+            if not self.socket_path:
+                raise ConnectionError("DOCKER_HOST 不是 Unix socket。")
+            self._conn = _UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        return self._conn
+
+    def _send(self, method: str, path: str, body: Optional[bytes], headers: dict):
+        # 复用连接；服务端关闭了空闲连接时重连一次
+        for attempt in (0, 1):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                return conn.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.close()
+                if attempt:
+                    raise
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[dict] = None,
+        body=None,
+        stream: bool = False,
+        timeout: Optional[float] = None,
+    ):
+        """
+        发送请求。stream=True 时返回未读取的 HTTPResponse（调用方负责读完或关闭连接），
+        否则返回 (status, 解析后的 JSON 或原始文本)。
+        """
+        url = f"/{API_VERSION}{path}"
+        if params:
+            url += "?" + urlencode({k: v for k, v in params.items() if v is not None})
+        headers = {"Host": "docker"}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf8")
+            headers["Content-Type"] = "application/json"
+
+        with tracing.span(f"{method} {path.split('?')[0]}", "docker-api"):
+            conn = self._connection()
+            conn.timeout = timeout if timeout is not None else self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            resp = self._send(method, url, data, headers)
+            if stream:
+                if resp.status >= 400:
+                    self._raise(resp.status, resp.read())
+                return resp
+            raw = resp.read()
+
+        if resp.status >= 400:
+            self._raise(resp.status, raw)
+        if resp.getheader("Content-Type", "").startswith("application/json") and raw:
+            return resp.status, json.loads(raw)
+        return resp.status, raw.decode("utf8", errors="replace")
+
+    @staticmethod
+    def _raise(status: int, raw: bytes):
+        try:
+            message = json.loads(raw).get("message", "")
+        except ValueError:
+            message = raw.decode("utf8", errors="replace").strip()
+        raise DockerAPIError(status, message)
+
+    # --- 守护进程 ---
+
+    def ping(self) -> bool:
+        try:
+            status, data = self.request("GET", "/_ping", timeout=2)
+        except (OSError, http.client.HTTPException, DockerAPIError) as e:
+            logging.debug(f"Docker API 不可用: {e}")
+            self.close()
+            return False
+        return status == 200 and str(data).strip() == "OK"
+
+    # --- 容器 ---
+
+    def inspect_container(self, name: str) -> Optional[dict]:
+        try:
+            return self.request("GET", f"/containers/{quote(name)}/json")[1]
+        except DockerAPIError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def container_status(self, name: str) -> str:
+        """返回与 `docker ps --format {{.Status}}` 相近的状态文本；容器不存在时返回空字符串"""
+        info = self.inspect_container(name)
+        if not info:
+            return ""
+        state = info.get("State") or {}
+        now = time.time()
+        if state.get("Running"):
+            started = _parse_time(state.get("StartedAt", ""))
+            text = f"Up {human_duration(now - started)}" if started else "Up"
+            if state.get("Paused"):
+                text += " (Paused)"
+            return text
+        if state.get("Status") == "created":
+            return "Created"
+        finished = _parse_time(state.get("FinishedAt", ""))
+        text = f"Exited ({state.get('ExitCode', 0)})"
+        return f"{text} {human_duration(now - finished)} ago" if finished else text
+
+    def start(self, name: str):
+        # 204: 已启动; 304: 已经在运行
+        self.request("POST", f"/containers/{quote(name)}/start")
+
+    def stop(self, name: str, timeout: int = 10):
+        self.request(
+            "POST",
+            f"/containers/{quote(name)}/stop",
+            {"t": timeout},
+            timeout=self.timeout + timeout,
+        )
+
+    def restart(self, name: str, timeout: int = 10):
+        self.request(
+            "POST",
+            f"/containers/{quote(name)}/restart",
+            {"t": timeout},
+            timeout=self.timeout + timeout,
+        )
+
+    def remove(self, name: str, force: bool = True, volumes: bool = False):
+        try:
+            self.request(
+                "DELETE",
+                f"/containers/{quote(name)}",
+                {"force": str(force).lower(), "v": str(volumes).lower()},
+            )
+        except DockerAPIError as e:
+            if e.status != 404:
+                raise
+
+    def create_container(self, name: str, spec: dict) -> str:
+        return self.request("POST", "/containers/create", {"name": name}, body=spec)[1]["Id"]
+
+    def logs(self, name: str, follow: bool = False, tail: str = "all") -> Iterator[tuple[str, str]]:
+        """逐行产出 (stream, line)，stream 为 stdout 或 stderr"""
+        info = self.inspect_container(name)
+        if info is None:
+            raise DockerAPIError(404, f"容器不存在: {name}")
+        tty = bool((info.get("Config") or {}).get("Tty"))
+        resp = self.request(
+            "GET",
+            f"/containers/{quote(name)}/logs",
+            {"stdout": 1, "stderr": 1, "follow": int(follow), "tail": tail},
+            stream=True,
+            timeout=None if follow else self.timeout,
+        )
+        try:
+            if tty:
+                for line in resp:
+                    yield "stdout", line.decode("utf8", errors="replace").rstrip("\n")
+                return
+            # 非 TTY 容器的输出为多路复用流: [stream, 0, 0, 0, size(4 字节大端)] + payload
+            buffers = {1: b"", 2: b""}
+            while True:
+                header = resp.read(8)
+                if len(header) < 8:
+                    break
+                kind, size = struct.unpack(">BxxxL", header)
+                payload = resp.read(size)
+                buf = buffers.get(kind, b"") + payload
+                *lines, buffers[kind] = buf.split(b"\n")
+                for line in lines:
+                    yield ("stderr" if kind == 2 else "stdout"), line.decode(
+                        "utf8", errors="replace"
+                    )
+            for kind, rest in buffers.items():
+                if rest:
+                    yield ("stderr" if kind == 2 else "stdout"), rest.decode(
+                        "utf8", errors="replace"
+                    )
+        finally:
+            # 流式响应可能未读完，不能复用该连接
+            resp.close()
+            self.close()
+
+    # --- 镜像 ---
+
+    def has_image(self, image: str) -> bool:
+        try:
+            self.request("GET", f"/images/{quote(image, safe='')}/json")
+            return True
+        except DockerAPIError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    def image_id(self, image: str) -> Optional[str]:
+        try:
+            return self.request("GET", f"/images/{quote(image, safe='')}/json")[1].get("Id")
+        except DockerAPIError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    @staticmethod
+    def _split_reference(image: str) -> tuple[str, Optional[str]]:
+        """拆分为 (名称, 标签或 digest)"""
+        if "@" in image:
+            name, _, digest = image.partition("@")
+            return name, digest
+        if ":" in image.rsplit("/", 1)[-1]:
+            name, tag = image.rsplit(":", 1)
+            return name, tag
+        return image, None
+
+    def _consume_progress(self, resp, label: str):
+        """读完 JSON 进度流，流中出现错误时抛出 DockerAPIError"""
+        last = None
+        try:
+            for line in resp:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("error"):
+                    raise DockerAPIError(500, event["error"])
+                status = event.get("status") or event.get("stream", "").strip()
+                if status and status != last and not event.get("progressDetail"):
+                    logging.debug(f"{label}: {status}")
+                    last = status
+        finally:
+            resp.close()
+            self.close()
+
+    def pull(self, image: str):
+        """拉取镜像（标签或 digest），逐条记录进度；拉取失败时抛出 DockerAPIError"""
+        name, tag = self._split_reference(image)
+        resp = self.request(
+            "POST", "/images/create", {"fromImage": name, "tag": tag}, stream=True, timeout=None
+        )
+        self._consume_progress(resp, image)
+
+    def tag(self, source: str, target: str):
+        repo, tag = self._split_reference(target)
+        self.request(
+            "POST", f"/images/{quote(source, safe='')}/tag", {"repo": repo, "tag": tag or "latest"}
+        )
+
+    def load(self, path: Path):
+        """载入 `docker save` 导出的 tar 包"""
+        size = os.path.getsize(path)
+        headers = {
+            "Host": "docker",
+            "Content-Type": "application/x-tar",
+            "Content-Length": str(size),
+        }
+        with tracing.span("POST /images/load", "docker-api"), open(path, "rb") as f:
+            conn = self._connection()
+            conn.timeout = None
+            if conn.sock is not None:
+                conn.sock.settimeout(None)
+            resp = self._send("POST", f"/{API_VERSION}/images/load?quiet=1", f, headers)
+            if resp.status >= 400:
+                self._raise(resp.status, resp.read())
+            self._consume_progress(resp, str(path))
+
+    # --- Compose 服务 ---
+
+    def recreate_from_compose(self, compose_cfg: dict, project_dir: Path) -> str:
+        """
+        与 `docker compose up -d` 一致：服务定义或镜像发生变化时才重建容器，否则只确保其在运行。
+        写入与 docker compose 相同的标签，之后仍可使用 `docker compose` 管理该容器。
+        服务定义包含无法翻译的键（environment、ports 等）时抛出 UnsupportedComposeService。
+        """
+        service = compose_cfg["services"][COMPOSE_SERVICE_NAME]
+        unsupported = sorted(set(service) - COMPOSE_API_KEYS)
+        if unsupported:
+            raise UnsupportedComposeService(
+                f"Docker API 无法表示服务定义中的 {', '.join(unsupported)}"
+            )
+        name = service["container_name"]
+        binds = []
+        for volume in service.get("volumes") or []:
+            source, _, rest = volume.partition(":")
+            if source.startswith("."):
+                source = str((project_dir / source).resolve())
+            binds.append(f"{source}:{rest}")
+
+        spec = {
+            "Image": service["image"],
+            "Cmd": service.get("command"),
+            "WorkingDir": service.get("working_dir", ""),
+            "Labels": {
+                "com.docker.compose.project": project_dir.name,
+                "com.docker.compose.service": COMPOSE_SERVICE_NAME,
+                "com.docker.compose.oneoff": "False",
+                "com.docker.compose.container-number": "1",
+                "com.docker.compose.project.working_dir": str(project_dir),
+            },
+            "HostConfig": {
+                "Binds": binds,
+                "NetworkMode": service.get("network_mode", "default"),
+                "RestartPolicy": {"Name": service.get("restart", "no")},
+            },
+        }
+        image_id = self.image_id(service["image"])
+        if image_id is None:
+            self.pull(service["image"])
+            image_id = self.image_id(service["image"])
+        spec_hash = hashlib.sha256(
+            json.dumps([spec, image_id], sort_keys=True).encode("utf8")
+        ).hexdigest()
+        spec["Labels"][SPEC_HASH_LABEL] = spec_hash
+
+        current = self.inspect_container(name)
+        if (
+            current
+            and current.get("Image") == image_id
+            and ((current.get("Config") or {}).get("Labels") or {}).get(SPEC_HASH_LABEL)
+            == spec_hash
+        ):
+            if not (current.get("State") or {}).get("Running"):
+                self.start(current["Id"])
+            return current["Id"]
+
+        self.remove(name, force=True)
+        container_id = self.create_container(name, spec)
+        self.start(container_id)
+        return container_id
@@ -0,0 +1,311 @@
+"""多节点（Fleet）并发管理
+
+通过一份 inventory 清单，在多台主机上并发执行 heyhy 子命令。
+
+inventory 示例 (fleet.yaml)::
+
+    defaults:
+      user: root
+      port: 22
+      heyhy: "~/.local/bin/heyhy"
+    hosts:
+      - name: tokyo-1
+        host: 203.0.113.10
+        vars:
+          domain: tokyo-1.example.com
+      - name: local-sim
+        executor: local
+        env:
+          HEYHY_BASE_DIR: /tmp/hy2-sim
+      - name: container-sim
+        executor: docker
+        container: hy2-node-sim
+
+命令参数中的 ``{name}``、``{host}`` 以及 ``vars`` 中的字段会按主机展开，
+例如 ``heyhy fleet install -d {domain}``。
+"""
+
+import logging
+import os
+import shlex
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Iterator, Optional
+
+import yaml
+
+from hy2d.core import constants
+
+EXECUTOR_TYPES = ("ssh", "local", "docker")
+
+
+@dataclass
+class FleetHost:
+    """inventory 中的一台主机"""
+
+    name: str
+    host: str = ""
+    user: str = "root"
+    port: int = 22
+    identity_file: Optional[str] = None
+    executor: str = "ssh"
+    heyhy: str = "heyhy"
+    container: Optional[str] = None
+    env: dict = field(default_factory=dict)
+    vars: dict = field(default_factory=dict)
+
+    @property
+    def target(self) -> str:
+        return f"{self.user}@{self.host}" if self.user else self.host
+
+    def render_args(self, args: list[str]) -> list[str]:
+        """按主机变量展开命令参数中的占位符"""
+        mapping = {"name": self.name, "host": self.host, **self.vars}
+        rendered = []
+        for arg in args:
+            try:
+                rendered.append(arg.format_map(mapping))
+            except (KeyError, IndexError, ValueError) as e:
+                raise ValueError(f"主机 {self.name} 缺少参数变量: {e}") from e
+        return rendered
+
+
+@dataclass
+class FleetResult:
+    """单台主机的执行结果"""
+
+    host: str
+    command: list[str]
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.returncode == 0
+
+    @property
+    def summary(self) -> str:
+        """取输出的最后一行作为摘要"""
+        if self.error:
+            return self.error
+        for text in (self.stderr if not self.ok else self.stdout, self.stdout, self.stderr):
+            lines = [line.strip() for line in text.splitlines() if line.strip()]
+            if lines:
+                return lines[-1]
+        return ""
+
+
+def load_inventory(path: Path) -> list[FleetHost]:
+    """加载 inventory 文件"""
+    if not path.is_file():
+        raise FileNotFoundError(f"inventory 文件 {path} 不存在。")
+
+    data = yaml.safe_load(path.read_text(encoding="utf8")) or {}
+    defaults = data.get("defaults") or {}
+    hosts: list[FleetHost] = []
+    seen: set[str] = set()
+
+    for index, entry in enumerate(data.get("hosts") or []):
+        if isinstance(entry, str):
+            entry = {"host": entry}
+        merged = {**defaults, **entry}
+        merged.setdefault("name", merged.get("host") or f"host-{index}")
+        unknown = set(merged) - set(FleetHost.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"主机 {merged['name']} 包含未知字段: {', '.join(sorted(unknown))}")
+
+        host = FleetHost(**merged)
+        if host.executor not in EXECUTOR_TYPES:
+            raise ValueError(f"主机 {host.name} 的 executor 必须是 {EXECUTOR_TYPES} 之一。")
+        if host.executor == "ssh" and not host.host:
+            raise ValueError(f"主机 {host.name} 缺少 host 字段。")
+        if host.executor == "docker" and not host.container:
+            raise ValueError(f"主机 {host.name} 缺少 container 字段。")
+        if host.name in seen:
+            raise ValueError(f"主机名重复: {host.name}")
+        seen.add(host.name)
+        hosts.append(host)
+
+    return hosts
+
+
+class SSHExecutor:
+    """
+    通过 OpenSSH 在远程主机上执行命令。
+    使用 ControlMaster 多路复用作为连接池：同一主机的后续命令复用已建立的连接。
+    """
+
+    def __init__(self, control_dir: Optional[Path] = None):
+        self.control_dir = control_dir or Path.home() / ".ssh" / "heyhy-cm"
+        self._opened: set[str] = set()
+        self._lock = Lock()
+
+    def _base_cmd(self, host: FleetHost) -> list[str]:
+        cmd = [
+            "ssh",
+            "-T",
+            "-o",
+            "BatchMode=yes",
+            "-o",
+            "ControlMaster=auto",
+            "-o",
+            f"ControlPath={self.control_dir}/%C",
+            "-o",
+            f"ControlPersist={constants.FLEET_SSH_CONTROL_PERSIST}",
+            "-p",
+            str(host.port),
+        ]
+        if host.identity_file:
+            cmd += ["-i", os.path.expanduser(host.identity_file)]
+        return cmd
+
+    def command(self, host: FleetHost, args: list[str]) -> list[str]:
+        remote = " ".join([host.heyhy] + [shlex.quote(a) for a in args])
+        if host.env:
+            exports = " ".join(f"{k}={shlex.quote(str(v))}" for k, v in host.env.items())
+            remote = f"env {exports} {remote}"
+        return self._base_cmd(host) + [host.target, "--", remote]
+
+    def run(self, host: FleetHost, args: list[str], timeout: float) -> subprocess.CompletedProcess:
+        self.control_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        with self._lock:
+            self._opened.add(host.name)
+        return subprocess.run(
+            self.command(host, args),
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            stdin=subprocess.DEVNULL,
+        )
+
+    def close(self, hosts: list[FleetHost]):
+        """关闭本次打开的所有主控连接"""
+        for host in hosts:
+            if host.name not in self._opened:
+                continue
+            subprocess.run(
+                self._base_cmd(host) + ["-O", "exit", host.target],
+                capture_output=True,
+                stdin=subprocess.DEVNULL,
+                check=False,
+            )
+        self._opened.clear()
+
+
+class LocalExecutor:
+    """
+    在本机以子进程执行 heyhy，不经过 SSH。
+    配合 env 中的 HEYHY_BASE_DIR，可以在一台机器上模拟多个节点。
+    """
+
+    def command(self, host: FleetHost, args: list[str]) -> list[str]:
+        if host.heyhy == "heyhy":
+            return [sys.executable, "-m", "hy2d.main"] + args
+        return shlex.split(host.heyhy) + args
+
+    def run(self, host: FleetHost, args: list[str], timeout: float) -> subprocess.CompletedProcess:
+        env = {**os.environ, **{k: str(v) for k, v in host.env.items()}}
+        return subprocess.run(
+            self.command(host, args),
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            env=env,
+            stdin=subprocess.DEVNULL,
+        )
+
+    def close(self, hosts: list[FleetHost]):
+        pass
+
+
+class DockerExecExecutor:
+    """通过 `docker exec` 在容器中执行 heyhy，用于以容器模拟远程节点"""
+
+    def command(self, host: FleetHost, args: list[str]) -> list[str]:
+        cmd = ["docker", "exec", "-i"]
+        for k, v in host.env.items():
+            cmd += ["-e", f"{k}={v}"]
+        return cmd + [host.container] + shlex.split(host.heyhy) + args
+
+    def run(self, host: FleetHost, args: list[str], timeout: float) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            self.command(host, args),
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            stdin=subprocess.DEVNULL,
+        )
+
+    def close(self, hosts: list[FleetHost]):
+        pass
+
+
+class FleetRunner:
+    """在多台主机上并发执行命令，结果按完成顺序返回"""
+
+    def __init__(
+        self,
+        hosts: list[FleetHost],
+        concurrency: int = constants.FLEET_CONCURRENCY,
+        timeout: float = constants.FLEET_COMMAND_TIMEOUT,
+    ):
+        self.hosts = hosts
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.executors = {
+            "ssh": SSHExecutor(),
+            "local": LocalExecutor(),
+            "docker": DockerExecExecutor(),
+        }
+
+    def _run_one(self, host: FleetHost, args: list[str]) -> FleetResult:
+        start = time.perf_counter()
+        try:
+            host_args = host.render_args(args)
+        except ValueError as e:
+            return FleetResult(host=host.name, command=args, returncode=-1, error=str(e))
+
+        executor = self.executors[host.executor]
+        try:
+            proc = executor.run(host, host_args, self.timeout)
+            return FleetResult(
+                host=host.name,
+                command=host_args,
+                returncode=proc.returncode,
+                stdout=proc.stdout or "",
+                stderr=proc.stderr or "",
+                duration=time.perf_counter() - start,
+            )
+        except subprocess.TimeoutExpired:
+            error = f"执行超时 ({self.timeout}s)"
+        except FileNotFoundError as e:
+            error = f"执行器不可用: {e.filename}"
+        except Exception as e:
+            error = f"执行异常: {e}"
+        return FleetResult(
+            host=host.name,
+            command=host_args,
+            returncode=-1,
+            duration=time.perf_counter() - start,
+            error=error,
+        )
+
+    def run(self, args: list[str]) -> Iterator[FleetResult]:
+        """并发执行，并按完成顺序逐个产出结果"""
+        logging.debug(f"Fleet 并发度: {self.concurrency}, 主机数: {len(self.hosts)}")
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = [pool.submit(self._run_one, host, args) for host in self.hosts]
+                for future in as_completed(futures):
+                    yield future.result()
+        finally:
+            for executor in self.executors.values():
+                executor.close(self.hosts)
@@ -0,0 +1,197 @@
+"""配置文件的原子写入与代际日志 (generation journal)
+
+每次配置变更都会：
+1. 将文件内容按 sha256 存入内容寻址的对象库 (objects/)；
+2. 以「临时文件 + fsync + rename」的方式原子替换目标文件；
+3. 记录一个新的代际 (generations/<N>.json)，包含所有受管文件的内容哈希。
+
+回滚到任意代际只需读取该代际的记录，并从对象库中原子恢复对应文件。
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import suppress
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional, Union
+
+from hy2d.core import constants
+
+
+def _fsync_dir(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: Path, data: Union[str, bytes], mode: int = 0o644):
+    """写入临时文件并 fsync，然后原子地 rename 到目标路径"""
+    if isinstance(data, str):
+        data = data.encode("utf8")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+    _fsync_dir(path.parent)
+
+
+@dataclass
+class Generation:
+    generation: int
+    timestamp: float
+    reason: str
+    files: dict[str, str] = field(default_factory=dict)
+    # 回滚产生的代际记录其内容来源，普通提交为 None
+    restored_from: Optional[int] = None
+
+    @property
+    def time_str(self) -> str:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.timestamp))
+
+
+class Journal:
+    """受管配置文件的代际日志"""
+
+    def __init__(self, root: Optional[Path] = None):
+        self.base_dir = constants.BASE_DIR
+        self.root = root or self.base_dir / ".journal"
+        self.objects_dir = self.root / "objects"
+        self.generations_dir = self.root / "generations"
+        self.head_path = self.root / "HEAD"
+
+    def _key(self, path: Path) -> str:
+        """以相对工作目录的路径作为日志中的文件键"""
+        try:
+            return str(path.relative_to(self.base_dir))
+        except ValueError:
+            return str(path)
+
+    def _path(self, key: str) -> Path:
+        p = Path(key)
+        return p if p.is_absolute() else self.base_dir / p
+
+    def _generation_path(self, n: int) -> Path:
+        return self.generations_dir / f"{n:06d}.json"
+
+    def _store_object(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        obj = self.objects_dir / digest
+        if not obj.exists():
+            atomic_write(obj, data, mode=0o600)
+        return digest
+
+    @property
+    def head(self) -> int:
+        try:
+            return int(self.head_path.read_text().strip())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def get(self, n: int) -> Optional[Generation]:
+        try:
+            data = json.loads(self._generation_path(n).read_text(encoding="utf8"))
+        except FileNotFoundError:
+            return None
+        return Generation(**data)
+
+    def generations(self) -> list[Generation]:
+        if not self.generations_dir.is_dir():
+            return []
+        generations = []
+        for p in sorted(self.generations_dir.glob("*.json")):
+            generations.append(Generation(**json.loads(p.read_text(encoding="utf8"))))
+        return generations
+
+    def _snapshot(self) -> dict[str, str]:
+        """当前代际记录的文件集合"""
+        current = self.get(self.head)
+        return dict(current.files) if current else {}
+
+    def previous(self) -> int:
+        """
+        不指定代际时的回滚目标：当前内容所来自的代际的上一代。
+        回滚记录沿 restored_from 向前追溯，连续回滚会逐代后退，而不是撤销上一次回滚。
+        """
+        n = self.head
+        gen = self.get(n)
+        while gen is not None and gen.restored_from is not None:
+            n = gen.restored_from
+            gen = self.get(n)
+        return n - 1
+
+    def _record(
+        self, files: dict[str, str], reason: str, restored_from: Optional[int] = None
+    ) -> int:
+        n = self.head + 1
+        gen = Generation(
+            generation=n,
+            timestamp=time.time(),
+            reason=reason,
+            files=files,
+            restored_from=restored_from,
+        )
+        atomic_write(self._generation_path(n), json.dumps(asdict(gen), indent=2), mode=0o600)
+        atomic_write(self.head_path, str(n), mode=0o600)
+        return n
+
+    def commit(self, files: dict[Path, Union[str, bytes]], reason: str) -> int:
+        """
+        原子写入一组文件并记录新的代际。
+        未在本次提交中出现、但已被日志管理的文件沿用上一代际的内容哈希。
+        :return: 新代际编号
+        """
+        snapshot = self._snapshot()
+        # 首次提交时，将未受管但已存在的文件纳入基线，保证可以回滚到变更之前
+        if not snapshot:
+            for path in files:
+                if path.is_file():
+                    snapshot[self._key(path)] = self._store_object(path.read_bytes())
+            if snapshot:
+                self._record(dict(snapshot), "baseline")
+
+        for path, data in files.items():
+            raw = data.encode("utf8") if isinstance(data, str) else data
+            snapshot[self._key(path)] = self._store_object(raw)
+            atomic_write(path, raw)
+
+        return self._record(snapshot, reason)
+
+    def rollback(self, n: int) -> list[Path]:
+        """
+        将受管文件恢复到第 n 代，并记录为新的代际。
+        :return: 内容发生变化的文件路径
+        """
+        target = self.get(n)
+        if target is None:
+            raise KeyError(n)
+
+        changed = []
+        for key, digest in target.files.items():
+            path = self._path(key)
+            current = hashlib.sha256(path.read_bytes()).hexdigest() if path.is_file() else None
+            if current == digest:
+                continue
+            atomic_write(path, (self.objects_dir / digest).read_bytes())
+            changed.append(path)
+
+        self._record({**self._snapshot(), **target.files}, f"rollback to {n}", restored_from=n)
+        return changed
+
+
+def commit_files(files: dict[Path, Union[str, bytes]], reason: str) -> int:
+    """以默认日志原子提交一组配置文件"""
+    return Journal().commit(files, reason)
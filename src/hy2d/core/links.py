@@ -0,0 +1,303 @@
+"""分享链接编解码
+
+解析与生成 hysteria2 节点的分享链接：
+- hy2:// 与 hysteria2://，参见 https://v2.hysteria.network/zh/docs/developers/URI-Scheme/
+  支持 sni、insecure、obfs、obfs-password、pinSHA256，以及端口跳跃（authority 中的多端口或 mport 参数）；
+- NekoRay 的 nekoray://hysteria2#<base64> 与 nekoray://custom#<base64>（hysteria2 原生客户端配置）；
+- Clash.Meta / Mihomo 的 proxies 条目。
+
+所有接口都按行流式处理，转换任意大小的链接文件只占用常数内存。
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit
+
+from hy2d.core import constants
+from hy2d.core.models import ClientProfile
+
+SCHEMES = ("hy2", "hysteria2")
+# links convert 支持的输出格式
+OUTPUT_FORMATS = ("hy2", "hysteria2", "nekoray", "clash")
+
+
+class LinkError(ValueError):
+    pass
+
+
+@dataclass(slots=True)
+class HysteriaLink:
+    server: str
+    port: int
+    password: str
+    name: str = ""
+    sni: str = ""
+    insecure: bool = False
+    obfs: Optional[str] = None
+    obfs_password: Optional[str] = None
+    pin_sha256: Optional[str] = None
+    # 端口跳跃范围，如 "20000-30000" 或 "443,5000-6000"
+    mport: Optional[str] = None
+
+    @property
+    def host(self) -> str:
+        """URI authority 中的主机部分，IPv6 地址加方括号"""
+        return f"[{self.server}]" if ":" in self.server else self.server
+
+    # --- hy2:// ---
+
+    @classmethod
+    def from_uri(cls, uri: str) -> "HysteriaLink":
+        try:
+            parts = urlsplit(uri.strip())
+        except ValueError as e:
+            raise LinkError(f"无法解析的链接: {e}") from None
+        if parts.scheme not in SCHEMES:
+            raise LinkError(f"不支持的协议: {parts.scheme or '(空)'}")
+
+        auth, _, hostport = parts.netloc.rpartition("@")
+        if hostport.startswith("["):
+            server, _, port_spec = hostport[1:].partition("]")
+            port_spec = port_spec.removeprefix(":")
+        else:
+            server, _, port_spec = hostport.partition(":")
+        if not server:
+            raise LinkError("链接中缺少服务器地址")
+
+        query = dict(parse_qsl(parts.query))
+        port_spec = port_spec or "443"
+        mport = query.get("mport")
+        if not port_spec.isdigit():
+            # 多端口写法: host:443,5000-6000，首个端口作为主端口
+            mport = mport or port_spec
+            port_spec = port_spec.replace("-", ",").split(",")[0]
+        try:
+            port = int(port_spec)
+        except ValueError:
+            raise LinkError(f"无效的端口: {port_spec}") from None
+
+        return cls(
+            server=server,
+            port=port,
+            password=unquote(auth),
+            name=unquote(parts.fragment),
+            sni=query.get("sni", ""),
+            insecure=query.get("insecure") in ("1", "true"),
+            obfs=query.get("obfs"),
+            obfs_password=query.get("obfs-password"),
+            pin_sha256=query.get("pinSHA256"),
+            mport=mport,
+        )
+
+    def to_uri(self, scheme: str = "hy2") -> str:
+        query = {}
+        if self.sni:
+            query["sni"] = self.sni
+        if self.insecure:
+            query["insecure"] = "1"
+        if self.obfs:
+            query["obfs"] = self.obfs
+            if self.obfs_password:
+                query["obfs-password"] = self.obfs_password
+        if self.pin_sha256:
+            query["pinSHA256"] = self.pin_sha256
+        if self.mport:
+            query["mport"] = self.mport
+        auth = quote(self.password, safe=":") + "@" if self.password else ""
+        uri = f"{scheme}://{auth}{self.host}:{self.port}/"
+        if query:
+            uri += "?" + urlencode(query, safe=",:")
+        return uri + "#" + quote(self.name or self.sni or self.server)
+
+    # --- nekoray:// ---
+
+    @classmethod
+    def from_nekoray(cls, uri: str) -> "HysteriaLink":
+        kind, _, code = uri.strip().removeprefix("nekoray://").partition("#")
+        try:
+            meta = json.loads(base64.b64decode(code + "=" * (-len(code) % 4)))
+        except (binascii.Error, ValueError) as e:
+            raise LinkError(f"无法解码 NekoLink: {e}") from None
+        if not isinstance(meta, dict):
+            raise LinkError("无效的 NekoLink: 内容不是 JSON 对象")
+        try:
+            return cls._from_nekoray_meta(kind, meta)
+        except LinkError:
+            raise
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            # 端口不是数字、嵌套配置的类型不符等
+            raise LinkError(f"无效的 NekoLink 字段: {e!r}") from None
+
+    @classmethod
+    def _from_nekoray_meta(cls, kind: str, meta: dict) -> "HysteriaLink":
+        if kind == "custom" or "cs" in meta:
+            # 自定义核心：cs 为 hysteria2 原生客户端配置
+            try:
+                conf = json.loads(meta["cs"])
+            except (KeyError, TypeError, ValueError) as e:
+                raise LinkError(f"无效的 NekoRay 自定义配置: {e}") from None
+            tls = conf.get("tls") or {}
+            obfs = conf.get("obfs") or {}
+            obfs_type = obfs.get("type")
+            server = conf.get("server", "")
+            _, _, ports = server.rpartition(":")
+            return cls(
+                server=meta.get("addr", ""),
+                port=int(meta.get("port") or 443),
+                password=conf.get("auth", ""),
+                name=meta.get("name", ""),
+                sni=tls.get("sni", ""),
+                insecure=bool(tls.get("insecure")),
+                obfs=obfs_type,
+                obfs_password=(obfs.get(obfs_type) or {}).get("password") if obfs_type else None,
+                pin_sha256=tls.get("pinSHA256"),
+                mport=ports if ports and not ports.isdigit() else None,
+            )
+        if kind != "hysteria2":
+            raise LinkError(f"不支持的 NekoLink 类型: {kind}")
+        return cls(
+            server=meta.get("addr", ""),
+            port=int(meta.get("port") or 443),
+            password=meta.get("password", ""),
+            name=meta.get("name", ""),
+            sni=meta.get("sni", ""),
+            insecure=bool(meta.get("allowInsecure")),
+            obfs="salamander" if meta.get("obfsPassword") else None,
+            obfs_password=meta.get("obfsPassword") or None,
+            pin_sha256=meta.get("pinSHA256"),
+            mport=meta.get("hopPort") or None,
+        )
+
+    def to_nekoray(self) -> str:
+        meta = {
+            "_v": 0,
+            "name": self.name,
+            "addr": self.server,
+            "port": self.port,
+            "password": self.password,
+            "sni": self.sni,
+            "allowInsecure": self.insecure,
+        }
+        if self.obfs_password:
+            meta["obfsPassword"] = self.obfs_password
+        if self.mport:
+            meta["hopPort"] = self.mport
+        if self.pin_sha256:
+            # NekoRay 会忽略该字段，保留它以便无损往返
+            meta["pinSHA256"] = self.pin_sha256
+        code = base64.b64encode(json.dumps(meta, separators=(",", ":")).encode()).decode()
+        return f"nekoray://hysteria2#{code}"
+
+    # --- Clash.Meta proxies ---
+
+    @classmethod
+    def from_clash_proxy(cls, proxy: dict) -> "HysteriaLink":
+        if proxy.get("type") != constants.MIHOMO_LISTEN_TYPE:
+            raise LinkError(f"不支持的代理类型: {proxy.get('type')}")
+        return cls(
+            server=str(proxy["server"]),
+            port=int(proxy["port"]),
+            password=str(proxy.get("password", "")),
+            name=str(proxy.get("name", "")),
+            sni=proxy.get("sni", ""),
+            insecure=bool(proxy.get("skip-cert-verify")),
+            obfs=proxy.get("obfs"),
+            obfs_password=proxy.get("obfs-password"),
+            pin_sha256=proxy.get("fingerprint"),
+            mport=proxy.get("ports"),
+        )
+
+    def to_clash_proxy(self) -> dict:
+        # https://wiki.metacubex.one/config/proxies/hysteria2/
+        proxy = {
+            "name": self.name or self.sni or self.server,
+            "type": constants.MIHOMO_LISTEN_TYPE,
+            "server": self.server,
+            "port": self.port,
+            "password": self.password,
+            "sni": self.sni,
+            "skip-cert-verify": self.insecure,
+        }
+        if self.mport:
+            proxy["ports"] = self.mport
+        if self.obfs:
+            proxy["obfs"] = self.obfs
+            if self.obfs_password:
+                proxy["obfs-password"] = self.obfs_password
+        if self.pin_sha256:
+            proxy["fingerprint"] = self.pin_sha256
+        return proxy
+
+    def to_profile(self) -> ClientProfile:
+        return ClientProfile(
+            name=self.name or self.sni or self.server,
+            server=self.server,
+            port=self.port,
+            password=self.password,
+            sni=self.sni,
+            skip_cert_verify=self.insecure,
+            obfs=self.obfs,
+            obfs_password=self.obfs_password,
+            pin_sha256=self.pin_sha256,
+        )
+
+
+def parse_link(line: str) -> HysteriaLink:
+    line = line.strip()
+    if line.startswith("nekoray://"):
+        return HysteriaLink.from_nekoray(line)
+    return HysteriaLink.from_uri(line)
+
+
+class SkippedLines:
+    """
+    非严格模式下被跳过的行：记录总数与前 limit 条 (行号, 原因)，
+    内存占用与输入文件的大小无关。
+    """
+
+    def __init__(self, limit: int = 10):
+        self.limit = limit
+        self.count = 0
+        self.samples: list[tuple[int, str]] = []
+
+    def add(self, lineno: int, reason: str):
+        self.count += 1
+        if len(self.samples) < self.limit:
+            self.samples.append((lineno, reason))
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def iter_links(
+    lines: Iterable[str], errors: Optional[SkippedLines] = None
+) -> Iterator[HysteriaLink]:
+    """
+    逐行解析链接，跳过空行与注释。
+    无法解析的行在 errors 不为 None 时记录到 errors 并跳过，否则抛出 LinkError。
+    """
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield parse_link(line)
+        except LinkError as e:
+            if errors is None:
+                raise LinkError(f"第 {lineno} 行: {e}") from None
+            errors.add(lineno, str(e))
+
+
+def format_link(link: HysteriaLink, fmt: str) -> str:
+    """按输出格式生成一行（clash 格式为 proxies 下的一个列表项）"""
+    if fmt in SCHEMES:
+        return link.to_uri(fmt)
+    if fmt == "nekoray":
+        return link.to_nekoray()
+    if fmt == "clash":
+        # JSON 是合法的 YAML flow 映射，逐条序列化比调用 YAML 发射器快一个数量级
+        return "- " + json.dumps(link.to_clash_proxy(), ensure_ascii=False)
+    raise LinkError(f"未知的输出格式: {fmt}，可选 {', '.join(OUTPUT_FORMATS)}")
@@ -1,27 +1,40 @@
 """服务核心管理逻辑"""
 
+import json
 import logging
 import os
 import shutil
 import subprocess
 import sys
+import time
 import uuid
+from pathlib import Path
 from typing import Optional
 
 import yaml
-from hy2d.core import constants, utils
+from hy2d.core import (
+    certs,
+    configdiff,
+    configs,
+    constants,
+    controller,
+    dnscheck,
+    journal,
+    masquerade,
+    models,
+    output,
+    renderers,
+    snapshot,
+    tracing,
+    utils,
+)
 from hy2d.core.constants import (
     TOOL_NAME,
-    MASQUERADE_WEBSITE,
     COMPOSE_SERVICE_NAME,
-    COMPOSE_CONTAINER_PREFIX,
-    MIHOMO_LISTEN_TYPE,
-    MIHOMO_LISTENER_NAME_PREFIX,
-    DEFAULT_CLIENT_CONFIG,
-    SHARE_LINK_TPL,
 )
+from hy2d.core.reconciler import ServiceAction
+from hy2d.core.runtime import Runtime, RuntimeConfig, create_runtime
 from rich.console import Console
-from rich.syntax import Syntax
 
 
 class Hysteria2Manager:
@@ -29,43 +42,16 @@ class Hysteria2Manager:
 
     def __init__(self):
         """初始化管理器"""
-        self.console = Console()
-        self.compose_cmd: Optional[list[str]] = None
-
-    def _get_compose_cmd(self) -> list[str]:
-        """检测并返回可用的 docker compose 命令，并缓存结果。"""
-        if self.compose_cmd:
-            return self.compose_cmd
+        # 结构化输出模式下不产生任何终端输出
+        self.console = Console(quiet=output.structured())
+        self._runtime: Optional[Runtime] = None
 
-        try:
-            # 优先使用 "docker compose" (V2)
-            utils.run_command(
-                ["docker", "compose", "version"],
-                capture_output=True,
-                install_docker=True,
-                skip_execution_logging=True,
-                propagate_exception=True,
-            )
-            self.compose_cmd = ["docker", "compose"]
-            logging.debug("检测到 Docker Compose V2 (docker compose)，将使用此命令。")
-            return self.compose_cmd
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            # 回退到 "docker-compose" (V1)
-            logging.debug("未检测到 'docker compose' (V2)，尝试 'docker-compose' (V1)...")
-            try:
-                utils.run_command(
-                    ["docker-compose", "--version"],
-                    capture_output=True,
-                    install_docker=True,
-                    skip_execution_logging=True,
-                    propagate_exception=True,
-                )
-                self.compose_cmd = ["docker-compose"]
-                logging.debug("检测到 Docker Compose V1 (docker-compose)，将使用此命令。")
-                return self.compose_cmd
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                # 两个都找不到，这个异常将在 _check_dependencies 中被捕获并处理
-                raise FileNotFoundError("未找到 'docker compose' 或 'docker-compose'。")
+    @property
+    def runtime(self) -> Runtime:
+        """当前服务使用的运行时后端 (docker | systemd)，按工作目录中的 runtime.yaml 选择"""
+        if self._runtime is None:
+            self._runtime = create_runtime()
+        return self._runtime
 
     @staticmethod
     def _ensure_service_installed():
@@ -77,41 +63,27 @@ class Hysteria2Manager:
 
     @staticmethod
     def _get_domain_from_config() -> str:
-        """从 docker-compose.yaml 文件中解析出域名"""
+        """从服务定义 (docker-compose.yaml) 中解析出域名"""
         if not constants.DOCKER_COMPOSE_PATH.exists():
             logging.error(
                 f"配置文件 {constants.DOCKER_COMPOSE_PATH} 不存在。您是否已经安装了服务？"
             )
             sys.exit(1)
-
-        with constants.DOCKER_COMPOSE_PATH.open("r") as f:
-            data = yaml.safe_load(f)
-            container_name = data["services"][COMPOSE_SERVICE_NAME]["container_name"]
-            domain = container_name.split(COMPOSE_CONTAINER_PREFIX)[-1]
-            if not domain:
-                raise ValueError
-            return domain
+        return models.load_service().domain
 
     @staticmethod
-    def _as_share_link(client_config: dict) -> str:
-        return SHARE_LINK_TPL.format(
-            pwd=client_config.get("password", ""),
-            server=client_config.get("server", ""),
-            port=client_config.get("port", ""),
-            sni=client_config.get("sni", ""),
-            alias=client_config.get("sni", ""),
-        )
+    def _client_config(profile: models.ClientProfile) -> dict:
+        """结构化输出中的客户端配置"""
+        return {
+            "mihomo": renderers.get_renderer("mihomo").build(profile),
+            "share_link": renderers.render("share-link", profile),
+        }
 
-    def _preview_fmt_client_config(
-        self, *, domain: str, public_ip: str, port: int | str, password: str
-    ):
-        runtime_config = DEFAULT_CLIENT_CONFIG.copy()
-        runtime_config.update(
-            {"name": domain, "server": public_ip, "port": port, "password": password, "sni": domain}
-        )
+    def _preview_fmt_client_config(self, profile: models.ClientProfile):
+        from rich.syntax import Syntax
 
-        client_yaml = yaml.dump([runtime_config], sort_keys=False)
-        share_link = self._as_share_link(runtime_config)
+        client_yaml = renderers.render("mihomo", profile)
+        share_link = renderers.render("share-link", profile)
 
         self.console.print("\n" + "=" * 21 + " Mihomo 客户端配置 " + "=" * 21)
         self.console.print(Syntax(client_yaml, "yaml"))
@@ -123,38 +95,48 @@ class Hysteria2Manager:
 
         self.console.print(f"详见客户端配置文档：{constants.MIHOMO_PROXIES_DOCS}\n")
 
+    @staticmethod
+    def _validate_obfs(obfs: Optional[str]):
+        if obfs and obfs not in constants.OBFS_TYPES:
+            raise ValueError(f"不支持的混淆类型: {obfs}，可选 {', '.join(constants.OBFS_TYPES)}")
+        if obfs:
+            logging.warning("启用混淆后服务端不再响应标准 QUIC/HTTP3 请求，伪装站点将不可见。")
+
+    @staticmethod
+    def _check_dual_stack(domain: str, ipv4: Optional[str], ipv6: Optional[str]) -> bool:
+        """
+        本机同时具备 IPv4 与 IPv6 出口，且域名的 A 与 AAAA 记录都指向本机时返回 True，
+        此时客户端配置以域名作为服务器地址，由客户端选择延迟更低的地址族。
+        """
+        if ipv4 and ":" in ipv4:
+            ipv4, ipv6 = None, ipv4
+        records = utils.resolve_domain(domain)
+        if ipv6 and records["ipv6"] and ipv6 not in records["ipv6"]:
+            logging.warning(
+                f"域名 {domain} 的 AAAA 记录 ({', '.join(sorted(records['ipv6']))}) "
+                f"未指向本机 IPv6 地址 {ipv6}，IPv6 客户端将无法连接。"
+            )
+            return False
+        if ipv6 and not records["ipv6"]:
+            logging.info(
+                f"本机具备 IPv6 出口 ({ipv6})，为 {domain} 添加 AAAA 记录即可启用双栈接入。"
+            )
+        if ipv4 and records["ipv4"] and ipv4 not in records["ipv4"]:
+            logging.warning(f"域名 {domain} 的 A 记录未指向本机 IPv4 地址 {ipv4}。")
+            return False
+        return bool(ipv4 and ipv6 and ipv4 in records["ipv4"] and ipv6 in records["ipv6"])
+
+    @tracing.traced()
     def _check_dependencies(self, auto_install: bool = False) -> bool:
         """
-        检查 Docker 和 Docker Compose 是否安装。
-        :param auto_install: 如果为 True，当 Docker 未安装时，会提示并尝试自动安装。
-        :return: 如果 Docker 之前未安装，并且本次成功安装了，则返回 True。否则返回 False。
+        检查当前运行时后端的依赖（Docker 或 systemd）。
+        :param auto_install: 如果为 True，依赖缺失时尝试自动安装。
+        :return: 如果本次执行了安装则返回 True，否则返回 False。
         """
-        logging.info("正在检查 Docker 和 Docker Compose 环境...")
-        try:
-            utils.run_command(["docker", "--version"], capture_output=True, install_docker=True)
-            self._get_compose_cmd()  # 检测并缓存 docker compose 命令
-            logging.info("Docker 和 Docker Compose 已安装。")
-            return False  # 已安装，未执行安装
-        except (FileNotFoundError, subprocess.CalledProcessError):
-            logging.warning("未检测到 Docker 或 Docker Compose。")
-            if auto_install:
-                logging.info("开始自动安装 Docker 和 Docker Compose...")
-                utils.run_command(["/bin/bash", "-c", utils.DOCKER_INSTALL_SCRIPT])
-                logging.info(
-                    "安装完成。您可能需要重新登录或运行 `newgrp docker` "
-                    "以便非 root 用户无需 sudo 即可运行 docker。"
-                )
-                return True  # 执行了安装
-            else:
-                # 如果不是在主安装流程中，仅检查而不安装
-                logging.error("请先运行 'install' 命令来安装所有依赖。")
-                sys.exit(1)
-        except Exception as e:
-            logging.error(e)
-            # 在这种未知错误下，我们应该退出而不是继续
-            sys.exit(1)
+        return self.runtime.ensure_dependencies(auto_install=auto_install)
 
     @staticmethod
+    @tracing.traced()
     def _check_certbot(auto_install: bool = False) -> bool:
         """
         检查 Certbot 是否安装，并根据需要自动安装。
@@ -163,7 +145,9 @@ class Hysteria2Manager:
         :return: 如果 Certbot 之前未安装，并且本次成功安装了，则返回 True。否则返回 False。
         """
         logging.info("正在检查 Certbot 是否安装...")
-        if shutil.which("certbot"):
+        with utils.timed("Certbot"):
+            found = shutil.which("certbot")
+        if found:
             logging.info("Certbot 已安装。")
             return False  # Certbot 已存在，未进行安装
 
@@ -202,13 +186,23 @@ class Hysteria2Manager:
             utils.run_command(
                 ["sudo", "ln", "-s", "/snap/bin/certbot", "/usr/bin/certbot"], check=False
             )
-            logging.info("Certbot 安装成功！它将自动处理证书续期。")
-            return True  # 进行了安装
         except Exception as e:
             logging.error(f"使用 Snap 安装 Certbot 失败: {e}")
             logging.error("请参考 https://certbot.eff.org/instructions 手动安装后重试。")
             sys.exit(1)
 
+        # 在当前进程中刷新 PATH（/snap/bin），只重新探测 certbot
+        utils.refresh_environment()
+        with utils.timed("Certbot"):
+            found = shutil.which("certbot")
+        if not found:
+            logging.error("Certbot 安装完成，但在 PATH 中找不到 certbot 命令。")
+            logging.error("请重新登录后再次运行安装命令。")
+            sys.exit(1)
+        logging.info(f"Certbot 安装成功 ({found})！它将自动处理证书续期。")
+        return True  # 进行了安装
+
+    @tracing.traced()
     def _check_bbr(self):
         """
         检查并尝试开启 BBR 拥塞控制算法。
@@ -216,22 +210,13 @@ class Hysteria2Manager:
         """
         logging.info("正在检查并尝试开启 BBR+Cake...")
         try:
-            # 1. 检查 BBR 是否已经开启
-            qdisc_res = utils.run_command(
-                ["sysctl", "net.core.default_qdisc"],
-                capture_output=True,
-                check=False,
-                skip_execution_logging=True,
-            )
-            tcp_cong_res = utils.run_command(
-                ["sysctl", "net.ipv4.tcp_congestion_control"],
-                capture_output=True,
-                check=False,
-                skip_execution_logging=True,
-            )
+            # 1. 检查 BBR 是否已经开启（并发读取）
+            keys = ["net.core.default_qdisc", "net.ipv4.tcp_congestion_control"]
+            with utils.timed("BBR"):
+                current = utils.read_sysctl(keys)
 
-            qdisc_ok = qdisc_res.returncode == 0 and "cake" in qdisc_res.stdout
-            tcp_cong_ok = tcp_cong_res.returncode == 0 and "bbr" in tcp_cong_res.stdout
+            qdisc_ok = "cake" in (current[keys[0]] or "")
+            tcp_cong_ok = "bbr" in (current[keys[1]] or "")
 
             if qdisc_ok and tcp_cong_ok:
                 logging.info("BBR+Cake 已成功开启。")
@@ -258,150 +243,681 @@ class Hysteria2Manager:
 
             # 4. 再次检查
             logging.info("正在验证 BBR+Cake 是否成功开启...")
-            qdisc_res_after = utils.run_command(
-                ["sysctl", "net.core.default_qdisc"], capture_output=True, propagate_exception=True
-            )
-            tcp_cong_res_after = utils.run_command(
-                ["sysctl", "net.ipv4.tcp_congestion_control"],
-                capture_output=True,
-                propagate_exception=True,
-            )
+            after = utils.read_sysctl(keys)
+            qdisc, tcp_cong = after[keys[0]] or "", after[keys[1]] or ""
 
-            if "cake" in qdisc_res_after.stdout and "bbr" in tcp_cong_res_after.stdout:
+            if "cake" in qdisc and "bbr" in tcp_cong:
                 logging.info("BBR+Cake 成功开启！")
             else:
                 logging.warning("BBR+Cake 配置已应用，但验证未完全成功。可能需要重启系统才能生效。")
-                logging.warning(
-                    f"当前 qdisc: {qdisc_res_after.stdout.strip()}, tcp_congestion_control: {tcp_cong_res_after.stdout.strip()}"
-                )
+                logging.warning(f"当前 qdisc: {qdisc}, tcp_congestion_control: {tcp_cong}")
 
         except Exception as e:
             logging.warning(f"自动开启 BBR 失败: {e}")
             logging.warning(f"这通常不会影响 {TOOL_NAME} 的核心功能，但可能会影响网络性能。")
             logging.warning("您可以参考相关文档手动开启 BBR。")
 
-    def install(
-        self, domain: str, password: Optional[str], ip: Optional[str], port: int, image: str
+    @staticmethod
+    @tracing.traced()
+    def _issue_certificate(
+        domain: str, public_ip: Optional[str] = None, acme: Optional[certs.AcmeOptions] = None
     ):
-        """安装并启动服务"""
-        # --- 步骤 1/4: 初始检查和依赖安装 ---
-        logging.info("--- 步骤 1/4: 开始环境检查与依赖安装 ---")
+        """按指定的验证方式为域名申请证书，并安装续期钩子；失败时退出"""
+        acme = acme or certs.AcmeOptions()
+        try:
+            acme.validate()
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
 
-        # 检查并安装 Docker & Certbot
-        # 如果安装了任何一个，脚本需要重启以加载新环境
-        docker_installed_now = self._check_dependencies(auto_install=True)
-        certbot_installed_now = self._check_certbot(auto_install=True)
+        logging.info(f"正在为域名 {domain} 申请 Let's Encrypt 证书 (验证方式: {acme.mode})...")
+        try:
+            utils.run_command(acme.certbot_args(domain), propagate_exception=True)
+            logging.info("证书申请成功。")
+        except (FileNotFoundError, subprocess.CalledProcessError) as e:
+            logging.error(f"证书申请失败: {e}")
+            logging.error("请检查：")
+            if acme.mode == "dns":
+                logging.error(f"  1. 是否已安装 certbot-dns-{acme.dns_plugin} 插件。")
+                logging.error("  2. DNS 服务商凭据文件是否正确。")
+            else:
+                logging.error(
+                    f"  1. 域名 '{domain}' 是否正确解析到本机 IP 地址 ({public_ip or '本机公网 IP'})。"
+                )
+                logging.error("  2. 服务器防火墙是否已放开 80 端口。")
+                if acme.mode == "webroot":
+                    logging.error(f"  3. {acme.webroot_path} 是否为 80 端口站点的根目录。")
+            sys.exit(1)
 
-        # 检查并开启 BBR (尽力而为)
-        self._check_bbr()
+        try:
+            hook = certs.install_deploy_hook()
+            logging.info(f"已安装证书续期钩子: {hook}")
+        except OSError as e:
+            logging.warning(f"安装证书续期钩子失败: {e}。证书续期后需要手动重启服务。")
 
-        if docker_installed_now or certbot_installed_now:
-            logging.warning("依赖项已成功安装。为了使环境更改完全生效，脚本将自动重新执行。")
-            logging.warning("如果脚本没有自动重启，请手动重新运行您刚才执行的命令。")
-            try:
-                os.execv(sys.executable, [sys.executable] + sys.argv)
-            except Exception as e:
-                logging.error(f"脚本自动重启失败: {e}")
-                logging.error("请手动重新运行您刚才执行的命令以继续安装。")
-                sys.exit(1)
+    @tracing.traced()
+    def _container_status(self, domain: str) -> Optional[str]:
+        """
+        返回服务的状态文本，运行中以 "Up" 开头。
+        服务不存在时返回空字符串，运行时不可用时返回 None。
+        """
+        return self.runtime.status(domain)
+
+    @tracing.traced()
+    def _preflight(self, mihomo_cfg: dict, compose_cfg: dict, verify_image: bool = False):
+        """在重启服务之前预检候选配置，存在错误时退出且不影响正在运行的实例"""
+        from hy2d.core import validate
+
+        logging.info("正在预检配置...")
+        try:
+            running_cfg = configs.load_yaml(constants.CONFIG_PATH)
+        except (FileNotFoundError, yaml.YAMLError):
+            running_cfg = None
+
+        report = validate.preflight(
+            mihomo_cfg,
+            compose_cfg,
+            dry_run=verify_image,
+            running_cfg=running_cfg,
+            runtime=self.runtime,
+        )
+        for issue in report.issues:
+            log = logging.error if issue.level == "error" else logging.warning
+            log(f"[{issue.check}] {issue.message}")
+        if not report.ok:
+            logging.error("配置预检未通过，已中止操作，当前运行的服务未受影响。")
+            sys.exit(1)
+        logging.info("配置预检通过。" + (" (命中缓存)" if report.cached else ""))
+        return report
+
+    @tracing.traced()
+    def _reload_service(self):
+        """热重载配置；未启用 external-controller 或重载失败时回退为重启容器"""
+        try:
+            mihomo_cfg = configs.load_yaml(constants.CONFIG_PATH) or {}
+        except FileNotFoundError:
+            mihomo_cfg = {}
+        if controller.reload_config(mihomo_cfg):
+            logging.info("配置已热重载。")
+            return
+        logging.info("热重载不可用，改为重启服务容器。")
+        self._restart_service()
+
+    @tracing.traced()
+    def _restart_service(self):
+        """重启服务，不重建"""
+        self.runtime.restart()
 
-            # execv会替换当前进程，所以下面的代码在新进程中才会执行
-            return  # 在当前进程中，到此为止
+    @tracing.traced()
+    def _recreate_service(self):
+        """按当前服务定义重建并启动服务"""
+        self.runtime.recreate()
 
-        logging.info("--- 所有依赖均已满足 ---")
+    @tracing.traced()
+    def install(
+        self,
+        domain: str,
+        password: Optional[str],
+        ip: Optional[str],
+        port: int,
+        image: str,
+        assume_yes: bool = False,
+        verify_image: bool = False,
+        acme: Optional[certs.AcmeOptions] = None,
+        resume: bool = True,
+        runtime_config: Optional[RuntimeConfig] = None,
+        masquerade_url: str = constants.MASQUERADE_WEBSITE,
+        masquerade_mirror: bool = False,
+        obfs: Optional[str] = None,
+        obfs_password: Optional[str] = None,
+        alpn: Optional[list[str]] = None,
+        pin_certificate: bool = False,
+        listen: Optional[str] = None,
+        check_dns: bool = True,
+    ):
+        """
+        安装并启动服务。
+        安装过程被拆分为依赖图中的多个任务，相互独立的任务（如镜像拉取与证书申请、
+        BBR 调优与 Snap 安装）并发执行。每个成功的任务都会写入检查点，
+        以相同参数重新运行时从上次失败的位置继续。
+        """
+        from hy2d.core.pipeline import Checkpoint, Pipeline, PipelineError, Task
+
+        acme = acme or certs.AcmeOptions()
+        runtime_config = runtime_config or RuntimeConfig()
+        try:
+            acme.validate()
+            self._validate_obfs(obfs)
+            self._runtime = create_runtime(runtime_config)
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
+        fingerprint = configs.content_hash(
+            json.dumps(
+                [
+                    str(constants.BASE_DIR),
+                    domain,
+                    password,
+                    ip,
+                    port,
+                    image,
+                    acme.__dict__,
+                    runtime_config.dump(),
+                    masquerade_url,
+                    masquerade_mirror,
+                    obfs,
+                    obfs_password,
+                    alpn,
+                    pin_certificate,
+                    listen,
+                ],
+                sort_keys=True,
+            )
+        )
+        checkpoint_path = constants.INSTALL_CHECKPOINT_PATH
+        if resume:
+            checkpoint = Checkpoint.load(checkpoint_path, fingerprint)
+        else:
+            checkpoint = Checkpoint(checkpoint_path, fingerprint)
 
-        logging.info(f"--- 步骤 2/4: 开始安装 {TOOL_NAME} 服务 (域名: {domain}) ---")
-        if constants.BASE_DIR.exists():
+        if checkpoint.done:
+            logging.info(
+                f"检测到未完成的安装，将从上次成功的步骤继续: {', '.join(checkpoint.done)}"
+            )
+        elif constants.BASE_DIR.exists():
             logging.warning(f"工作目录 {constants.BASE_DIR} 已存在。继续操作将可能覆盖现有配置。")
-            if self.console.input("是否继续？ (y/n): ").lower() != "y":
+            if not assume_yes and output.structured():
+                logging.error("结构化输出模式下无法交互确认，请使用 -y 覆盖现有配置。")
+                sys.exit(1)
+            if not assume_yes and self.console.input("是否继续？ (y/n): ").lower() != "y":
                 logging.info("安装已取消。")
                 return
 
-        public_ip = ip or utils.get_public_ip()
-        service_password = password or utils.generate_password()
+        logging.info(f"--- 开始安装 {TOOL_NAME} 服务 (域名: {domain}) ---")
+        # 上次运行中安装的依赖（如 /snap/bin/certbot）可能尚未出现在当前 shell 的 PATH 中
+        utils.refresh_environment()
+
+        # 跨运行保留的上下文，保证断点续装时生成的密码与用户名保持一致
+        ctx = checkpoint.context
+        ctx.setdefault("password", password or utils.generate_password())
+        ctx.setdefault("user", f"user_{uuid.uuid4().hex[:8]}")
+        if obfs:
+            ctx.setdefault("obfs_password", obfs_password or utils.generate_password(24))
+        if ip:
+            ctx["public_ip"] = ip
+
+        def validate_domain():
+            known = None
+            if ctx.get("public_ip"):
+                ip = ctx["public_ip"]
+                known = utils.PublicAddresses(
+                    ipv4=None if ":" in ip else ip,
+                    ipv6=ip if ":" in ip else ctx.get("public_ipv6"),
+                )
+            report = dnscheck.validate_domain(domain, public=known, acme_mode=acme.mode)
+            for warning in report.warnings:
+                logging.warning(warning)
+            if not report.ok:
+                for error in report.errors:
+                    logging.error(error)
+                raise RuntimeError(
+                    f"域名 {domain} 校验未通过。确认无误时可使用 --skip-dns-check 跳过该检查。"
+                )
+            # 出口地址已在校验中并发检测，后续的 public-ip 任务直接复用
+            if not ctx.get("public_ip") and report.public.primary:
+                ctx["public_ip"] = report.public.primary
+                ctx["public_ipv6"] = report.public.ipv6
+            logging.info(f"域名解析校验通过 ({report.duration:.1f}s)")
+
+        def detect_public_ip():
+            if not ctx.get("public_ip"):
+                addresses = utils.get_public_addresses()
+                if not addresses.primary:
+                    raise RuntimeError("无法自动获取公网 IP，请使用 --ip 参数手动指定。")
+                ctx["public_ip"] = addresses.primary
+                ctx["public_ipv6"] = addresses.ipv6
+
+        def issue_certificate():
+            self._issue_certificate(domain, ctx.get("public_ip"), acme)
+
+        def pull_image():
+            self.runtime.prepare(image)
+
+        def mirror_masquerade():
+            self._sync_masquerade(masquerade_url)
+
+        def write_config():
+            dual_stack = self._check_dual_stack(
+                domain, ctx.get("public_ip"), ctx.get("public_ipv6")
+            )
+            listener = configs.build_listener(
+                domain=domain,
+                port=port,
+                users={ctx["user"]: ctx["password"]},
+                listen=listen
+                or (constants.DUAL_STACK_LISTEN if utils.ipv6_available() else "0.0.0.0"),
+                masquerade=masquerade.file_url() if masquerade_mirror else masquerade_url,
+                obfs=obfs,
+                obfs_password=ctx.get("obfs_password"),
+                alpn=alpn,
+            )
+            mihomo_cfg = configs.build_mihomo_config([listener])
+            compose_cfg = configs.build_compose_config(
+                domain, image, constants.MASQUERADE_DIR if masquerade_mirror else None
+            )
+            self._preflight(mihomo_cfg, compose_cfg, verify_image=verify_image)
+
+            logging.info(f"正在创建工作目录: {constants.BASE_DIR}")
+            constants.BASE_DIR.mkdir(exist_ok=True)
+            journal.commit_files(
+                {
+                    constants.CONFIG_PATH: configs.dump_yaml(mihomo_cfg),
+                    constants.DOCKER_COMPOSE_PATH: configs.dump_yaml(compose_cfg),
+                    constants.RUNTIME_CONFIG_PATH: runtime_config.dump(),
+                    constants.CLIENT_OPTIONS_PATH: configs.dump_yaml(
+                        {"pin-sha256": pin_certificate, "dual-stack": dual_stack}
+                    ),
+                },
+                reason="install",
+            )
+            logging.info(f"已生成配置文件: {constants.CONFIG_PATH}")
+            logging.info(f"已生成 Docker Compose 文件: {constants.DOCKER_COMPOSE_PATH}")
+
+        def start_service():
+            self._recreate_service()
+
+        apt = frozenset({"apt"})
+        # 域名校验最先执行，失败时不会开始安装依赖、拉取镜像或申请证书
+        gate = ("dns",) if check_dns else ()
+        tasks = [
+            Task(
+                "runtime",
+                lambda: self._check_dependencies(auto_install=True),
+                deps=gate,
+                description=f"检查运行时依赖 ({runtime_config.backend})",
+                resources=apt,
+                resumable=False,
+            ),
+            Task(
+                "certbot",
+                lambda: self._check_certbot(auto_install=True),
+                deps=gate,
+                description="检查并安装 Certbot",
+                resources=apt,
+                resumable=False,
+            ),
+            Task("bbr", self._check_bbr, deps=gate, description="开启 BBR+Cake"),
+            Task("public-ip", detect_public_ip, deps=gate, description="检测公网 IP"),
+            Task("cert", issue_certificate, deps=("certbot",), description="申请证书"),
+            Task("pull", pull_image, deps=("runtime",), description="准备服务镜像或二进制"),
+            Task(
+                "config",
+                write_config,
+                deps=(
+                    ("cert", "public-ip", "masquerade")
+                    if masquerade_mirror
+                    else ("cert", "public-ip")
+                ),
+                description="生成并预检配置",
+            ),
+            Task(
+                "up",
+                start_service,
+                deps=("runtime", "config", "pull", "bbr"),
+                description="启动服务",
+                resumable=False,
+            ),
+        ]
+
+        if check_dns:
+            tasks.insert(
+                0,
+                Task(
+                    "dns",
+                    validate_domain,
+                    description="校验域名解析与 80 端口",
+                    resumable=False,
+                ),
+            )
+        if masquerade_mirror:
+            tasks.append(
+                Task("masquerade", mirror_masquerade, deps=gate, description="镜像伪装站点")
+            )
 
-        logging.info("--- 步骤 3/4: 申请证书与生成配置 ---")
-        logging.info(f"正在为域名 {domain} 申请 Let's Encrypt 证书...")
+        pipeline = Pipeline(tasks, checkpoint=checkpoint)
         try:
-            utils.run_command(
+            results = pipeline.run()
+        except PipelineError as e:
+            self._print_pipeline_timing(pipeline.results)
+            if isinstance(e.error, SystemExit):
+                logging.error("安装未完成。修复问题后重新运行相同的命令即可从失败的步骤继续。")
+                raise e.error
+            logging.error(f"{e}")
+            logging.error("安装未完成。修复问题后重新运行相同的命令即可从失败的步骤继续。")
+            sys.exit(1)
+
+        checkpoint.clear()
+        snapshot.put(domain, public_ip=ctx["public_ip"], status=self._container_status(domain))
+        self._print_pipeline_timing(results)
+        logging.info(f"--- {TOOL_NAME} 服务安装并启动成功！ ---")
+
+        # 打印客户端配置
+        profile = models.load_deployment().client_profile(ctx["public_ip"])
+        if output.structured():
+            output.emit(
+                "install",
+                {"domain": domain, "public_ip": ctx["public_ip"], "port": port, "image": image},
+            )
+            output.emit("client", self._client_config(profile))
+            return
+        self._preview_fmt_client_config(profile)
+
+    def _print_pipeline_timing(self, results: dict):
+        if output.structured():
+            output.emit(
+                "steps",
                 [
-                    "certbot",
-                    "certonly",
-                    "--standalone",
-                    "--register-unsafely-without-email",
-                    "--agree-tos",
-                    "--non-interactive",
-                    "-d",
-                    domain,
+                    {
+                        "name": r.name,
+                        "description": r.description,
+                        "status": r.status,
+                        "duration": round(r.duration, 3),
+                    }
+                    for r in results.values()
                 ],
-                propagate_exception=True,
             )
-            logging.info("证书申请成功。")
-        except (FileNotFoundError, subprocess.CalledProcessError) as e:
-            logging.error(f"证书申请失败: {e}")
-            logging.error("请检查：")
-            logging.error(f"  1. 域名 '{domain}' 是否正确解析到本机 IP 地址 ({public_ip})。")
-            logging.error("  2. 服务器防火墙是否已放开 80 端口。")
+            return
+
+        from rich.table import Table
+
+        status_text = {
+            "done": "[green]✔ 完成[/green]",
+            "resumed": "[cyan]↷ 已跳过 (断点续装)[/cyan]",
+            "failed": "[red]❌ 失败[/red]",
+            "cancelled": "[yellow]- 未执行[/yellow]",
+        }
+        table = Table(title="安装步骤耗时")
+        table.add_column("步骤", style="cyan")
+        table.add_column("状态")
+        table.add_column("开始", justify="right")
+        table.add_column("耗时", justify="right")
+
+        executed = [r for r in results.values() if r.status == "done"]
+        origin = min((r.started for r in executed), default=0.0)
+        for result in sorted(results.values(), key=lambda r: (r.started == 0, r.started)):
+            ran = result.status == "done"
+            table.add_row(
+                result.description or result.name,
+                status_text.get(result.status, result.status),
+                f"+{result.started - origin:.1f}s" if ran else "-",
+                f"{result.duration:.1f}s" if ran else "-",
+            )
+        self.console.print(table)
+        if executed:
+            wall = max(r.started + r.duration for r in executed) - origin
+            serial = sum(r.duration for r in executed)
+            self.console.print(f"总耗时 {wall:.1f}s (串行执行约需 {serial:.1f}s)")
+        if utils.check_timings:
+            checks = ", ".join(f"{k} {v:.2f}s" for k, v in utils.check_timings.items())
+            self.console.print(f"环境检查耗时: {checks}")
+
+    @tracing.traced()
+    def apply(self, state_path: Path, dry_run: bool = False):
+        """按声明式期望状态调和服务，仅执行必要的最小变更"""
+        from rich.table import Table
+
+        from hy2d.core.reconciler import DesiredState, Reconciler, ServiceAction
+
+        try:
+            desired = DesiredState.from_yaml(state_path)
+        except FileNotFoundError:
+            logging.error(f"期望状态文件 {state_path} 不存在。")
+            sys.exit(1)
+        except (ValueError, TypeError, AttributeError, yaml.YAMLError) as e:
+            logging.error(f"期望状态文件无效: {e}")
             sys.exit(1)
 
-        logging.info(f"正在创建工作目录: {constants.BASE_DIR}")
-        constants.BASE_DIR.mkdir(exist_ok=True)
+        reconciler = Reconciler(self, desired)
+        plan = reconciler.plan()
 
-        # 创建 Mihomo 配置
-        mihomo_cfg_dict = {
-            "listeners": [
-                {
-                    "name": f"{MIHOMO_LISTENER_NAME_PREFIX}{uuid.uuid4()}",
-                    "type": MIHOMO_LISTEN_TYPE,
-                    "port": port,
-                    "listen": "0.0.0.0",
-                    "users": {f"user_{uuid.uuid4().hex[:8]}": service_password},
-                    "masquerade": MASQUERADE_WEBSITE,
-                    "certificate": f"/etc/letsencrypt/live/{domain}/fullchain.pem",
-                    "private-key": f"/etc/letsencrypt/live/{domain}/privkey.pem",
-                }
+        if plan.empty:
+            logging.info("实际状态与期望状态一致，无需变更。")
+            return
+
+        table = Table(title="变更计划")
+        table.add_column("对象", style="cyan")
+        table.add_column("变更", style="magenta")
+        for step in plan.steps:
+            table.add_row(step.target, step.detail)
+        if plan.service_action != ServiceAction.NOOP:
+            table.add_row(f"服务 ({plan.service_action.name.lower()})", plan.service_reason)
+        self.console.print(table)
+
+        if dry_run:
+            logging.info("dry-run 模式，未执行任何变更。")
+            return
+
+        self._check_dependencies()
+        constants.BASE_DIR.mkdir(parents=True, exist_ok=True)
+        reconciler.execute(plan)
+        logging.info("已收敛到期望状态。")
+
+    @tracing.traced()
+    def validate(self, verify_image: bool = False):
+        """预检当前的配置文件"""
+        self._ensure_service_installed()
+        try:
+            mihomo_cfg = configs.load_yaml(constants.CONFIG_PATH)
+            compose_cfg = configs.load_yaml(constants.DOCKER_COMPOSE_PATH)
+        except FileNotFoundError as e:
+            logging.error(f"配置文件未找到: {e.filename}")
+            sys.exit(1)
+        except yaml.YAMLError as e:
+            logging.error(f"配置文件不是合法的 YAML: {e}")
+            sys.exit(1)
+        self._preflight(mihomo_cfg, compose_cfg, verify_image=verify_image)
+
+    @tracing.traced()
+    def rollback(self, generation: Optional[int] = None, list_only: bool = False):
+        """将配置文件回滚到指定代际，并执行最小的重载动作"""
+        from rich.table import Table
+
+        self._ensure_service_installed()
+        config_journal = journal.Journal()
+        generations = config_journal.generations()
+        if not generations:
+            logging.error("没有可用的配置代际记录。")
+            sys.exit(1)
+
+        head = config_journal.head
+        if list_only:
+            table = Table(title="配置代际")
+            table.add_column("代际", justify="right", style="cyan")
+            table.add_column("时间")
+            table.add_column("原因", style="magenta")
+            table.add_column("文件")
+            for gen in reversed(generations):
+                marker = " *" if gen.generation == head else ""
+                files = ", ".join(f"{k}@{v[:8]}" for k, v in gen.files.items())
+                table.add_row(f"{gen.generation}{marker}", gen.time_str, gen.reason, files)
+            self.console.print(table)
+            return
+
+        target = generation if generation is not None else config_journal.previous()
+        try:
+            changed = config_journal.rollback(target)
+        except KeyError:
+            logging.error(f"代际 #{target} 不存在。使用 `heyhy rollback --list` 查看可用代际。")
+            sys.exit(1)
+
+        if not changed:
+            logging.info(f"配置已与代际 #{target} 一致，无需重载。")
+            return
+        for path in changed:
+            logging.info(f"已恢复: {path}")
+
+        if constants.RUNTIME_CONFIG_PATH in changed:
+            # 运行时后端或资源限制发生变化，按恢复后的 runtime.yaml 重新选择后端
+            self._runtime = None
+        if constants.DOCKER_COMPOSE_PATH in changed or constants.RUNTIME_CONFIG_PATH in changed:
+            self._recreate_service()
+        elif constants.CONFIG_PATH in changed:
+            self._reload_service()
+        logging.info(f"已回滚到代际 #{target}。")
+
+    @staticmethod
+    def _sync_masquerade(source: str, max_pages: int = constants.MASQUERADE_MAX_PAGES):
+        logging.info(f"正在镜像伪装站点 {source} 到 {constants.MASQUERADE_DIR} ...")
+        mirror = masquerade.Mirror(source, constants.MASQUERADE_DIR, max_pages=max_pages)
+        stats = mirror.sync()
+        logging.info(
+            f"伪装站点同步完成: 下载 {stats.fetched} 个、未变化 {stats.unchanged} 个、"
+            f"清理 {stats.removed} 个文件 ({stats.bytes / 1024:.0f} KiB, {stats.duration:.1f}s)"
+        )
+        for failure in stats.failed[:5]:
+            logging.warning(f"同步失败: {failure}")
+
+    @tracing.traced()
+    def masquerade_sync(
+        self,
+        source: Optional[str] = None,
+        enable: bool = False,
+        max_pages: int = constants.MASQUERADE_MAX_PAGES,
+    ):
+        """
+        增量同步伪装站点的本地镜像。
+        enable 为 True 时将所有 listener 的 masquerade 切换为本地镜像并重建服务。
+        """
+        self._ensure_service_installed()
+        mihomo_cfg = configs.load_yaml(constants.CONFIG_PATH)
+        local_url = masquerade.file_url()
+        if not source:
+            upstream = [
+                item.get("masquerade")
+                for item in mihomo_cfg.get("listeners") or []
+                if str(item.get("masquerade", "")).startswith("http")
             ]
-        }
+            source = masquerade.mirror_source() or next(iter(upstream), None)
+        source = source or constants.MASQUERADE_WEBSITE
 
-        with constants.CONFIG_PATH.open("w", encoding="utf8") as f:
-            yaml.dump(mihomo_cfg_dict, f, sort_keys=False)
-        logging.info(f"已生成配置文件: {constants.CONFIG_PATH}")
-
-        docker_compose_cfg_dict = {
-            "services": {
-                COMPOSE_SERVICE_NAME: {
-                    "image": image,
-                    "container_name": f"{COMPOSE_CONTAINER_PREFIX}{domain}",
-                    "restart": "always",
-                    "network_mode": "host",
-                    "working_dir": "/app/proxy-inbound/",
-                    "volumes": [
-                        "/etc/letsencrypt/:/etc/letsencrypt/",
-                        "./config.yaml:/app/proxy-inbound/config.yaml",
-                    ],
-                    "command": ["-f", "config.yaml", "-d", "/"],
-                }
-            }
-        }
-        with constants.DOCKER_COMPOSE_PATH.open("w", encoding="utf8") as f:
-            yaml.dump(docker_compose_cfg_dict, f, sort_keys=False)
-        logging.info(f"已生成 Docker Compose 文件: {constants.DOCKER_COMPOSE_PATH}")
-
-        compose_cmd = self._get_compose_cmd()
-        logging.info("--- 步骤 4/4: 启动服务 ---")
-        logging.info("正在拉取最新的 Docker 镜像...")
-        utils.run_command(compose_cmd + ["pull"], cwd=constants.BASE_DIR)
-        logging.info("正在启动服务...")
-        utils.run_command(compose_cmd + ["down"], cwd=constants.BASE_DIR, check=False)
-        utils.run_command(compose_cmd + ["up", "-d"], cwd=constants.BASE_DIR)
+        try:
+            self._sync_masquerade(source, max_pages=max_pages)
+        except (ConnectionError, OSError) as e:
+            logging.error(f"同步伪装站点失败: {e}")
+            sys.exit(1)
 
-        logging.info(f"--- {TOOL_NAME} 服务安装并启动成功！ ---")
+        if not enable:
+            if not any(item.get("masquerade") == local_url for item in mihomo_cfg["listeners"]):
+                logging.info("当前 listener 仍在反向代理上游站点，使用 --enable 切换到本地镜像。")
+            return
 
-        # 打印客户端配置
-        self._preview_fmt_client_config(
-            domain=domain, public_ip=public_ip, port=port, password=service_password
+        compose_cfg = configs.load_yaml(constants.DOCKER_COMPOSE_PATH)
+        for item in mihomo_cfg["listeners"]:
+            item["masquerade"] = local_url
+        volumes = compose_cfg["services"][COMPOSE_SERVICE_NAME].setdefault("volumes", [])
+        mount = f"{constants.MASQUERADE_DIR}:{constants.MASQUERADE_DIR}:ro"
+        if mount not in volumes:
+            volumes.append(mount)
+        self._preflight(mihomo_cfg, compose_cfg)
+        generation = journal.commit_files(
+            {
+                constants.CONFIG_PATH: configs.dump_yaml(mihomo_cfg),
+                constants.DOCKER_COMPOSE_PATH: configs.dump_yaml(compose_cfg),
+            },
+            reason="masquerade",
         )
+        logging.info(f"已切换到本地镜像的伪装站点 (代际 #{generation})，正在重建服务...")
+        self._recreate_service()
+
+    def cert_status(self, cert_path: Optional[Path] = None):
+        """显示证书有效期"""
+        from rich.table import Table
+
+        if cert_path:
+            paths = [cert_path]
+        else:
+            self._ensure_service_installed()
+            mihomo_cfg = configs.load_yaml(constants.CONFIG_PATH) or {}
+            paths = list(
+                dict.fromkeys(
+                    Path(listener["certificate"])
+                    for listener in mihomo_cfg.get("listeners") or []
+                    if listener.get("certificate")
+                )
+            )
+
+        table = Table(title="证书状态")
+        table.add_column("证书", style="cyan", overflow="fold")
+        table.add_column("域名")
+        table.add_column("签发者")
+        table.add_column("到期时间")
+        table.add_column("剩余", justify="right")
+        expired = False
+        for path in paths:
+            try:
+                info = certs.load_cert_info(path)
+            except (FileNotFoundError, ValueError) as e:
+                table.add_row(str(path), "-", "-", "-", f"[red]❌ {e}[/red]")
+                expired = True
+                continue
+            days = info.days_left
+            if info.expired:
+                left, expired = "[red]❌ 已过期[/red]", True
+            elif days < constants.CERT_EXPIRY_WARNING_DAYS:
+                left = f"[yellow]{days:.0f} 天[/yellow]"
+            else:
+                left = f"[green]{days:.0f} 天[/green]"
+            not_after = time.strftime("%Y-%m-%d %H:%M", time.localtime(info.not_after))
+            table.add_row(
+                str(path), ", ".join(info.san) or info.subject, info.issuer, not_after, left
+            )
+        self.console.print(table)
+        if expired:
+            sys.exit(1)
+
+    def cert_install_hook(self):
+        """安装 certbot deploy-hook"""
+        hook = certs.install_deploy_hook()
+        logging.info(f"已安装证书续期钩子: {hook}")
+
+    @tracing.traced()
+    def cert_deploy_hook(self):
+        """
+        certbot 续期成功后调用。
+        仅重建使用了续期证书的 listener，其余 listener 保持连接。
+        """
+        lineage = os.environ.get("RENEWED_LINEAGE")
+        if not lineage:
+            logging.error("未设置 RENEWED_LINEAGE，该命令应由 certbot 的 deploy-hook 调用。")
+            sys.exit(1)
+        if not constants.CONFIG_PATH.is_file():
+            logging.info("服务未安装，跳过。")
+            return
+
+        mihomo_cfg = configs.load_yaml(constants.CONFIG_PATH) or {}
+        affected = certs.affected_listeners(mihomo_cfg, lineage)
+        if not affected:
+            logging.info(f"没有 listener 使用 {lineage}，无需重载。")
+            return
 
+        for listener in affected:
+            certs.pin_renewed_certificate(listener)
+        journal.commit_files(
+            {constants.CONFIG_PATH: configs.dump_yaml(mihomo_cfg)}, reason="cert renewed"
+        )
+        logging.info(f"证书已续期，正在重载 {len(affected)} 个 listener...")
+        self._reload_service()
+
+    @tracing.traced()
+    def cert_renew(self, force: bool = False):
+        """续期证书。certbot 会沿用申请时的验证方式，并在成功后触发 deploy-hook"""
+        certs.install_deploy_hook()
+        cmd = ["certbot", "renew", "--non-interactive"]
+        if force:
+            cmd.append("--force-renewal")
+        utils.run_command(cmd)
+
+    @tracing.traced()
     def remove(self):
         """停止并移除服务和相关文件"""
         logging.info(f"--- 开始卸载 {TOOL_NAME} 服务 ---")
@@ -412,9 +928,8 @@ class Hysteria2Manager:
         domain = self._get_domain_from_config()
         logging.info(f"检测到正在管理的域名为: {domain}")
 
-        compose_cmd = self._get_compose_cmd()
-        logging.info("正在停止并移除 Docker 容器...")
-        utils.run_command(compose_cmd + ["down", "--volumes"], cwd=constants.BASE_DIR, check=False)
+        logging.info(f"正在停止并移除服务 ({self.runtime.name})...")
+        self.runtime.stop(purge=True)
 
         logging.info(f"正在删除工作目录: {constants.BASE_DIR}")
         shutil.rmtree(constants.BASE_DIR)
@@ -425,69 +940,125 @@ class Hysteria2Manager:
         )
         logging.info(f"--- {TOOL_NAME} 服务已成功卸载。 ---")
 
+    @tracing.traced()
     def start(self):
         """启动服务"""
         self._ensure_service_installed()
         logging.info(f"正在启动 {TOOL_NAME} 服务...")
-        compose_cmd = self._get_compose_cmd()
-        utils.run_command(compose_cmd + ["up", "-d"], cwd=constants.BASE_DIR)
+        self.runtime.start()
         logging.info(f"{TOOL_NAME} 服务已启动。")
 
+    @tracing.traced()
     def stop(self):
         """停止服务"""
         self._ensure_service_installed()
         logging.info(f"正在停止 {TOOL_NAME} 服务...")
-        compose_cmd = self._get_compose_cmd()
-        utils.run_command(compose_cmd + ["down"], cwd=constants.BASE_DIR)
+        self.runtime.stop()
         logging.info(f"{TOOL_NAME} 服务已停止。")
 
-    def update(self, password: Optional[str], port: Optional[int], image: Optional[str]):
+    @tracing.traced()
+    def update(
+        self,
+        password: Optional[str],
+        port: Optional[int],
+        image: Optional[str],
+        verify_image: bool = False,
+        obfs: Optional[str] = None,
+        obfs_password: Optional[str] = None,
+        alpn: Optional[list[str]] = None,
+        pin_certificate: Optional[bool] = None,
+    ):
         """
         更新服务。
         如果未提供任何参数，则仅拉取新镜像并重启。
-        如果提供了参数，则更新相应的配置，然后拉取镜像并重启。
+        如果提供了参数，则逐字段比较修改前后的配置，只写入发生变化的文件，
+        并按变化的类别执行代价最低的动作：无操作、热重载、重启或重建服务。
         """
         self._ensure_service_installed()
+        disable_obfs = obfs == "none"
+        try:
+            self._validate_obfs(None if disable_obfs else obfs)
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
         logging.info(f"--- 开始更新 {TOOL_NAME} 服务 ---")
-        config_changed = False
+        explicit = any(
+            v is not None
+            for v in (password, port, image, obfs, obfs_password, alpn, pin_certificate)
+        )
+        generation = None
+        changes: list[configdiff.FieldChange] = []
 
         try:
             # --- 步骤 1: 加载现有配置 ---
             logging.debug("正在加载现有配置文件...")
-            with constants.DOCKER_COMPOSE_PATH.open("r", encoding="utf8") as f:
-                docker_compose_cfg = yaml.safe_load(f)
-            with constants.CONFIG_PATH.open("r", encoding="utf8") as f:
-                mihomo_cfg = yaml.safe_load(f)
+            docker_compose_cfg = configs.load_yaml(constants.DOCKER_COMPOSE_PATH)
+            mihomo_cfg = configs.load_yaml(constants.CONFIG_PATH)
+            client_options = models.load_client_options()
+            # load_yaml 返回的是深拷贝，再读一次即可得到未修改的原始配置
+            original = {
+                constants.CONFIG_PATH: configs.load_yaml(constants.CONFIG_PATH),
+                constants.DOCKER_COMPOSE_PATH: configs.load_yaml(constants.DOCKER_COMPOSE_PATH),
+                constants.CLIENT_OPTIONS_PATH: models.load_client_options(),
+            }
+            service = docker_compose_cfg["services"][COMPOSE_SERVICE_NAME]
 
             # --- 步骤 2: 按需更新配置 ---
             if password:
-                logging.info("正在更新连接密码...")
-                # user key 是随机生成的，所以直接替换整个 users 字典
-                mihomo_cfg["listeners"][0]["users"] = {f"user_{uuid.uuid4().hex[:8]}": password}
-                config_changed = True
-                logging.info("连接密码已在配置中更新。")
+                users = mihomo_cfg["listeners"][0]["users"]
+                # user key 是随机生成的；密码未变时保留原有的 key，避免无意义的变更
+                if list(users.values()) != [password]:
+                    mihomo_cfg["listeners"][0]["users"] = {f"user_{uuid.uuid4().hex[:8]}": password}
 
             if port:
-                logging.info(f"正在更新监听端口为 {port}...")
                 mihomo_cfg["listeners"][0]["port"] = port
-                docker_compose_cfg["services"][COMPOSE_SERVICE_NAME]["ports"] = [f"{port}:{port}"]
-                config_changed = True
-                logging.info(f"监听端口已在配置中更新为 {port}。")
+                # host 网络模式下端口映射不生效，不写入 ports
+                if service.get("network_mode") != "host":
+                    service["ports"] = [f"{port}:{port}"]
 
             if image:
-                logging.info(f"正在更新服务镜像为 {image}...")
-                docker_compose_cfg["services"][COMPOSE_SERVICE_NAME]["image"] = image
-                config_changed = True
-                logging.info(f"服务镜像已在配置中更新为 {image}。")
-
-            # --- 步骤 3: 如果配置有变，则写回文件 ---
-            if config_changed:
+                service["image"] = image
+
+            # 混淆与 ALPN 作用于所有 listener
+            if obfs or obfs_password or alpn:
+                for listener in mihomo_cfg["listeners"]:
+                    if disable_obfs:
+                        listener.pop("obfs", None)
+                        listener.pop("obfs-password", None)
+                    elif obfs or (obfs_password and listener.get("obfs")):
+                        listener["obfs"] = obfs or listener["obfs"]
+                        listener["obfs-password"] = (
+                            obfs_password
+                            or listener.get("obfs-password")
+                            or utils.generate_password(24)
+                        )
+                    if alpn:
+                        listener["alpn"] = list(alpn)
+
+            if pin_certificate is not None:
+                client_options["pin-sha256"] = pin_certificate
+
+            # --- 步骤 3: 字段级比较，预检后只写回发生变化的文件 ---
+            updated = {
+                constants.CONFIG_PATH: (mihomo_cfg, configdiff.MIHOMO_RULES),
+                constants.DOCKER_COMPOSE_PATH: (docker_compose_cfg, configdiff.COMPOSE_RULES),
+                constants.CLIENT_OPTIONS_PATH: (client_options, configdiff.CLIENT_OPTIONS_RULES),
+            }
+            files: dict[Path, str] = {}
+            for path, (cfg, rules) in updated.items():
+                file_changes = configdiff.diff(path.name, original[path], cfg, rules)
+                if file_changes:
+                    changes += file_changes
+                    files[path] = configs.dump_yaml(cfg)
+            if explicit:
+                self._print_config_diff(changes)
+
+            if files or not explicit:
+                self._preflight(mihomo_cfg, docker_compose_cfg, verify_image=verify_image)
+            if files:
                 logging.info("正在保存更新后的配置文件...")
-                with constants.CONFIG_PATH.open("w", encoding="utf8") as f:
-                    yaml.dump(mihomo_cfg, f, sort_keys=False)
-                with constants.DOCKER_COMPOSE_PATH.open("w", encoding="utf8") as f:
-                    yaml.dump(docker_compose_cfg, f, sort_keys=False)
-                logging.info("配置文件保存成功。")
+                generation = journal.commit_files(files, reason="update")
+                logging.info(f"配置文件保存成功 (代际 #{generation})。")
 
         except FileNotFoundError:
             logging.error("配置文件未找到。请确认服务已正确安装。")
@@ -496,106 +1067,212 @@ class Hysteria2Manager:
             logging.error(f"更新配置时发生错误: {e}")
             sys.exit(1)
 
-        # --- 步骤 4: 拉取镜像并重启服务 ---
-        compose_cmd = self._get_compose_cmd()
-        if image:
-            logging.info(f"正在拉取指定的 Docker 镜像 ({image})...")
+        # --- 步骤 4: 执行所需的最小动作 ---
+        current_image = service["image"]
+        action = configdiff.required_action(changes) if explicit else ServiceAction.RECREATE
+        if action == ServiceAction.RECREATE:
+            if image:
+                logging.info(f"正在拉取指定的 Docker 镜像 ({image})...")
+            else:
+                logging.info("正在拉取最新的 Docker 镜像...")
+            self.runtime.prepare(current_image)
+            logging.info("正在使用新配置重建服务...")
+            self._recreate_service()
+        elif action == ServiceAction.RESTART:
+            logging.info("正在重启服务...")
+            self._restart_service()
+        elif action == ServiceAction.RELOAD:
+            logging.info("正在热重载配置...")
+            self._reload_service()
+        elif changes:
+            logging.info("仅客户端配置发生变化，服务无需重启。")
         else:
-            logging.info("正在拉取最新的 Docker 镜像...")
-        utils.run_command(compose_cmd + ["pull"], cwd=constants.BASE_DIR)
-
-        logging.info("正在使用新配置重启服务...")
-        utils.run_command(compose_cmd + ["down"], cwd=constants.BASE_DIR, check=False)
-        utils.run_command(compose_cmd + ["up", "-d"], cwd=constants.BASE_DIR)
+            logging.info("配置与当前完全一致，无需任何操作。")
 
         logging.info(f"--- {TOOL_NAME} 服务更新完成。 ---")
+        output.emit(
+            "update",
+            {
+                "config_changed": bool(changes),
+                "action": action.name.lower(),
+                "changes": [c.to_dict() for c in changes],
+                "generation": generation,
+                "image": current_image,
+            },
+        )
+        if action == ServiceAction.NOOP:
+            return
 
         # --- 步骤 5: 显示更新后的状态 ---
         self.console.print("\n--- 更新后服务状态 ---")
         self.check()
 
+    def _print_config_diff(self, changes: list[configdiff.FieldChange]):
+        if not changes:
+            return
+        from rich.table import Table
+
+        table = Table(title="配置变更")
+        table.add_column("文件", style="cyan", no_wrap=True)
+        table.add_column("字段", style="cyan")
+        table.add_column("原值")
+        table.add_column("新值", style="magenta")
+        table.add_column("动作", style="yellow")
+        for change in changes:
+            item = change.to_dict()
+            table.add_row(
+                item["source"],
+                item["path"],
+                "-" if item["old"] is None else str(item["old"]),
+                "-" if item["new"] is None else str(item["new"]),
+                item["action"],
+            )
+        self.console.print(table)
+
     def log(self):
         """查看服务日志"""
         self._ensure_service_installed()
         logging.info("正在显示服务日志... (按 Ctrl+C 退出)")
-        compose_cmd = self._get_compose_cmd()
-        utils.run_command(compose_cmd + ["logs", "-f"], cwd=constants.BASE_DIR, stream_output=True)
+        self.runtime.logs(follow=True)
 
-    def check(self):
-        """检查服务状态并打印客户端配置"""
+    @tracing.traced()
+    def check(self, use_snapshot: bool = False, refresh: bool = False):
+        """
+        检查服务状态并打印客户端配置。
+        use_snapshot 为 True 时，公网 IP 与服务状态优先取自未过期的快照，不调用网络与子进程；
+        refresh 为 True 时强制重新采集。实时采集到的数据总会写回快照。
+        """
         self._ensure_service_installed()
-        self.console.print(f"\n--- 开始检查 {TOOL_NAME} 服务状态 ---")
-
-        # rich Components
-        from rich.table import Table
-
-        table = Table(title=f"{TOOL_NAME} 服务状态一览")
-        table.add_column("检查项", justify="right", style="cyan", no_wrap=True)
-        table.add_column("状态", style="magenta")
-
+        structured = output.structured()
+        if not structured:
+            self.console.print(f"\n--- 开始检查 {TOOL_NAME} 服务状态 ---")
+        fresh: dict = {}
+        cached_ages: dict[str, float] = {}
+
+        def live_or_cached(key: str, domain: str, fetch):
+            if use_snapshot and not refresh:
+                hit = snapshot.get(key, domain)
+                if hit is not None:
+                    value, cached_ages[key] = hit
+                    return value
+            fresh[key] = fetch()
+            return fresh[key]
+
+        report: dict = {}
         try:
             # 1. 获取域名
             domain = self._get_domain_from_config()
-            table.add_row("管理域名", domain)
-
-            # 2. 检查 Docker 容器状态
-            container_name = f"{COMPOSE_CONTAINER_PREFIX}{domain}"
-            try:
-                result = utils.run_command(
-                    [
-                        "docker",
-                        "ps",
-                        "--filter",
-                        f"name={container_name}",
-                        "--format",
-                        "{{.Status}}",
-                    ],
-                    capture_output=True,
-                    check=True,
-                )
-                status_output = result.stdout.strip()
-                if "Up" in status_output:
-                    container_status = f"[green]✔ 正在运行[/green] ({status_output})"
-                elif status_output:
-                    container_status = f"[yellow]❗ 已停止[/yellow] ({status_output})"
-                else:
-                    container_status = "[red]❌ 未找到容器[/red]"
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                container_status = "[red]❌ 检查失败 (Docker 命令错误)[/red]"
-            table.add_row("服务容器状态", container_status)
+            report["domain"] = domain
+
+            # 2. 检查服务运行状态
+            status_output = live_or_cached("status", domain, lambda: self._container_status(domain))
+            if status_output is None:
+                state = "unknown"
+            elif "Up" in status_output:
+                state = "running"
+            else:
+                state = "stopped" if status_output else "missing"
+            report["service"] = {
+                "runtime": self.runtime.name,
+                "state": state,
+                "detail": status_output,
+            }
 
             # 3. 检查配置文件
-            if constants.CONFIG_PATH.exists() and constants.DOCKER_COMPOSE_PATH.exists():
-                config_status = "[green]✔ 正常[/green]"
-            else:
-                config_status = "[red]❌ 缺失[/red]"
-            table.add_row("核心配置文件", config_status)
+            report["config_files"] = (
+                constants.CONFIG_PATH.exists() and constants.DOCKER_COMPOSE_PATH.exists()
+            )
+
+            # 4. 检查证书有效期
+            fullchain, _ = configs.cert_paths(domain)
+            try:
+                cert_info = certs.load_cert_info(Path(fullchain))
+                report["certificate"] = {
+                    "path": fullchain,
+                    "not_after": cert_info.not_after,
+                    "days_left": round(cert_info.days_left, 1),
+                    "expired": cert_info.expired,
+                }
+            except (FileNotFoundError, ValueError):
+                report["certificate"] = None
 
             # 获取公网 IP
-            public_ip = utils.get_public_ip()
+            report["public_ip"] = live_or_cached("public_ip", domain, utils.get_public_ip)
+            snapshot.put(domain, **fresh)
         except Exception as e:
-            self.console.print(f"[red]检查过程中出现错误: {e}[/red]")
+            if structured:
+                logging.error(f"检查过程中出现错误: {e}")
+                output.emit("check", report)
+            else:
+                self.console.print(f"[red]检查过程中出现错误: {e}[/red]")
             return
+        report["snapshot_age"] = round(max(cached_ages.values()), 1) if cached_ages else None
 
-        self.console.print(table)
+        if not structured:
+            self._print_status_table(report)
 
-        # 4. 基于实时服务端配置生成并打印客户端配置
+        # 5. 基于实时服务端配置生成并打印客户端配置
         try:
-            # 从 config.yaml 获取密码和端口
-            with constants.CONFIG_PATH.open("r", encoding="utf8") as f:
-                server_config = yaml.safe_load(f)
-            listener_config = server_config["listeners"][0]
-            port = listener_config["port"]
-            password = list(listener_config["users"].values())[0]
-            self._preview_fmt_client_config(
-                domain=domain, public_ip=public_ip, port=port, password=password
-            )
+            # 密码、端口与混淆等选项取自已解析（并缓存）的部署模型，不再重复读取 config.yaml
+            profile = models.load_deployment().client_profile(report["public_ip"])
+            if structured:
+                report["client"] = self._client_config(profile)
+            else:
+                self._preview_fmt_client_config(profile)
         except FileNotFoundError:
-            self.console.print("\n[yellow]配置文件未找到，无法生成客户端配置。[/yellow]")
-            self.console.print(
-                "[yellow]可能是通过旧版本安装的。可以尝试重新运行 'install' 命令以生成。[/yellow]"
-            )
-            self.console.print("=" * 58 + "\n")
+            if structured:
+                logging.warning("配置文件未找到，无法生成客户端配置。")
+            else:
+                self.console.print("\n[yellow]配置文件未找到，无法生成客户端配置。[/yellow]")
+                self.console.print(
+                    "[yellow]可能是通过旧版本安装的。可以尝试重新运行 'install' 命令以生成。[/yellow]"
+                )
+                self.console.print("=" * 58 + "\n")
         except Exception as e:
-            self.console.print(f"\n[red]生成客户端配置时出错: {e}[/red]")
-            self.console.print("=" * 58 + "\n")
+            if structured:
+                logging.error(f"生成客户端配置时出错: {e}")
+            else:
+                self.console.print(f"\n[red]生成客户端配置时出错: {e}[/red]")
+                self.console.print("=" * 58 + "\n")
+        if structured:
+            output.emit("check", report)
+
+    def _print_status_table(self, report: dict):
+        from rich.table import Table
+
+        table = Table(title=f"{TOOL_NAME} 服务状态一览")
+        table.add_column("检查项", justify="right", style="cyan", no_wrap=True)
+        table.add_column("状态", style="magenta")
+        table.add_row("管理域名", report["domain"])
+
+        service = report["service"]
+        container_status = {
+            "unknown": f"[red]❌ 检查失败 ({service['runtime']} 不可用)[/red]",
+            "running": f"[green]✔ 正在运行[/green] ({service['detail']})",
+            "stopped": f"[yellow]❗ 已停止[/yellow] ({service['detail']})",
+            "missing": "[red]❌ 未找到服务实例[/red]",
+        }[service["state"]]
+        table.add_row(self.runtime.status_label, container_status)
+
+        table.add_row(
+            "核心配置文件",
+            "[green]✔ 正常[/green]" if report["config_files"] else "[red]❌ 缺失[/red]",
+        )
+
+        cert = report["certificate"]
+        if cert is None:
+            cert_status = "[red]❌ 证书缺失或无法解析[/red]"
+        elif cert["expired"]:
+            cert_status = "[red]❌ 已过期[/red]"
+        elif cert["days_left"] < constants.CERT_EXPIRY_WARNING_DAYS:
+            cert_status = f"[yellow]❗ {cert['days_left']:.0f} 天后过期[/yellow]"
+        else:
+            cert_status = f"[green]✔ 剩余 {cert['days_left']:.0f} 天[/green]"
+        table.add_row("证书有效期", cert_status)
+
+        if report["snapshot_age"] is not None:
+            table.add_row(
+                "数据来源",
+                f"[cyan]快照 ({report['snapshot_age']:.0f} 秒前，--refresh 重新采集)[/cyan]",
+            )
+        self.console.print(table)
@@ -0,0 +1,234 @@
+"""伪装站点的本地镜像
+
+默认情况下 listener 的 masquerade 是指向上游站点的反向代理，每次主动探测或浏览器访问都会回源，
+额外的回源时延会暴露代理特征，上游变慢时伪装也随之失效。
+镜像模式将上游站点（入口页面、同源页面及其静态资源）快照到本地目录，
+listener 以 file:// 直接提供静态文件，应答快速且稳定。
+
+同步是增量的：清单 (.heyhy-mirror.json) 记录每个 URL 的 ETag / Last-Modified 与内容哈希，
+再次同步时发送条件请求，未变化的文件 (304) 不重新下载，上游已删除的文件会被清理。
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path, PurePosixPath
+from typing import Mapping, Optional
+from urllib.parse import unquote, urljoin, urlsplit
+
+from hy2d.core import constants, journal, tracing
+
+MANIFEST_NAME = ".heyhy-mirror.json"
+USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/126.0 Safari/537.36"
+)
+_CSS_URL = re.compile(r"""url\(\s*['"]?([^'")]+)['"]?\s*\)""")
+
+
+@dataclass
+class SyncStats:
+    fetched: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    failed: list[str] = field(default_factory=list)
+    bytes: int = 0
+    duration: float = 0.0
+
+
+class _LinkExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.pages: list[str] = []
+        self.assets: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "a" and attrs.get("href"):
+            self.pages.append(attrs["href"])
+        elif tag == "link" and attrs.get("href"):
+            self.assets.append(attrs["href"])
+        for key in ("src", "poster"):
+            if attrs.get(key):
+                self.assets.append(attrs[key])
+        if attrs.get("srcset"):
+            self.assets += [c.strip().split(" ")[0] for c in attrs["srcset"].split(",") if c]
+
+
+def local_path(url: str, content_type: str = "") -> str:
+    """URL 在镜像目录中的相对路径（忽略查询参数）"""
+    path = unquote(urlsplit(url).path) or "/"
+    parts = [p for p in PurePosixPath(path).parts if p not in ("/", "..", ".")]
+    rel = "/".join(parts)
+    if path.endswith("/") or not rel:
+        return f"{rel}/index.html".lstrip("/")
+    if "html" in content_type and not rel.endswith((".html", ".htm")):
+        return f"{rel}/index.html"
+    return rel
+
+
+class Mirror:
+    def __init__(
+        self,
+        source: str,
+        dest: Path,
+        max_pages: int = constants.MASQUERADE_MAX_PAGES,
+        max_files: int = constants.MASQUERADE_MAX_FILES,
+        timeout: float = 15,
+        workers: int = 8,
+    ):
+        self.source = source if source.endswith("/") else source + "/"
+        self.origin = "{0.scheme}://{0.netloc}".format(urlsplit(self.source))
+        self.dest = dest
+        self.max_pages = max_pages
+        self.max_files = max_files
+        self.timeout = timeout
+        self.workers = workers
+        self.manifest_path = dest / MANIFEST_NAME
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> dict:
+        try:
+            data = json.loads(self.manifest_path.read_text(encoding="utf8"))
+        except (FileNotFoundError, ValueError):
+            return {"files": {}}
+        # 更换了上游站点时旧的条件请求头没有意义
+        if data.get("source") != self.source:
+            data["files"] = {}
+        return data
+
+    def _same_origin(self, url: str) -> bool:
+        return url.startswith(self.origin + "/") or url == self.origin
+
+    def _fetch(self, url: str) -> tuple[str, Optional[bytes], Mapping]:
+        """返回 (状态, 内容, 响应头)。状态为 fetched / unchanged / failed"""
+        entry = self.manifest["files"].get(url) or {}
+        headers = {"User-Agent": USER_AGENT}
+        if entry and (self.dest / entry["path"]).is_file():
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return "fetched", response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return "unchanged", None, {}
+            return "failed", None, {"error": f"HTTP {e.code}"}
+        except (urllib.error.URLError, OSError) as e:
+            return "failed", None, {"error": str(e)}
+
+    def _rewrite(self, text: str) -> str:
+        # 同源的绝对链接改写为根相对路径，由本地镜像提供
+        return text.replace(self.origin + "/", "/")
+
+    def _discover(self, url: str, body: bytes, content_type: str) -> tuple[list[str], list[str]]:
+        text = body.decode("utf8", errors="replace")
+        if "html" in content_type:
+            parser = _LinkExtractor()
+            parser.feed(text)
+            pages, assets = parser.pages, parser.assets
+        elif "css" in content_type:
+            pages, assets = [], _CSS_URL.findall(text)
+        else:
+            return [], []
+
+        def resolve(refs: list[str]) -> list[str]:
+            urls = (urljoin(url, ref.strip()).split("#")[0] for ref in refs)
+            return [u for u in urls if self._same_origin(u)]
+
+        return resolve(pages), resolve(assets)
+
+    def sync(self) -> SyncStats:
+        stats = SyncStats()
+        started = time.perf_counter()
+        files: dict[str, dict] = {}
+        seen = {self.source}
+        pages_left = self.max_pages - 1
+        frontier = [self.source]
+
+        with tracing.span("masquerade sync", "network"), ThreadPoolExecutor(self.workers) as pool:
+            while frontier:
+                wave, frontier = frontier, []
+                for url, (status, body, headers) in zip(wave, pool.map(self._fetch, wave)):
+                    entry = self.manifest["files"].get(url)
+                    if status == "failed":
+                        stats.failed.append(f"{url}: {headers.get('error')}")
+                        # 暂时失败的文件保留上一次的快照
+                        if entry:
+                            files[url] = entry
+                        continue
+
+                    if status == "unchanged":
+                        stats.unchanged += 1
+                        files[url] = entry
+                        content_type = entry.get("content_type", "")
+                        body = (self.dest / entry["path"]).read_bytes()
+                    else:
+                        content_type = headers.get("Content-Type", "")
+                        if "html" in content_type or "css" in content_type:
+                            body = self._rewrite(body.decode("utf8", errors="replace")).encode()
+                        rel = local_path(url, content_type)
+                        digest = hashlib.sha256(body).hexdigest()
+                        target = self.dest / rel
+                        if not target.is_file() or (entry or {}).get("sha256") != digest:
+                            journal.atomic_write(target, body)
+                            stats.bytes += len(body)
+                        stats.fetched += 1
+                        files[url] = {
+                            "path": rel,
+                            "etag": headers.get("ETag"),
+                            "last_modified": headers.get("Last-Modified"),
+                            "content_type": content_type,
+                            "sha256": digest,
+                        }
+
+                    pages, assets = self._discover(url, body, content_type)
+                    for link in assets + pages:
+                        if link in seen or len(seen) >= self.max_files:
+                            continue
+                        if link in pages:
+                            if pages_left <= 0:
+                                continue
+                            pages_left -= 1
+                        seen.add(link)
+                        frontier.append(link)
+
+        if self.source not in files:
+            raise ConnectionError(f"无法获取伪装站点入口页面 {self.source}: {stats.failed[:1]}")
+
+        # 清理上游已不再引用的文件
+        kept = {entry["path"] for entry in files.values()}
+        for url, entry in self.manifest["files"].items():
+            if url not in files and entry["path"] not in kept:
+                (self.dest / entry["path"]).unlink(missing_ok=True)
+                stats.removed += 1
+
+        self.manifest = {"source": self.source, "synced_at": time.time(), "files": files}
+        journal.atomic_write(
+            self.manifest_path, json.dumps(self.manifest, indent=2, ensure_ascii=False)
+        )
+        stats.duration = time.perf_counter() - started
+        logging.debug(f"伪装站点镜像: {len(files)} 个文件，{stats.bytes} 字节已写入")
+        return stats
+
+
+def mirror_source(dest: Path = constants.MASQUERADE_DIR) -> Optional[str]:
+    """上一次同步时的上游站点"""
+    try:
+        return json.loads((dest / MANIFEST_NAME).read_text(encoding="utf8")).get("source")
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def file_url(dest: Path = constants.MASQUERADE_DIR) -> str:
+    return f"file://{dest}"
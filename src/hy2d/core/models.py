@@ -0,0 +1,261 @@
+"""统一的类型化配置模型
+
+服务端配置 (config.yaml) 与服务定义 (docker-compose.yaml) 在每次调用中只解析一次，
+解析结果按文件的 inode/mtime/size 缓存；文件被原子替换后缓存自动失效。
+客户端配置由 hy2d.core.renderers 中的渲染器基于 ClientProfile 生成，
+独立脚本 heyhy.py 管理的是 hysteria 原生二进制，自成一体，不依赖本包。
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from hy2d.core import certs, configs, constants
+from hy2d.core.constants import (
+    COMPOSE_CONTAINER_PREFIX,
+    COMPOSE_SERVICE_NAME,
+    MASQUERADE_WEBSITE,
+    MIHOMO_LISTEN_TYPE,
+)
+
+
+@dataclass(slots=True)
+class Listener:
+    """Mihomo hysteria2 入站 listener"""
+
+    name: str
+    port: int
+    users: dict[str, str]
+    certificate: str
+    private_key: str
+    listen: str = "0.0.0.0"
+    masquerade: str = MASQUERADE_WEBSITE
+    type: str = MIHOMO_LISTEN_TYPE
+    obfs: Optional[str] = None
+    obfs_password: Optional[str] = None
+    alpn: Optional[list[str]] = None
+    # 未建模的字段原样保留，写回时不丢失
+    extra: dict = field(default_factory=dict)
+
+    _KNOWN = (
+        "name",
+        "type",
+        "port",
+        "listen",
+        "users",
+        "certificate",
+        "private-key",
+        "masquerade",
+        "obfs",
+        "obfs-password",
+        "alpn",
+    )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Listener":
+        return cls(
+            name=data.get("name", ""),
+            port=int(data["port"]),
+            users=dict(data.get("users") or {}),
+            certificate=data.get("certificate", ""),
+            private_key=data.get("private-key", ""),
+            listen=data.get("listen", "0.0.0.0"),
+            masquerade=data.get("masquerade", MASQUERADE_WEBSITE),
+            type=data.get("type", MIHOMO_LISTEN_TYPE),
+            obfs=data.get("obfs") or None,
+            obfs_password=data.get("obfs-password") or None,
+            alpn=list(data["alpn"]) if data.get("alpn") else None,
+            extra={k: v for k, v in data.items() if k not in cls._KNOWN},
+        )
+
+    def to_dict(self) -> dict:
+        data = {
+            "name": self.name,
+            "type": self.type,
+            "port": self.port,
+            "listen": self.listen,
+            "users": dict(self.users),
+            "certificate": self.certificate,
+            "private-key": self.private_key,
+            "masquerade": self.masquerade,
+        }
+        if self.obfs:
+            data["obfs"] = self.obfs
+            data["obfs-password"] = self.obfs_password
+        if self.alpn:
+            data["alpn"] = list(self.alpn)
+        return {**data, **self.extra}
+
+    @property
+    def first_user(self) -> tuple[str, str]:
+        return next(iter(self.users.items()))
+
+
+@dataclass(slots=True, frozen=True)
+class Service:
+    """服务定义：域名、镜像与容器名"""
+
+    domain: str
+    image: str
+    container_name: str
+
+    @classmethod
+    def from_compose(cls, data: dict) -> "Service":
+        service = data["services"][COMPOSE_SERVICE_NAME]
+        container_name = service["container_name"]
+        domain = container_name.split(COMPOSE_CONTAINER_PREFIX)[-1]
+        if not domain:
+            raise ValueError(f"无法从容器名 {container_name!r} 解析域名")
+        return cls(domain=domain, image=service["image"], container_name=container_name)
+
+
+@dataclass(slots=True, frozen=True)
+class ClientProfile:
+    """生成任意客户端配置所需的最小信息"""
+
+    name: str
+    server: str
+    port: int
+    password: str
+    sni: str
+    skip_cert_verify: bool = False
+    obfs: Optional[str] = None
+    obfs_password: Optional[str] = None
+    # 服务端叶子证书的 SHA-256 指纹，设置后客户端只信任该证书
+    pin_sha256: Optional[str] = None
+    alpn: tuple[str, ...] = ()
+    # 地址族偏好 (Mihomo ip-version): dual | ipv4-prefer | ipv6-prefer；仅在 server 为域名时有意义
+    ip_version: Optional[str] = None
+    # 订阅端点的基础 URL；设置后 Clash.Meta 配置以 rule-providers 引用共享规则集
+    ruleset_url: Optional[str] = None
+
+
+@dataclass(slots=True)
+class Deployment:
+    """一次部署的完整服务端状态"""
+
+    service: Service
+    listeners: list[Listener]
+    controller: Optional[str] = None
+    secret: Optional[str] = None
+    # 是否在客户端配置中固定证书指纹 (CLIENT_OPTIONS_PATH 中的 pin-sha256)
+    pin_certificate: bool = False
+    # 域名的 A/AAAA 记录均指向本机 (CLIENT_OPTIONS_PATH 中的 dual-stack)，客户端以域名连接
+    dual_stack: bool = False
+
+    @property
+    def domain(self) -> str:
+        return self.service.domain
+
+    @property
+    def primary(self) -> Listener:
+        return self.listeners[0]
+
+    def client_profile(
+        self,
+        public_ip: str,
+        listener: Optional[Listener] = None,
+        ip_version: Optional[str] = None,
+    ) -> ClientProfile:
+        """
+        双栈部署时 server 为域名，由客户端按自身网络选择 IPv4 或 IPv6；
+        ip_version 为空时使用 dual，由客户端同时尝试两个地址族。
+        """
+        listener = listener or self.primary
+        _, password = listener.first_user
+        return ClientProfile(
+            name=self.domain,
+            server=self.domain if self.dual_stack else public_ip,
+            port=listener.port,
+            password=password,
+            sni=self.domain,
+            obfs=listener.obfs,
+            obfs_password=listener.obfs_password,
+            pin_sha256=(
+                certificate_fingerprint(listener.certificate) if self.pin_certificate else None
+            ),
+            alpn=tuple(listener.alpn or ()),
+            ip_version=(ip_version or "dual") if self.dual_stack else None,
+        )
+
+
+def _stat_key(path: Path) -> Optional[tuple]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+_service_cache: dict[Path, tuple[tuple, Service]] = {}
+_fingerprint_cache: dict[str, tuple[tuple, str]] = {}
+
+
+def certificate_fingerprint(path: str) -> str:
+    """证书指纹，按文件状态缓存；证书续期（文件被替换）后自动重新计算"""
+    key = _stat_key(Path(path))
+    if key is None:
+        raise FileNotFoundError(path)
+    cached = _fingerprint_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    fingerprint = certs.cert_sha256(Path(path))
+    _fingerprint_cache[path] = (key, fingerprint)
+    return fingerprint
+
+
+def load_client_options(path: Optional[Path] = None) -> dict:
+    path = path or constants.CLIENT_OPTIONS_PATH
+    if not path.is_file():
+        return {}
+    return configs.load_yaml(path) or {}
+
+
+_deployment_cache: dict[tuple, tuple[tuple, Deployment]] = {}
+
+
+def load_service(path: Optional[Path] = None) -> Service:
+    """解析服务定义，同一文件内容只解析一次"""
+    path = path or constants.DOCKER_COMPOSE_PATH
+    key = _stat_key(path)
+    if key is None:
+        raise FileNotFoundError(str(path))
+    cached = _service_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    service = Service.from_compose(configs.load_yaml(path))
+    _service_cache[path] = (key, service)
+    return service
+
+
+def load_deployment(
+    compose_path: Optional[Path] = None, config_path: Optional[Path] = None
+) -> Deployment:
+    """解析服务定义与 Mihomo 配置，同一文件内容只解析一次"""
+    compose_path = compose_path or constants.DOCKER_COMPOSE_PATH
+    config_path = config_path or constants.CONFIG_PATH
+    key = (
+        _stat_key(compose_path),
+        _stat_key(config_path),
+        _stat_key(constants.CLIENT_OPTIONS_PATH),
+    )
+    if key[1] is None:
+        raise FileNotFoundError(str(config_path))
+    cached = _deployment_cache.get((compose_path, config_path))
+    if cached and cached[0] == key:
+        return cached[1]
+
+    mihomo_cfg = configs.load_yaml(config_path) or {}
+    client_options = load_client_options()
+    deployment = Deployment(
+        service=load_service(compose_path),
+        listeners=[Listener.from_dict(item) for item in mihomo_cfg.get("listeners") or []],
+        controller=mihomo_cfg.get("external-controller"),
+        secret=mihomo_cfg.get("secret"),
+        pin_certificate=bool(client_options.get("pin-sha256")),
+        dual_stack=bool(client_options.get("dual-stack")),
+    )
+    if not deployment.listeners:
+        raise ValueError(f"{config_path} 中没有 listener")
+    _deployment_cache[(compose_path, config_path)] = (key, deployment)
+    return deployment
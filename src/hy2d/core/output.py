@@ -0,0 +1,80 @@
+"""结构化输出 (--output json|yaml)
+
+默认的 text 模式通过 rich 表格、语法高亮与 RichHandler 日志输出给人阅读。
+json / yaml 模式面向脚本与 fleet 批量调用：不创建任何 rich 渲染，INFO 日志直接被过滤，
+WARNING 及以上的日志收集到文档的 messages 中；命令结束时向标准输出写出唯一的一份文档。
+"""
+
+import json
+import logging
+import sys
+from typing import Any, Optional
+
+import yaml
+
+FORMATS = ("text", "json", "yaml")
+
+_format = "text"
+_document: dict[str, Any] = {}
+
+
+def configure(fmt: str):
+    global _format
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的输出格式: {fmt}，可选 {', '.join(FORMATS)}")
+    _format = fmt
+    _document.clear()
+
+
+def structured() -> bool:
+    return _format != "text"
+
+
+def current() -> str:
+    return _format
+
+
+def emit(section: str, data: Any):
+    """写入文档中的一个段落（同名段落会被覆盖）"""
+    _document[section] = data
+
+
+class CollectingHandler(logging.Handler):
+    """将日志记录收集到文档中，不做任何格式化与终端输出"""
+
+    def emit(self, record: logging.LogRecord):
+        _document.setdefault("messages", []).append(
+            {"level": record.levelname.lower(), "message": record.getMessage()}
+        )
+
+
+def exit_code(exc: Optional[BaseException]) -> int:
+    """由结束运行的异常推断退出码：正常返回为 0，sys.exit / typer.Exit 取其退出码，其余异常为 1"""
+    if exc is None:
+        return 0
+    if isinstance(exc, SystemExit):
+        code = exc.code
+        return code if isinstance(code, int) else (0 if code is None else 1)
+    return getattr(exc, "exit_code", 1)
+
+
+def flush(command: str, code: int = 0):
+    """
+    写出文档，ok 取决于命令的退出码。没有任何段落与消息时不输出，
+    以免干扰自带输出格式的子命令（如 links convert、probe）。
+    """
+    if not structured() or not _document:
+        return
+    document = {"command": command, "ok": code == 0, "exit_code": code, **_document}
+    if _format == "json":
+        text = json.dumps(document, indent=2, ensure_ascii=False, default=str) + "\n"
+    else:
+        text = yaml.dump(
+            document,
+            Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper),
+            sort_keys=False,
+            allow_unicode=True,
+        )
+    sys.stdout.write(text)
+    sys.stdout.flush()
+    _document.clear()
@@ -0,0 +1,179 @@
+"""基于依赖图 (DAG) 的任务执行器
+
+- 相互独立的任务并发执行，依赖满足后立即调度；
+- 声明了相同资源（如 apt/dpkg 锁）的任务不会同时执行；
+- 记录每个任务的耗时；
+- 每完成一个任务都会写入检查点，重新运行时跳过已成功的任务。
+"""
+
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from hy2d.core import journal, tracing
+
+
+@dataclass
+class Task:
+    name: str
+    fn: Callable[[], Any]
+    deps: tuple[str, ...] = ()
+    description: str = ""
+    # 需要独占的资源，例如 "apt"
+    resources: frozenset = frozenset()
+    # 成功后是否记录检查点，以便重新运行时跳过
+    resumable: bool = True
+
+
+@dataclass
+class TaskResult:
+    name: str
+    description: str
+    status: str  # "done" | "resumed" | "failed" | "cancelled"
+    started: float = 0.0
+    duration: float = 0.0
+    error: Optional[BaseException] = None
+
+
+class PipelineError(Exception):
+    def __init__(self, task: str, error: BaseException):
+        super().__init__(f"任务 {task} 失败: {error}")
+        self.task = task
+        self.error = error
+
+
+@dataclass
+class Checkpoint:
+    """记录已完成的任务与需要跨运行保留的上下文（如自动生成的密码）"""
+
+    path: Optional[Path]
+    fingerprint: str
+    done: list[str] = field(default_factory=list)
+    context: dict = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Optional[Path], fingerprint: str) -> "Checkpoint":
+        if path and path.is_file():
+            try:
+                data = json.loads(path.read_text(encoding="utf8"))
+                if data.get("fingerprint") == fingerprint:
+                    return cls(path, fingerprint, data.get("done", []), data.get("context", {}))
+            except ValueError:
+                pass
+        return cls(path, fingerprint)
+
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            "fingerprint": self.fingerprint,
+            "done": list(self.done),
+            "context": dict(self.context),
+        }
+        journal.atomic_write(self.path, json.dumps(data, indent=2), mode=0o600)
+
+    def clear(self):
+        if self.path and self.path.exists():
+            self.path.unlink()
+
+
+class Pipeline:
+    def __init__(
+        self, tasks: list[Task], checkpoint: Optional[Checkpoint] = None, max_workers: int = 4
+    ):
+        self.tasks = {task.name: task for task in tasks}
+        self.checkpoint = checkpoint or Checkpoint(None, "")
+        self.max_workers = max_workers
+        self.results: dict[str, TaskResult] = {}
+        self._validate()
+
+    def _validate(self):
+        for task in self.tasks.values():
+            for dep in task.deps:
+                if dep not in self.tasks:
+                    raise ValueError(f"任务 {task.name} 依赖了不存在的任务 {dep}")
+        # 拓扑排序检查环
+        visiting, visited = set(), set()
+
+        def visit(name: str):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"任务依赖存在环: {name}")
+            visiting.add(name)
+            for dep in self.tasks[name].deps:
+                visit(dep)
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.tasks:
+            visit(name)
+
+    def _run_task(self, task: Task) -> TaskResult:
+        started = time.perf_counter()
+        logging.info(f"[{task.name}] 开始: {task.description or task.name}")
+        with tracing.span(f"task:{task.name}", "task"):
+            task.fn()
+        duration = time.perf_counter() - started
+        logging.info(f"[{task.name}] 完成 ({duration:.1f}s)")
+        return TaskResult(task.name, task.description, "done", started, duration)
+
+    def run(self) -> dict[str, TaskResult]:
+        pending = dict(self.tasks)
+        finished: set[str] = set()
+        held: set[str] = set()
+        running: dict[Future, Task] = {}
+        failure: Optional[PipelineError] = None
+
+        for name in list(pending):
+            if self.tasks[name].resumable and name in self.checkpoint.done:
+                logging.info(f"[{name}] 已在上次运行中完成，跳过。")
+                self.results[name] = TaskResult(name, self.tasks[name].description, "resumed")
+                finished.add(name)
+                pending.pop(name)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if failure is None:
+                    for name, task in list(pending.items()):
+                        if not all(dep in finished for dep in task.deps):
+                            continue
+                        if task.resources & held:
+                            continue
+                        held |= task.resources
+                        # 复制上下文，使任务内的 span 挂在调用者的 span 之下
+                        future = pool.submit(contextvars.copy_context().run, self._run_task, task)
+                        running[future] = task
+                        pending.pop(name)
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    held -= task.resources
+                    error = future.exception()
+                    if error is not None:
+                        self.results[task.name] = TaskResult(
+                            task.name, task.description, "failed", error=error
+                        )
+                        failure = failure or PipelineError(task.name, error)
+                        continue
+                    self.results[task.name] = future.result()
+                    finished.add(task.name)
+                    if task.resumable:
+                        self.checkpoint.done.append(task.name)
+                        self.checkpoint.save()
+
+        for name, task in pending.items():
+            self.results[name] = TaskResult(name, task.description, "cancelled")
+
+        if failure is not None:
+            raise failure
+        return self.results
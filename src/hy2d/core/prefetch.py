@@ -0,0 +1,370 @@
+"""镜像预取与多架构镜像选择
+
+install / update 默认在启动服务的关键路径上拉取镜像。`heyhy prefetch` 提前完成这一步：
+1. 识别本机平台 (linux/amd64 及其微架构等级 v1-v4、linux/arm64 等)；
+2. 通过 Registry HTTP API v2 读取镜像的 manifest list / OCI index，选出与本机最匹配的平台 manifest，
+   得到其 digest（匿名 Bearer token 认证，兼容 Docker Hub 与自建 registry）；
+3. 按 digest 拉取并打上原镜像名的标签；也可以从 registry 镜像站拉取，或从 `docker save` 导出的
+   tar 包载入，用于无法访问公网 registry 的节点。
+
+预取成功后记录到 PREFETCH_RECORD_PATH，之后的 install / update 直接使用本地镜像，不再访问 registry。
+"""
+
+import hashlib
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+from hy2d.core import constants, journal, tracing
+
+DOCKER_HUB = "docker.io"
+DOCKER_HUB_REGISTRY = "registry-1.docker.io"
+
+MANIFEST_LIST_TYPES = (
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+)
+MANIFEST_TYPES = (
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+)
+
+_ARCHITECTURES = {
+    "x86_64": ("amd64", None),
+    "amd64": ("amd64", None),
+    "aarch64": ("arm64", "v8"),
+    "arm64": ("arm64", "v8"),
+    "armv7l": ("arm", "v7"),
+    "armv6l": ("arm", "v6"),
+    "riscv64": ("riscv64", None),
+}
+
+# x86-64 微架构等级所需的 CPU 特性 (/proc/cpuinfo 中的 flags)，高等级包含低等级
+_AMD64_LEVELS = (
+    ("v2", {"cx16", "lahf_lm", "popcnt", "sse4_1", "sse4_2", "ssse3"}),
+    ("v3", {"avx", "avx2", "bmi1", "bmi2", "f16c", "fma", "abm", "movbe", "xsave"}),
+    ("v4", {"avx512f", "avx512bw", "avx512cd", "avx512dq", "avx512vl"}),
+)
+
+
+class PrefetchError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Platform:
+    os: str
+    architecture: str
+    variant: Optional[str] = None
+
+    def __str__(self) -> str:
+        return "/".join(p for p in (self.os, self.architecture, self.variant) if p)
+
+    @classmethod
+    def of(cls, manifest: dict) -> "Platform":
+        """manifest list 条目中的平台"""
+        p = manifest.get("platform") or {}
+        return cls(p.get("os", "unknown"), p.get("architecture", "unknown"), p.get("variant"))
+
+    @classmethod
+    def parse(cls, text: str) -> "Platform":
+        """解析 linux/amd64/v3 形式的平台描述"""
+        parts = text.strip("/").split("/")
+        if len(parts) not in (2, 3) or not all(parts):
+            raise ValueError(f"无法解析平台: {text}，格式应为 os/arch[/variant]")
+        return cls(*parts)
+
+
+def _amd64_level(cpuinfo: str) -> str:
+    flags: set[str] = set()
+    for line in cpuinfo.splitlines():
+        if line.startswith("flags"):
+            flags = set(line.partition(":")[2].split())
+            break
+    level = "v1"
+    for name, required in _AMD64_LEVELS:
+        if not required <= flags:
+            break
+        level = name
+    return level
+
+
+def host_platform() -> Platform:
+    machine = platform.machine().lower()
+    if machine not in _ARCHITECTURES:
+        raise PrefetchError(f"不支持的 CPU 架构: {platform.machine()}")
+    architecture, variant = _ARCHITECTURES[machine]
+    if architecture == "amd64":
+        try:
+            variant = _amd64_level(Path("/proc/cpuinfo").read_text(encoding="utf8"))
+        except OSError:
+            variant = "v1"
+    return Platform("linux", architecture, variant)
+
+
+def _variant_rank(variant: Optional[str]) -> int:
+    # 未标注 variant 的 amd64 / arm64 manifest 分别等价于 v1 / v8
+    try:
+        return int((variant or "v0").lstrip("v"))
+    except ValueError:
+        return 0
+
+
+def select_manifest(manifests: list[dict], target: Platform) -> Optional[dict]:
+    """
+    从 manifest list 中选出与目标平台最匹配的条目：
+    操作系统与架构必须一致；variant 取不高于目标等级中最高的一个，
+    例如支持 x86-64-v3 的主机优先选择 amd64/v3，其次是 v2、v1 或未标注 variant 的镜像。
+    目标未指定 variant 时选择兼容性最好（等级最低）的一个。
+    """
+    wanted = _variant_rank(target.variant)
+    candidates = []
+    for manifest in manifests:
+        p = manifest.get("platform") or {}
+        if p.get("os") != target.os or p.get("architecture") != target.architecture:
+            continue
+        rank = _variant_rank(p.get("variant"))
+        if not target.variant or rank <= wanted:
+            candidates.append((rank, manifest))
+    if not candidates:
+        return None
+    pick = max if target.variant else min
+    return pick(candidates, key=lambda item: item[0])[1]
+
+
+@dataclass(frozen=True)
+class ImageRef:
+    registry: str
+    repository: str
+    tag: Optional[str] = None
+    digest: Optional[str] = None
+
+    @classmethod
+    def parse(cls, image: str) -> "ImageRef":
+        name, _, digest = image.partition("@")
+        tag = None
+        if ":" in name.rsplit("/", 1)[-1]:
+            name, tag = name.rsplit(":", 1)
+        first, _, rest = name.partition("/")
+        if rest and ("." in first or ":" in first or first == "localhost"):
+            registry, repository = first, rest
+        else:
+            registry, repository = DOCKER_HUB, name
+            if "/" not in repository:
+                repository = f"library/{repository}"
+        return cls(registry, repository, tag if tag or digest else "latest", digest or None)
+
+    @property
+    def reference(self) -> str:
+        return self.digest or self.tag
+
+    def name(self, registry: Optional[str] = None) -> str:
+        """docker 命令中使用的镜像名（不含标签）"""
+        registry = registry or self.registry
+        if registry == DOCKER_HUB:
+            return self.repository.removeprefix("library/")
+        return f"{registry}/{self.repository}"
+
+
+def _registry_url(registry: str) -> str:
+    """返回 registry 的 API 根地址；回环地址上的 registry 与 docker 一样默认使用 http"""
+    if "://" in registry:
+        return registry.rstrip("/")
+    if registry == DOCKER_HUB:
+        return f"https://{DOCKER_HUB_REGISTRY}"
+    host = registry.rsplit(":", 1)[0] if registry.count(":") == 1 else registry
+    insecure = host in ("localhost", "127.0.0.1", "[::1]")
+    return f"{'http' if insecure else 'https'}://{registry}"
+
+
+def _parse_challenge(header: str) -> dict[str, str]:
+    """解析 WWW-Authenticate: Bearer realm="...",service="...",scope="..." """
+    scheme, _, params = header.partition(" ")
+    if scheme.lower() != "bearer":
+        return {}
+    result = {}
+    for item in params.split(","):
+        key, _, value = item.strip().partition("=")
+        result[key] = value.strip('"')
+    return result
+
+
+class RegistryClient:
+    """Registry HTTP API v2 的最小只读客户端"""
+
+    def __init__(self, registry: str, timeout: float = constants.REGISTRY_TIMEOUT):
+        self.base = _registry_url(registry)
+        self.timeout = timeout
+        self._token: Optional[str] = None
+
+    def _open(self, url: str, accept: tuple[str, ...]):
+        headers = {"Accept": ", ".join(accept)}
+        if self._token:
+            headers["Authorization"] = f"Bearer {self._token}"
+        request = urllib.request.Request(url, headers=headers)
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def _authenticate(self, challenge: str):
+        params = _parse_challenge(challenge)
+        if "realm" not in params:
+            raise PrefetchError(f"registry 要求不支持的认证方式: {challenge}")
+        query = urllib.parse.urlencode(
+            {k: v for k, v in params.items() if k in ("service", "scope")}
+        )
+        with urllib.request.urlopen(f"{params['realm']}?{query}", timeout=self.timeout) as resp:
+            data = json.load(resp)
+        self._token = data.get("token") or data.get("access_token")
+
+    def manifest(self, repository: str, reference: str) -> tuple[dict, str, str]:
+        """返回 (manifest, 媒体类型, digest)"""
+        url = f"{self.base}/v2/{repository}/manifests/{reference}"
+        accept = MANIFEST_LIST_TYPES + MANIFEST_TYPES
+        with tracing.span(f"GET manifest {reference}", "network"):
+            try:
+                resp = self._open(url, accept)
+            except urllib.error.HTTPError as e:
+                challenge = e.headers.get("WWW-Authenticate", "")
+                if e.code != 401 or self._token or not challenge:
+                    raise PrefetchError(f"读取 {repository}:{reference} 失败: HTTP {e.code}")
+                self._authenticate(challenge)
+                resp = self._open(url, accept)
+            with resp:
+                media_type = resp.headers.get("Content-Type", "").split(";")[0]
+                raw = resp.read()
+                # 未返回 Docker-Content-Digest 时，digest 即 manifest 原文的 SHA-256
+                digest = resp.headers.get("Docker-Content-Digest") or (
+                    "sha256:" + hashlib.sha256(raw).hexdigest()
+                )
+                manifest = json.loads(raw)
+        return manifest, manifest.get("mediaType") or media_type, digest
+
+
+@dataclass
+class Resolved:
+    image: str
+    digest: str
+    platform: str
+    # 实际拉取的引用 (registry/repository@digest)
+    pull_ref: str
+
+
+@tracing.traced("resolve_image", "network")
+def resolve(image: str, target: Platform, mirror: Optional[str] = None) -> Resolved:
+    """解析镜像在目标平台上对应的 manifest digest"""
+    ref = ImageRef.parse(image)
+    registry = mirror or ref.registry
+    client = RegistryClient(registry)
+    try:
+        manifest, media_type, digest = client.manifest(ref.repository, ref.reference)
+        if media_type in MANIFEST_LIST_TYPES or "manifests" in manifest:
+            selected = select_manifest(manifest.get("manifests") or [], target)
+            if selected is None:
+                available = sorted({str(Platform.of(m)) for m in manifest.get("manifests") or []})
+                raise PrefetchError(
+                    f"{image} 没有适用于 {target} 的镜像，可用平台: {', '.join(available)}"
+                )
+            digest = selected["digest"]
+            selected_platform = Platform.of(selected)
+        else:
+            # 单架构镜像无法在拉取前确认平台，交由 docker 校验
+            selected_platform = target
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        raise PrefetchError(f"无法访问 registry {registry}: {e}") from e
+
+    mirror_name = mirror.split("://", 1)[-1].rstrip("/") if mirror else None
+    return Resolved(
+        image=image,
+        digest=digest,
+        platform=str(selected_platform),
+        pull_ref=f"{ref.name(mirror_name)}@{digest}",
+    )
+
+
+# --- 预取记录 ---
+
+
+def _load_records() -> dict:
+    try:
+        return json.loads(constants.PREFETCH_RECORD_PATH.read_text(encoding="utf8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def record(image: str, **info):
+    records = _load_records()
+    records[image] = {**info, "time": time.time()}
+    journal.atomic_write(
+        constants.PREFETCH_RECORD_PATH, json.dumps(records, indent=2, ensure_ascii=False)
+    )
+
+
+def take(image: str) -> Optional[dict]:
+    """取出并删除镜像的预取记录；之后的 update 会重新拉取，除非再次预取"""
+    records = _load_records()
+    info = records.pop(image, None)
+    if info is not None:
+        journal.atomic_write(
+            constants.PREFETCH_RECORD_PATH, json.dumps(records, indent=2, ensure_ascii=False)
+        )
+    return info
+
+
+# --- 执行 ---
+
+
+def prefetch_docker(
+    runtime,
+    image: str,
+    target: Platform,
+    mirror: Optional[str] = None,
+    tarball: Optional[Path] = None,
+) -> dict:
+    """为 docker 后端预取镜像，返回预取记录"""
+    if tarball:
+        logging.info(f"正在从 {tarball} 载入镜像...")
+        runtime.load_image(tarball)
+        if not runtime.has_image(image):
+            raise PrefetchError(f"{tarball} 中不包含镜像 {image}。")
+        info = {"source": "tarball", "path": str(tarball)}
+    else:
+        resolved = resolve(image, target, mirror)
+        logging.info(f"{image} -> {resolved.platform} ({resolved.digest})")
+        runtime.pull_image(resolved.pull_ref)
+        if not ImageRef.parse(image).digest:
+            # 打上原镜像名的标签，compose 中的 image 直接命中本地镜像
+            runtime.tag_image(resolved.pull_ref, image)
+        info = {
+            "source": "mirror" if mirror else "registry",
+            "digest": resolved.digest,
+            "platform": resolved.platform,
+            "pull_ref": resolved.pull_ref,
+        }
+    record(image, **info)
+    return {"image": image, **info}
+
+
+def start_background(argv: list[str], global_argv: Sequence[str] = ()) -> tuple[int, Path]:
+    """
+    以独立会话在后台运行 prefetch，输出写入日志文件。
+    global_argv 为放在子命令之前的全局选项（如 --output json），后台进程的文档同样写入日志。
+    """
+    log_path = constants.PREFETCH_LOG_PATH
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with log_path.open("ab") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "hy2d.main", *global_argv, "prefetch", *argv],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    return proc.pid, log_path
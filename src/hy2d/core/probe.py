@@ -0,0 +1,311 @@
+"""节点健康探测
+
+基于 asyncio 并发探测多个 hysteria2 节点，每个节点依次检查：
+1. UDP 可达性：发送一个携带保留版本号的 QUIC Initial 包，服务端应回复 Version Negotiation（RFC 9000 §6），
+   以此测得 UDP 往返时延，不需要完成握手；
+2. TLS 握手：以期望的 SNI 建立 QUIC (ALPN h3) 连接并校验证书；
+3. 伪装站点：未认证的 HTTP/3 请求应由 masquerade 应答，与直接访问伪装站点的状态码对比；
+4. 认证时延：按 hysteria2 协议向 https://hysteria/auth 发送认证请求，成功时返回状态码 233。
+
+步骤 2-4 需要可选依赖 aioquic (`pip install "heyhy[probe]"`)，未安装时只做 UDP 探测。
+启用了 obfs 的节点不会回复未混淆的 QUIC 包，其 UDP/QUIC 探测会被跳过。
+"""
+
+import asyncio
+import os
+import ssl
+import struct
+import time
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+from hy2d.core import constants, tracing
+from hy2d.core.links import HysteriaLink
+
+try:
+    from aioquic.asyncio.client import connect as quic_connect
+    from aioquic.asyncio.protocol import QuicConnectionProtocol
+    from aioquic.h3.connection import H3_ALPN, H3Connection
+    from aioquic.h3.events import DataReceived, HeadersReceived
+    from aioquic.quic.configuration import QuicConfiguration
+except ImportError:
+    quic_connect = None
+    QuicConnectionProtocol = object
+
+# hysteria2 认证成功的状态码
+AUTH_OK_STATUS = 233
+# 形如 0x?a?a?a?a 的版本号保留用于触发版本协商 (RFC 9000 §15)
+_VN_TRIGGER_VERSION = 0x1A2A3A4A
+# 客户端 Initial 包必须填充到至少 1200 字节，否则服务端会直接丢弃
+_MIN_INITIAL_SIZE = 1200
+_MAX_BODY = 64 * 1024
+
+
+@dataclass(slots=True)
+class ProbeTarget:
+    name: str
+    host: str
+    port: int
+    sni: str
+    password: str = ""
+    insecure: bool = False
+    obfs: Optional[str] = None
+    obfs_password: Optional[str] = None
+    masquerade: str = constants.MASQUERADE_WEBSITE
+
+    @classmethod
+    def from_link(cls, link: HysteriaLink, masquerade: Optional[str] = None) -> "ProbeTarget":
+        return cls(
+            name=link.name or link.sni or link.server,
+            host=link.server,
+            port=link.port,
+            sni=link.sni or link.server,
+            password=link.password,
+            insecure=link.insecure,
+            obfs=link.obfs,
+            obfs_password=link.obfs_password,
+            masquerade=masquerade or constants.MASQUERADE_WEBSITE,
+        )
+
+
+@dataclass(slots=True)
+class ProbeResult:
+    name: str
+    host: str
+    port: int
+    ok: bool = False
+    udp_rtt_ms: Optional[float] = None
+    tls_handshake_ms: Optional[float] = None
+    masquerade_status: Optional[int] = None
+    masquerade_expected: Optional[int] = None
+    masquerade_ok: Optional[bool] = None
+    auth_status: Optional[int] = None
+    auth_rtt_ms: Optional[float] = None
+    duration_ms: float = 0.0
+    skipped: list[str] = field(default_factory=list)
+    errors: dict[str, str] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+# --- UDP ---
+
+
+class _VersionNegotiationProtocol(asyncio.DatagramProtocol):
+    def __init__(self, scid: bytes):
+        self.scid = scid
+        self.reply: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data: bytes, addr):
+        # Version Negotiation: 长包头、版本号为 0，DCID 回显客户端的 SCID
+        if len(data) < 7 or not data[0] & 0x80 or data[1:5] != b"\x00\x00\x00\x00":
+            return
+        dcid_len = data[5]
+        if data[6 : 6 + dcid_len] == self.scid and not self.reply.done():
+            self.reply.set_result(data)
+
+    def error_received(self, exc: Exception):
+        if not self.reply.done():
+            self.reply.set_exception(exc)
+
+
+def _vn_trigger_packet(dcid: bytes, scid: bytes) -> bytes:
+    header = struct.pack("!BI", 0xC0 | (os.urandom(1)[0] & 0x0F), _VN_TRIGGER_VERSION)
+    header += bytes([len(dcid)]) + dcid + bytes([len(scid)]) + scid
+    return header + b"\x00" * (_MIN_INITIAL_SIZE - len(header))
+
+
+async def probe_udp(host: str, port: int, timeout: float = 3, attempts: int = 2) -> float:
+    """返回 UDP 往返时延 (毫秒)；超时或被拒绝时抛出异常"""
+    loop = asyncio.get_running_loop()
+    dcid, scid = os.urandom(8), os.urandom(8)
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: _VersionNegotiationProtocol(scid), remote_addr=(host, port)
+    )
+    try:
+        packet = _vn_trigger_packet(dcid, scid)
+        # UDP 可能丢包，超时时间平均分给每次尝试
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            transport.sendto(packet)
+            try:
+                await asyncio.wait_for(asyncio.shield(protocol.reply), timeout / attempts)
+                return _ms(started)
+            except asyncio.TimeoutError:
+                if attempt == attempts - 1:
+                    raise
+    finally:
+        transport.close()
+
+
+# --- QUIC / HTTP/3 ---
+
+
+class _H3Client(QuicConnectionProtocol):
+    """只支持简单请求的最小 HTTP/3 客户端"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = H3Connection(self._quic)
+        self._pending: dict[int, tuple[asyncio.Future, dict]] = {}
+
+    def quic_event_received(self, event):
+        for h3_event in self._http.handle_event(event):
+            pending = self._pending.get(getattr(h3_event, "stream_id", None))
+            if pending is None:
+                continue
+            waiter, response = pending
+            if isinstance(h3_event, HeadersReceived):
+                response["headers"].update(dict(h3_event.headers))
+            elif isinstance(h3_event, DataReceived) and len(response["body"]) < _MAX_BODY:
+                response["body"] += h3_event.data
+            if h3_event.stream_ended:
+                del self._pending[h3_event.stream_id]
+                if not waiter.done():
+                    waiter.set_result(response)
+
+    async def request(self, method: str, authority: str, path: str, headers=()) -> dict:
+        stream_id = self._quic.get_next_available_stream_id()
+        waiter = asyncio.get_running_loop().create_future()
+        self._pending[stream_id] = (waiter, {"headers": {}, "body": b""})
+        self._http.send_headers(
+            stream_id=stream_id,
+            headers=[
+                (b":method", method.encode()),
+                (b":scheme", b"https"),
+                (b":authority", authority.encode()),
+                (b":path", path.encode()),
+                (b"user-agent", b"heyhy-probe"),
+                *headers,
+            ],
+            end_stream=True,
+        )
+        self.transmit()
+        response = await waiter
+        response["status"] = int(response["headers"].get(b":status", b"0"))
+        return response
+
+
+async def _probe_quic(target: ProbeTarget, result: ProbeResult, expected: Optional[int]):
+    configuration = QuicConfiguration(
+        is_client=True, alpn_protocols=H3_ALPN, server_name=target.sni
+    )
+    if target.insecure:
+        configuration.verify_mode = ssl.CERT_NONE
+
+    started = time.perf_counter()
+    async with quic_connect(
+        target.host, target.port, configuration=configuration, create_protocol=_H3Client
+    ) as client:
+        result.tls_handshake_ms = _ms(started)
+
+        # 未认证的请求由 masquerade 应答
+        try:
+            response = await client.request("GET", target.sni, "/")
+            result.masquerade_status = response["status"]
+            result.masquerade_expected = expected
+            if expected is None:
+                result.masquerade_ok = 0 < response["status"] < 500
+            else:
+                result.masquerade_ok = response["status"] == expected
+        except Exception as e:
+            result.errors["masquerade"] = str(e) or type(e).__name__
+
+        # https://v2.hysteria.network/zh/docs/developers/Protocol/#认证
+        if not target.password:
+            result.skipped.append("auth")
+            return
+        started = time.perf_counter()
+        response = await client.request(
+            "POST",
+            "hysteria",
+            "/auth",
+            headers=[
+                (b"hysteria-auth", target.password.encode()),
+                (b"hysteria-cc-rx", b"0"),
+                (b"hysteria-padding", os.urandom(16).hex().encode()),
+            ],
+        )
+        result.auth_rtt_ms = _ms(started)
+        result.auth_status = response["status"]
+        if response["status"] != AUTH_OK_STATUS:
+            result.errors["auth"] = f"认证失败 (HTTP {response['status']})"
+
+
+def fetch_status(url: str, timeout: float = 10) -> Optional[int]:
+    """直接访问伪装站点，返回其状态码；失败时返回 None"""
+    request = urllib.request.Request(url, headers={"User-Agent": "heyhy-probe"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return None
+
+
+async def probe_target(
+    target: ProbeTarget, timeout: float, expected_status: dict[str, Optional[int]]
+) -> ProbeResult:
+    result = ProbeResult(name=target.name, host=target.host, port=target.port)
+    started = time.perf_counter()
+    with tracing.span(f"probe {target.name}", "network"):
+        if target.obfs:
+            result.skipped += ["udp", "tls", "masquerade", "auth"]
+            result.errors["obfs"] = f"节点启用了 {target.obfs} 混淆，无法直接探测"
+        else:
+            try:
+                result.udp_rtt_ms = await probe_udp(target.host, target.port, timeout)
+            except (asyncio.TimeoutError, OSError) as e:
+                result.errors["udp"] = str(e) or "超时，未收到版本协商应答"
+
+            if quic_connect is None:
+                result.skipped += ["tls", "masquerade", "auth"]
+            elif "udp" not in result.errors:
+                try:
+                    await asyncio.wait_for(
+                        _probe_quic(target, result, expected_status.get(target.masquerade)),
+                        timeout,
+                    )
+                except asyncio.TimeoutError:
+                    result.errors["tls" if result.tls_handshake_ms is None else "auth"] = "超时"
+                except Exception as e:
+                    key = "tls" if result.tls_handshake_ms is None else "auth"
+                    result.errors[key] = str(e) or type(e).__name__
+    result.duration_ms = _ms(started)
+    result.ok = not result.errors and result.masquerade_ok is not False
+    return result
+
+
+async def aprobe_many(
+    targets: list[ProbeTarget], concurrency: int = 32, timeout: float = 5
+) -> list[ProbeResult]:
+    """并发探测所有节点，结果顺序与输入一致"""
+    semaphore = asyncio.Semaphore(concurrency)
+    expected_status: dict[str, Optional[int]] = {}
+    if quic_connect is not None:
+        # 每个伪装站点只直接访问一次，作为对比基准
+        urls = sorted({t.masquerade for t in targets if not t.obfs})
+        statuses = await asyncio.gather(
+            *(asyncio.to_thread(fetch_status, url, timeout) for url in urls)
+        )
+        expected_status = dict(zip(urls, statuses))
+
+    async def bounded(target: ProbeTarget) -> ProbeResult:
+        async with semaphore:
+            return await probe_target(target, timeout, expected_status)
+
+    return list(await asyncio.gather(*(bounded(t) for t in targets)))
+
+
+def probe_many(
+    targets: list[ProbeTarget], concurrency: int = 32, timeout: float = 5
+) -> list[ProbeResult]:
+    return asyncio.run(aprobe_many(targets, concurrency, timeout))
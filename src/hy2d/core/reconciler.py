@@ -0,0 +1,285 @@
+"""声明式期望状态调和器
+
+读取期望状态 (state.yaml)，与磁盘上的配置文件及容器状态比较，
+只执行收敛所需的最小动作集合。
+
+state.yaml 示例::
+
+    domain: example.com
+    image: metacubex/mihomo:latest
+    listeners:
+      - port: 4433
+        users:
+          alice: "password-1"
+          bob: "password-2"
+        masquerade: https://cocodataset.org/
+      - port: 4443
+        users:
+          carol: "password-3"
+        obfs: salamander
+        obfs-password: "obfs-password"
+        alpn: [h3]
+    tuning:
+      bbr: true
+      sysctl:
+        net.core.rmem_max: 16777216
+    acme:
+      mode: webroot
+      webroot_path: /var/www/html
+"""
+
+import logging
+from dataclasses import dataclass, field
+from enum import IntEnum
+from pathlib import Path
+from typing import Callable, Optional
+
+import yaml
+
+from hy2d.core import certs, configs, constants, journal, masquerade, utils
+from hy2d.core.constants import MASQUERADE_WEBSITE, SERVICE_IMAGE
+
+BBR_SYSCTL = {"net.core.default_qdisc": "cake", "net.ipv4.tcp_congestion_control": "bbr"}
+
+
+class ServiceAction(IntEnum):
+    """服务层面需要执行的动作，数值越大代价越高，高等级动作涵盖低等级动作"""
+
+    NOOP = 0
+    RELOAD = 1
+    RESTART = 2
+    RECREATE = 3
+
+
+def _default_listen() -> str:
+    """与 install 一致：主机支持 IPv6 时监听双栈"""
+    return constants.DUAL_STACK_LISTEN if utils.ipv6_available() else "0.0.0.0"
+
+
+@dataclass
+class DesiredListener:
+    port: int
+    users: dict[str, str]
+    name: Optional[str] = None
+    listen: str = field(default_factory=_default_listen)
+    masquerade: str = MASQUERADE_WEBSITE
+    obfs: Optional[str] = None
+    obfs_password: Optional[str] = None
+    alpn: Optional[list[str]] = None
+
+
+@dataclass
+class DesiredState:
+    domain: str
+    image: str = SERVICE_IMAGE
+    listeners: list[DesiredListener] = field(default_factory=list)
+    sysctl: dict[str, str] = field(default_factory=dict)
+    acme: certs.AcmeOptions = field(default_factory=certs.AcmeOptions)
+
+    @classmethod
+    def from_yaml(cls, path: Path) -> "DesiredState":
+        data = yaml.safe_load(path.read_text(encoding="utf8")) or {}
+        if not data.get("domain"):
+            raise ValueError("期望状态缺少 domain 字段。")
+
+        listeners = []
+        for item in data.get("listeners") or []:
+            if not item.get("port") or not item.get("users"):
+                raise ValueError("每个 listener 都必须包含 port 和 users 字段。")
+            if item.get("obfs") and item["obfs"] not in constants.OBFS_TYPES:
+                raise ValueError(f"不支持的混淆类型: {item['obfs']}")
+            if item.get("obfs") and not item.get("obfs-password"):
+                raise ValueError("启用混淆的 listener 必须包含 obfs-password 字段。")
+            listeners.append(
+                DesiredListener(
+                    port=int(item["port"]),
+                    users={str(k): str(v) for k, v in item["users"].items()},
+                    name=item.get("name"),
+                    listen=item.get("listen") or _default_listen(),
+                    masquerade=item.get("masquerade", MASQUERADE_WEBSITE),
+                    obfs=item.get("obfs"),
+                    obfs_password=item.get("obfs-password"),
+                    alpn=item.get("alpn"),
+                )
+            )
+        if not listeners:
+            raise ValueError("期望状态至少需要一个 listener。")
+        ports = [listener.port for listener in listeners]
+        if len(ports) != len(set(ports)):
+            raise ValueError("listener 端口重复。")
+
+        tuning = data.get("tuning") or {}
+        sysctl = {}
+        if tuning.get("bbr"):
+            sysctl.update(BBR_SYSCTL)
+        sysctl.update({str(k): str(v) for k, v in (tuning.get("sysctl") or {}).items()})
+
+        acme = certs.AcmeOptions(**(data.get("acme") or {}))
+        acme.validate()
+
+        return cls(
+            domain=data["domain"],
+            image=data.get("image", SERVICE_IMAGE),
+            listeners=listeners,
+            sysctl=sysctl,
+            acme=acme,
+        )
+
+    def render_mihomo(self, controller_secret: Optional[str]) -> dict:
+        listeners = [
+            configs.build_listener(
+                domain=self.domain,
+                port=listener.port,
+                users=listener.users,
+                name=listener.name,
+                listen=listener.listen,
+                masquerade=listener.masquerade,
+                obfs=listener.obfs,
+                obfs_password=listener.obfs_password,
+                alpn=listener.alpn,
+            )
+            for listener in self.listeners
+        ]
+        return configs.build_mihomo_config(listeners, controller_secret)
+
+    def render_compose(self) -> dict:
+        # 以 file:// 使用本地镜像的伪装站点时，需要把镜像目录挂载进容器
+        local = any(listener.masquerade == masquerade.file_url() for listener in self.listeners)
+        return configs.build_compose_config(
+            self.domain, self.image, constants.MASQUERADE_DIR if local else None
+        )
+
+
+@dataclass
+class Step:
+    """计划中的一个具体步骤"""
+
+    target: str
+    detail: str
+    apply: Optional[Callable[[], None]] = None
+    service_action: ServiceAction = ServiceAction.NOOP
+    files: dict[Path, str] = field(default_factory=dict)
+
+
+@dataclass
+class Plan:
+    steps: list[Step] = field(default_factory=list)
+    service_action: ServiceAction = ServiceAction.NOOP
+    service_reason: str = ""
+
+    @property
+    def empty(self) -> bool:
+        return not self.steps and self.service_action == ServiceAction.NOOP
+
+    def require(self, action: ServiceAction, reason: str):
+        if action > self.service_action:
+            self.service_action = action
+            self.service_reason = reason
+
+
+class Reconciler:
+    """对比期望状态与实际状态，生成并执行最小变更计划"""
+
+    def __init__(self, manager, desired: DesiredState):
+        self.manager = manager
+        self.desired = desired
+        self.mihomo_cfg: dict = {}
+        self.compose_cfg: dict = {}
+
+    @staticmethod
+    def _current_config() -> dict:
+        try:
+            return configs.load_yaml(constants.CONFIG_PATH) or {}
+        except (FileNotFoundError, yaml.YAMLError):
+            return {}
+
+    def _file_step(self, path: Path, text: str, action: ServiceAction) -> Optional[Step]:
+        if configs.file_hash(path) == configs.content_hash(text):
+            return None
+        detail = "创建" if not path.exists() else "内容变更"
+        return Step(target=str(path), detail=detail, service_action=action, files={path: text})
+
+    def plan(self) -> Plan:
+        desired = self.desired
+        plan = Plan()
+
+        # 1. 证书
+        fullchain, _ = configs.cert_paths(desired.domain)
+        if not Path(fullchain).exists():
+            plan.steps.append(
+                Step(
+                    target=fullchain,
+                    detail="证书不存在，申请证书",
+                    apply=lambda: self.manager._issue_certificate(
+                        desired.domain, acme=desired.acme
+                    ),
+                    service_action=ServiceAction.RESTART,
+                )
+            )
+
+        # 2. 配置文件：内容哈希一致的文件不产生任何动作
+        current = self._current_config()
+        self.mihomo_cfg = desired.render_mihomo(current.get("secret"))
+        certs.keep_pinned_paths(
+            self.mihomo_cfg.get("listeners") or [], current.get("listeners") or []
+        )
+        self.compose_cfg = desired.render_compose()
+        mihomo_text = configs.dump_yaml(self.mihomo_cfg)
+        compose_text = configs.dump_yaml(self.compose_cfg)
+        for step in (
+            self._file_step(constants.CONFIG_PATH, mihomo_text, ServiceAction.RELOAD),
+            self._file_step(constants.DOCKER_COMPOSE_PATH, compose_text, ServiceAction.RECREATE),
+        ):
+            if step:
+                plan.steps.append(step)
+
+        # 3. 内核参数
+        if desired.sysctl:
+            current = utils.read_sysctl(list(desired.sysctl))
+            drift = {k: v for k, v in desired.sysctl.items() if current.get(k) != v}
+            if drift:
+                plan.steps.append(
+                    Step(
+                        target="sysctl",
+                        detail=", ".join(f"{k}={v}" for k, v in drift.items()),
+                        apply=lambda: self._apply_sysctl(desired.sysctl),
+                    )
+                )
+
+        for step in plan.steps:
+            plan.require(step.service_action, f"{step.target} {step.detail}")
+
+        # 4. 容器状态
+        status = self.manager._container_status(desired.domain)
+        if not status or "Up" not in status:
+            plan.require(ServiceAction.RECREATE, "服务容器未运行")
+
+        return plan
+
+    @staticmethod
+    def _apply_sysctl(values: dict[str, str]):
+        journal.atomic_write(
+            constants.SYSCTL_CONF_PATH, "".join(f"{k}={v}\n" for k, v in values.items())
+        )
+        utils.run_command(["sysctl", "-p", str(constants.SYSCTL_CONF_PATH)])
+
+    def execute(self, plan: Plan):
+        files: dict[Path, str] = {}
+        for step in plan.steps:
+            if step.apply:
+                logging.info(f"正在执行: {step.target} ({step.detail})")
+                step.apply()
+            files.update(step.files)
+
+        # 所有文件变更作为一个代际原子提交
+        if files:
+            self.manager._preflight(self.mihomo_cfg, self.compose_cfg)
+            generation = journal.commit_files(files, reason="apply")
+            logging.info(f"已写入 {len(files)} 个配置文件 (代际 #{generation})。")
+
+        if plan.service_action == ServiceAction.RELOAD:
+            self.manager._reload_service()
+        elif plan.service_action == ServiceAction.RESTART:
+            self.manager._restart_service()
+        elif plan.service_action == ServiceAction.RECREATE:
+            self.manager._recreate_service()
@@ -0,0 +1,369 @@
+"""可插拔的客户端配置渲染器
+
+每个渲染器分两步工作：build() 基于 ClientProfile 构建数据结构，serialize() 将其序列化为文本。
+新增客户端格式只需继承 Renderer 并用 @register 注册。
+
+YAML 优先使用 libyaml 的 CSafeDumper（不可用时回退到纯 Python 的 SafeDumper）。
+Clash.Meta 配置中与用户无关的 DNS/规则段落在首次使用时解析并序列化一次，
+之后每次渲染只序列化 proxies/proxy-groups 片段并拼接在其后。
+批量导出的性能见 examples/bench_renderers.py。
+
+ClientProfile.ruleset_url 不为空时，规则不再内联，而是拆分为若干 rule-providers，
+由订阅端点 (hy2d.core.subscription) 统一提供，客户端按 ETag 缓存，所有用户共享同一份规则集。
+
+混淆 (obfs)、证书指纹 (pin_sha256) 与 ALPN 由各渲染器按目标格式的字段名输出；
+格式本身不支持的选项（分享链接与 hysteria2 原生客户端的 ALPN、sing-box 的证书指纹）会被省略。
+"""
+
+import abc
+import json
+from functools import lru_cache
+from typing import Any, Iterable, Iterator
+
+import yaml
+
+from hy2d.core import configs, constants
+from hy2d.core.links import HysteriaLink
+from hy2d.core.models import ClientProfile
+
+# https://adguard-dns.io/kb/zh-CN/general/dns-providers
+# https://github.com/MetaCubeX/Clash.Meta/blob/53f9e1ee7104473da2b4ff5da29965563084482d/config/config.go#L891
+CLASH_META_BASE = """
+dns:
+  enable: true
+  prefer-h3: true
+  enhanced-mode: fake-ip
+  nameserver:
+    - "https://dns.google/dns-query#PROXY"
+    - "https://security.cloudflare-dns.com/dns-query#PROXY"
+    - "quic://dns.adguard-dns.com"
+  proxy-server-nameserver:
+    - "https://223.5.5.5/dns-query"
+  nameserver-policy:
+    "geosite:cn":
+      - "https://223.5.5.5/dns-query#h3=true"
+rules:
+  - GEOSITE,category-scholar-!cn,PROXY
+  - GEOSITE,category-ads-all,REJECT
+  - GEOSITE,youtube,PROXY
+  - GEOSITE,google,PROXY
+  - GEOSITE,cn,DIRECT
+  - GEOSITE,private,DIRECT
+  - GEOSITE,steam@cn,DIRECT
+  - GEOSITE,category-games@cn,DIRECT
+  - GEOSITE,geolocation-!cn,PROXY
+  - GEOIP,private,DIRECT,no-resolve
+  - GEOIP,telegram,PROXY
+  - GEOIP,CN,DIRECT
+  - DST-PORT,80/8080/443/8443,PROXY
+  - MATCH,DIRECT
+"""
+
+RENDERERS: dict[str, "Renderer"] = {}
+
+
+def register(cls):
+    """注册渲染器类（以其 name 为键）"""
+    RENDERERS[cls.name] = cls()
+    return cls
+
+
+def get_renderer(name: str) -> "Renderer":
+    try:
+        return RENDERERS[name]
+    except KeyError:
+        raise ValueError(f"未知的客户端格式: {name}，可选 {', '.join(RENDERERS)}") from None
+
+
+def render(name: str, profile: ClientProfile) -> str:
+    return get_renderer(name).render(profile)
+
+
+def render_many(name: str, profiles: Iterable[ClientProfile]) -> Iterator[str]:
+    """批量渲染，渲染器只查找一次"""
+    renderer = get_renderer(name)
+    for profile in profiles:
+        yield renderer.render(profile)
+
+
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+def dump_yaml(data) -> str:
+    return yaml.dump(data, Dumper=YAML_DUMPER, sort_keys=False, allow_unicode=True)
+
+
+RULESET_PREFIX = "heyhy"
+RULESET_INTERVAL = 86400
+
+
+def _load_base() -> dict:
+    return yaml.load(CLASH_META_BASE, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+@lru_cache(maxsize=None)
+def _base_rules() -> tuple[str, ...]:
+    return tuple(_load_base()["rules"])
+
+
+_client_rules_cache: dict[tuple, tuple[str, ...]] = {}
+
+
+def client_rules() -> tuple[str, ...]:
+    """
+    客户端分流规则。存在 CLIENT_RULES_PATH 时使用其中的 rules 列表，否则使用内置规则。
+    文件按 inode/mtime/size 缓存，修改后下一次渲染即生效。
+    """
+    try:
+        st = constants.CLIENT_RULES_PATH.stat()
+    except FileNotFoundError:
+        return _base_rules()
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if key not in _client_rules_cache:
+        _client_rules_cache.clear()
+        _client_rules_cache[key] = tuple(configs.load_yaml(constants.CLIENT_RULES_PATH)["rules"])
+    return _client_rules_cache[key]
+
+
+@lru_cache(maxsize=4)
+def _clash_meta_static(rules: tuple[str, ...]) -> tuple[dict, str]:
+    """Clash.Meta 的静态段落：(解析后的数据, 序列化后的文本)，同一份规则只计算一次"""
+    data = _load_base()
+    data["rules"] = list(rules)
+    return data, dump_yaml(data)
+
+
+def split_rules(rules) -> tuple[dict[str, list[str]], list[str]]:
+    """
+    将内联规则拆分为 classical 规则集与引用它们的 RULE-SET 规则。
+    只合并相邻且策略、附加参数都相同的规则，匹配顺序与原规则完全一致；MATCH 保持内联。
+    """
+    providers: dict[str, list[str]] = {}
+    refs: list[str] = []
+    group_key = None
+    for rule in rules:
+        parts = rule.split(",")
+        if parts[0] == "MATCH" or len(parts) < 3:
+            refs.append(rule)
+            group_key = None
+            continue
+        matcher, target, options = ",".join(parts[:2]), parts[2], parts[3:]
+        key = (target, tuple(options))
+        if key != group_key:
+            name = f"{RULESET_PREFIX}-{len(providers):02d}-{target.lower()}"
+            providers[name] = []
+            refs.append(",".join(["RULE-SET", name, target, *options]))
+            group_key = key
+        providers[name].append(matcher)
+    return providers, refs
+
+
+@lru_cache(maxsize=4)
+def compiled_rulesets(rules: tuple[str, ...]) -> dict[str, str]:
+    """规则集名称 -> 规则集文件内容 (rule-provider payload)"""
+    providers, _ = split_rules(rules)
+    return {name: dump_yaml({"payload": payload}) for name, payload in providers.items()}
+
+
+def use_rule_providers(config: dict, ruleset_url: str) -> dict:
+    """
+    将 Clash.Meta 配置中内联的 rules 替换为对订阅端点共享规则集的引用（原地修改）。
+    config 中的 rules 需与端点提供的规则（内置规则或 client-rules.yaml）一致。
+    """
+    providers, refs = split_rules(config.pop("rules"))
+    base = ruleset_url.rstrip("/")
+    config["rule-providers"] = {
+        **(config.get("rule-providers") or {}),
+        **{
+            name: {
+                # format 默认为 yaml，省略 path 时客户端按 URL 哈希自动存放
+                "type": "http",
+                "behavior": "classical",
+                "url": f"{base}/rulesets/{name}.yaml",
+                "interval": RULESET_INTERVAL,
+            }
+            for name in providers
+        },
+    }
+    config["rules"] = refs
+    return config
+
+
+@lru_cache(maxsize=32)
+def _clash_meta_provider_static(ruleset_url: str, rules: tuple[str, ...]) -> tuple[dict, str]:
+    """以 rule-providers 引用共享规则集的静态段落，按订阅地址与规则缓存"""
+    data = _load_base()
+    data["rules"] = list(rules)
+    use_rule_providers(data, ruleset_url)
+    return data, dump_yaml(data)
+
+
+def _clash_meta_static_for(profile: ClientProfile) -> tuple[dict, str]:
+    rules = client_rules()
+    if profile.ruleset_url:
+        return _clash_meta_provider_static(profile.ruleset_url, rules)
+    return _clash_meta_static(rules)
+
+
+def dump_json(data) -> str:
+    return json.dumps(data, indent=4, ensure_ascii=True)
+
+
+class Renderer(abc.ABC):
+    name = ""
+    # yaml | json | text
+    format = "text"
+
+    @abc.abstractmethod
+    def build(self, profile: ClientProfile) -> Any:
+        """基于 ClientProfile 构建该格式的数据结构"""
+
+    def serialize(self, data) -> str:
+        if self.format == "yaml":
+            return dump_yaml(data)
+        if self.format == "json":
+            return dump_json(data)
+        return str(data)
+
+    def render(self, profile: ClientProfile) -> str:
+        return self.serialize(self.build(profile))
+
+
+@register
+class MihomoProxyRenderer(Renderer):
+    """Mihomo (Clash.Meta) 的 proxies 片段"""
+
+    name = "mihomo"
+    format = "yaml"
+
+    def build(self, profile: ClientProfile) -> list[dict]:
+        # https://wiki.metacubex.one/config/proxies/hysteria2/
+        proxy = {
+            "name": profile.name,
+            "type": constants.MIHOMO_LISTEN_TYPE,
+            "server": profile.server,
+            "port": profile.port,
+            "password": profile.password,
+            "sni": profile.sni,
+            "skip-cert-verify": profile.skip_cert_verify,
+        }
+        if profile.obfs:
+            proxy["obfs"] = profile.obfs
+            proxy["obfs-password"] = profile.obfs_password
+        if profile.pin_sha256:
+            proxy["fingerprint"] = profile.pin_sha256
+        if profile.alpn:
+            proxy["alpn"] = list(profile.alpn)
+        if profile.ip_version:
+            proxy["ip-version"] = profile.ip_version
+        return [proxy]
+
+
+@register
+class ClashMetaRenderer(Renderer):
+    """完整的 Clash.Meta 客户端配置：DNS、规则、代理与代理组"""
+
+    name = "clash-meta"
+    format = "yaml"
+    proxy_name = "hysteria2"
+
+    def fragment(self, profile: ClientProfile) -> dict:
+        """与用户相关的部分：代理与代理组"""
+        proxy = RENDERERS["mihomo"].build(profile)[0]
+        proxy["name"] = self.proxy_name
+        return {
+            "proxies": [proxy],
+            # https://wiki.metacubex.one/config/proxy-groups/select/
+            "proxy-groups": [{"name": "PROXY", "type": "select", "proxies": [self.proxy_name]}],
+        }
+
+    def build(self, profile: ClientProfile) -> dict:
+        # 静态段落在各次调用间共享，调用方不应原地修改
+        static, _ = _clash_meta_static_for(profile)
+        return {**static, **self.fragment(profile)}
+
+    def render(self, profile: ClientProfile) -> str:
+        _, static_text = _clash_meta_static_for(profile)
+        return static_text + dump_yaml(self.fragment(profile))
+
+
+# Mihomo ip-version -> sing-box 拨号字段 domain_strategy；dual 时使用 sing-box 的默认策略
+SING_BOX_DOMAIN_STRATEGY = {"ipv4-prefer": "prefer_ipv4", "ipv6-prefer": "prefer_ipv6"}
+
+
+@register
+class SingBoxRenderer(Renderer):
+    """https://sing-box.sagernet.org/zh/configuration/outbound/hysteria2/"""
+
+    name = "sing-box"
+    format = "json"
+
+    def build(self, profile: ClientProfile) -> dict:
+        outbound = {
+            "server": profile.server,
+            "server_port": profile.port,
+            "password": profile.password,
+            "tls": {
+                "enabled": True,
+                "disable_sni": False,
+                "server_name": profile.sni,
+                "insecure": profile.skip_cert_verify,
+            },
+            "type": "hysteria2",
+            "tag": "hy2-out",
+        }
+        if profile.alpn:
+            outbound["tls"]["alpn"] = list(profile.alpn)
+        if profile.obfs:
+            outbound["obfs"] = {"type": profile.obfs, "password": profile.obfs_password}
+        if profile.ip_version in SING_BOX_DOMAIN_STRATEGY:
+            outbound["domain_strategy"] = SING_BOX_DOMAIN_STRATEGY[profile.ip_version]
+        return outbound
+
+
+@register
+class NekoRayRenderer(Renderer):
+    """hysteria2 原生客户端配置，用于 NekoRay (v3.8+) 自定义核心"""
+
+    name = "nekoray"
+    format = "json"
+
+    def build(self, profile: ClientProfile) -> dict:
+        # https://v2.hysteria.network/zh/docs/advanced/Full-Client-Config/
+        host = f"[{profile.server}]" if ":" in profile.server else profile.server
+        conf = {
+            "server": f"{host}:{profile.port}",
+            "auth": profile.password,
+            "tls": {"sni": profile.sni, "insecure": profile.skip_cert_verify},
+        }
+        if profile.pin_sha256:
+            conf["tls"]["pinSHA256"] = profile.pin_sha256
+        if profile.obfs:
+            conf["obfs"] = {"type": profile.obfs, profile.obfs: {"password": profile.obfs_password}}
+        return {
+            **conf,
+            "fastOpen": True,
+            "lazy": True,
+            "socks5": {"listen": "127.0.0.1:%socks_port%"},
+        }
+
+
+@register
+class ShareLinkRenderer(Renderer):
+    """https://v2.hysteria.network/zh/docs/developers/URI-Scheme/"""
+
+    name = "share-link"
+
+    def build(self, profile: ClientProfile) -> str:
+        # 经由链接编解码器生成，密码与别名中的特殊字符会被正确转义
+        return HysteriaLink(
+            server=profile.server,
+            port=profile.port,
+            password=profile.password,
+            name=profile.sni,
+            sni=profile.sni,
+            insecure=profile.skip_cert_verify,
+            obfs=profile.obfs,
+            obfs_password=profile.obfs_password,
+            pin_sha256=profile.pin_sha256,
+        ).to_uri()
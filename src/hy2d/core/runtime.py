@@ -0,0 +1,630 @@
+"""服务运行时后端
+
+同一份 Mihomo 配置 (config.yaml) 可以由不同的运行时托管：
+- docker: 以 docker compose 服务运行（默认），优先通过 Docker Engine API 管理，不可用时回退到 CLI；
+- systemd: 直接以原生二进制运行 mihomo，无需 Docker 守护进程，适合小内存主机。
+  可通过 CPUAffinity、MemoryMax、LimitNOFILE、Nice 等 systemd 指令限制资源。
+
+docker-compose.yaml 在两种后端下都作为服务定义（域名、镜像/版本）保存，
+因此 update、apply、validate、rollback 等命令的行为与后端无关。
+所选后端及资源限制记录在工作目录的 runtime.yaml 中。
+"""
+
+import abc
+import gzip
+import json
+import logging
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from hy2d.core import configs, constants, dockerapi, journal, models, prefetch, tracing, utils
+from hy2d.core.constants import COMPOSE_CONTAINER_PREFIX, COMPOSE_SERVICE_NAME
+
+RUNTIME_BACKENDS = ("docker", "systemd")
+
+
+@dataclass
+class Resources:
+    """systemd 资源限制，未设置的项不写入 unit"""
+
+    cpu_affinity: Optional[str] = None  # 例如 "0" 或 "0-1"
+    memory_max: Optional[str] = None  # 例如 "256M"
+    limit_nofile: Optional[int] = 1048576
+    nice: Optional[int] = None
+
+    def directives(self) -> list[str]:
+        lines = []
+        if self.cpu_affinity:
+            lines.append(f"CPUAffinity={self.cpu_affinity}")
+        if self.memory_max:
+            lines.append(f"MemoryMax={self.memory_max}")
+        if self.limit_nofile:
+            lines.append(f"LimitNOFILE={self.limit_nofile}")
+        if self.nice is not None:
+            lines.append(f"Nice={self.nice}")
+        return lines
+
+
+@dataclass
+class RuntimeConfig:
+    backend: str = "docker"
+    resources: Resources = field(default_factory=Resources)
+
+    @classmethod
+    def load(cls) -> "RuntimeConfig":
+        """读取 runtime.yaml；旧版本安装没有该文件，视为 docker 后端"""
+        try:
+            data = configs.load_yaml(constants.RUNTIME_CONFIG_PATH) or {}
+        except (FileNotFoundError, yaml.YAMLError):
+            return cls()
+        return cls(
+            backend=data.get("backend", "docker"),
+            resources=Resources(**(data.get("resources") or {})),
+        )
+
+    def dump(self) -> str:
+        return configs.dump_yaml(asdict(self))
+
+
+def _image_of(compose_cfg: dict) -> str:
+    return compose_cfg["services"][COMPOSE_SERVICE_NAME]["image"]
+
+
+def _load_compose() -> dict:
+    return configs.load_yaml(constants.DOCKER_COMPOSE_PATH)
+
+
+class Runtime(abc.ABC):
+    """运行时后端接口"""
+
+    name = ""
+    # check 命令中状态行的标题
+    status_label = "服务运行状态"
+
+    @abc.abstractmethod
+    def ensure_dependencies(self, auto_install: bool = False) -> bool:
+        """检查运行时依赖；auto_install 时自动安装。:return: 本次是否执行了安装"""
+
+    @abc.abstractmethod
+    def prepare(self, image: str):
+        """准备运行所需的镜像或二进制"""
+
+    @abc.abstractmethod
+    def status(self, domain: str) -> Optional[str]:
+        """
+        返回服务状态文本，运行中以 "Up" 开头（与 `docker ps` 的 Status 列一致）。
+        服务不存在时返回空字符串，运行时不可用时返回 None。
+        """
+
+    @abc.abstractmethod
+    def start(self):
+        """启动服务"""
+
+    @abc.abstractmethod
+    def stop(self, purge: bool = False):
+        """停止并移除服务实例；purge 时一并清理数据卷或 unit 文件"""
+
+    @abc.abstractmethod
+    def restart(self):
+        """重启服务，不重建"""
+
+    @abc.abstractmethod
+    def recreate(self):
+        """按当前服务定义重新创建并启动服务"""
+
+    @abc.abstractmethod
+    def logs(self, follow: bool = True):
+        """输出服务日志；follow 时持续跟随"""
+
+    @abc.abstractmethod
+    def dry_run(self, image: str, mihomo_text: str, report):
+        """用候选镜像或二进制试运行候选配置 (`mihomo -t`)"""
+
+
+class DockerRuntime(Runtime):
+    name = "docker"
+    status_label = "服务容器状态"
+
+    def __init__(self):
+        self.compose_cmd: Optional[list[str]] = None
+        self._api: Optional[dockerapi.DockerClient] = None
+        self._api_checked = False
+
+    def api(self) -> Optional[dockerapi.DockerClient]:
+        """返回可用的 Docker Engine API 客户端；守护进程不可达时返回 None，调用方回退到 CLI"""
+        if not self._api_checked:
+            client = dockerapi.DockerClient()
+            self._api = client if client.ping() else None
+            self._api_checked = True
+        return self._api
+
+    @staticmethod
+    def _container_name() -> str:
+        return models.load_service().container_name
+
+    def get_compose_cmd(self) -> list[str]:
+        """检测并返回可用的 docker compose 命令，并缓存结果。"""
+        if self.compose_cmd:
+            return self.compose_cmd
+
+        try:
+            # 优先使用 "docker compose" (V2)
+            utils.run_command(
+                ["docker", "compose", "version"],
+                capture_output=True,
+                install_docker=True,
+                skip_execution_logging=True,
+                propagate_exception=True,
+            )
+            self.compose_cmd = ["docker", "compose"]
+            logging.debug("检测到 Docker Compose V2 (docker compose)，将使用此命令。")
+            return self.compose_cmd
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            # 回退到 "docker-compose" (V1)
+            logging.debug("未检测到 'docker compose' (V2)，尝试 'docker-compose' (V1)...")
+            try:
+                utils.run_command(
+                    ["docker-compose", "--version"],
+                    capture_output=True,
+                    install_docker=True,
+                    skip_execution_logging=True,
+                    propagate_exception=True,
+                )
+                self.compose_cmd = ["docker-compose"]
+                logging.debug("检测到 Docker Compose V1 (docker-compose)，将使用此命令。")
+                return self.compose_cmd
+            except (subprocess.CalledProcessError, FileNotFoundError):
+                # 两个都找不到，这个异常将在 ensure_dependencies 中被捕获并处理
+                raise FileNotFoundError("未找到 'docker compose' 或 'docker-compose'。")
+
+    def _probe(self):
+        """探测 Docker 守护进程或 docker 与 docker compose 命令，失败时抛出异常"""
+        self._api_checked = False
+        with utils.timed("Docker API"):
+            if self.api():
+                return
+        with utils.timed("Docker"):
+            utils.run_command(
+                ["docker", "--version"],
+                capture_output=True,
+                install_docker=True,
+                skip_execution_logging=True,
+            )
+        with utils.timed("Docker Compose"):
+            self.get_compose_cmd()  # 检测并缓存 docker compose 命令
+
+    @tracing.traced("DockerRuntime.ensure_dependencies")
+    def ensure_dependencies(self, auto_install: bool = False) -> bool:
+        """
+        检查 Docker 和 Docker Compose 是否安装。
+        :param auto_install: 如果为 True，当 Docker 未安装时，会提示并尝试自动安装。
+        :return: 如果 Docker 之前未安装，并且本次成功安装了，则返回 True。否则返回 False。
+        """
+        logging.info("正在检查 Docker 和 Docker Compose 环境...")
+        try:
+            self._probe()
+            logging.info("Docker 和 Docker Compose 已安装。")
+            return False  # 已安装，未执行安装
+        except (FileNotFoundError, subprocess.CalledProcessError):
+            logging.warning("未检测到 Docker 或 Docker Compose。")
+            if not auto_install:
+                # 如果不是在主安装流程中，仅检查而不安装
+                logging.error("请先运行 'install' 命令来安装所有依赖。")
+                sys.exit(1)
+        except Exception as e:
+            logging.error(e)
+            # 在这种未知错误下，我们应该退出而不是继续
+            sys.exit(1)
+
+        logging.info("开始自动安装 Docker 和 Docker Compose...")
+        utils.run_command(["/bin/bash", "-c", utils.DOCKER_INSTALL_SCRIPT])
+
+        # 在当前进程中刷新环境并只重新探测 Docker，无需重启整个脚本
+        utils.refresh_environment()
+        self.compose_cmd = None
+        try:
+            self._probe()
+        except (FileNotFoundError, subprocess.CalledProcessError):
+            logging.error("Docker 安装完成，但仍无法找到 docker 或 docker compose 命令。")
+            logging.error("请检查安装日志，或重新登录后再次运行安装命令。")
+            sys.exit(1)
+        logging.info(
+            "安装完成。您可能需要重新登录或运行 `newgrp docker` "
+            "以便非 root 用户无需 sudo 即可运行 docker。"
+        )
+        return True  # 执行了安装
+
+    def prepare(self, image: str):
+        # heyhy prefetch 已提前拉取时直接使用本地镜像，不访问 registry
+        info = prefetch.take(image)
+        if info and self.has_image(image):
+            logging.info(f"使用预取的镜像 {image} ({info.get('digest') or info['source']})。")
+            return
+        logging.info(f"正在拉取镜像 {image}...")
+        self.pull_image(image)
+
+    def pull_image(self, image: str):
+        api = self.api()
+        if api:
+            try:
+                api.pull(image)
+                return
+            except (OSError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 拉取镜像失败，回退到 CLI: {e}")
+        utils.run_command(["docker", "pull", image])
+
+    def tag_image(self, source: str, target: str):
+        api = self.api()
+        if api:
+            try:
+                api.tag(source, target)
+                return
+            except (OSError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 标记镜像失败，回退到 CLI: {e}")
+        utils.run_command(["docker", "tag", source, target], skip_execution_logging=True)
+
+    def load_image(self, path: Path):
+        api = self.api()
+        if api:
+            try:
+                api.load(path)
+                return
+            except (OSError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 载入镜像失败，回退到 CLI: {e}")
+        utils.run_command(["docker", "load", "-i", str(path)])
+
+    def has_image(self, image: str) -> bool:
+        api = self.api()
+        if api:
+            try:
+                return api.has_image(image)
+            except (OSError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 查询镜像失败，回退到 CLI: {e}")
+        try:
+            result = utils.run_command(
+                ["docker", "image", "inspect", image],
+                capture_output=True,
+                check=False,
+                install_docker=True,
+                skip_execution_logging=True,
+            )
+        except FileNotFoundError:
+            return False
+        return result.returncode == 0
+
+    def status(self, domain: str) -> Optional[str]:
+        container_name = f"{COMPOSE_CONTAINER_PREFIX}{domain}"
+        api = self.api()
+        if api:
+            try:
+                return api.container_status(container_name)
+            except (OSError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 查询容器状态失败，回退到 CLI: {e}")
+        try:
+            result = utils.run_command(
+                ["docker", "ps", "--filter", f"name={container_name}", "--format", "{{.Status}}"],
+                capture_output=True,
+                check=True,
+                install_docker=True,
+                skip_execution_logging=True,
+                propagate_exception=True,
+            )
+            return result.stdout.strip()
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            return None
+
+    def start(self):
+        """启动已存在的服务容器；容器不存在时按 compose 文件创建"""
+        api = self.api()
+        if api:
+            try:
+                if api.inspect_container(self._container_name()) is not None:
+                    api.start(self._container_name())
+                    return
+            except (OSError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 启动失败，回退到 CLI: {e}")
+        self.recreate()
+
+    def stop(self, purge: bool = False):
+        """停止并删除服务容器（等价于 `compose down`）"""
+        api = self.api()
+        if api:
+            try:
+                api.remove(self._container_name(), force=True, volumes=purge)
+                return
+            except (OSError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 删除容器失败，回退到 CLI: {e}")
+        down = self.get_compose_cmd() + ["down"] + (["--volumes"] if purge else [])
+        utils.run_command(down, cwd=constants.BASE_DIR, check=False)
+
+    def restart(self):
+        """重启服务容器，不重建"""
+        api = self.api()
+        if api:
+            try:
+                api.restart(self._container_name())
+                return
+            except (OSError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 重启失败，回退到 CLI: {e}")
+        utils.run_command(self.get_compose_cmd() + ["restart"], cwd=constants.BASE_DIR)
+
+    def recreate(self):
+        """按当前 compose 文件启动服务容器，服务定义或镜像发生变化时重建"""
+        api = self.api()
+        if api:
+            try:
+                api.recreate_from_compose(_load_compose(), constants.BASE_DIR)
+                return
+            except dockerapi.UnsupportedComposeService as e:
+                logging.info(f"{e}，改用 docker compose 重建。")
+            except (OSError, KeyError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 重建失败，回退到 CLI: {e}")
+        utils.run_command(self.get_compose_cmd() + ["up", "-d"], cwd=constants.BASE_DIR)
+
+    def logs(self, follow: bool = True):
+        api = self.api()
+        if api:
+            try:
+                for _, line in api.logs(self._container_name(), follow=follow, tail="200"):
+                    print(line, flush=True)
+                return
+            except KeyboardInterrupt:
+                return
+            except (OSError, dockerapi.DockerAPIError) as e:
+                logging.debug(f"通过 Docker API 读取日志失败，回退到 CLI: {e}")
+        cmd = self.get_compose_cmd() + ["logs"] + (["-f"] if follow else [])
+        utils.run_command(cmd, cwd=constants.BASE_DIR, stream_output=True)
+
+    def dry_run(self, image: str, mihomo_text: str, report):
+        from hy2d.core import validate
+
+        validate.dry_run_image(image, mihomo_text, report)
+
+
+class SystemdRuntime(Runtime):
+    """以 systemd 服务原生运行 mihomo 二进制"""
+
+    name = "systemd"
+    status_label = "服务进程状态"
+
+    RELEASE_API = "https://api.github.com/repos/MetaCubeX/mihomo/releases"
+    ARCH_NAMES = {
+        "x86_64": "amd64",
+        "amd64": "amd64",
+        "aarch64": "arm64",
+        "arm64": "arm64",
+        "armv7l": "armv7",
+        "riscv64": "riscv64",
+    }
+
+    def __init__(self, resources: Optional[Resources] = None):
+        self.resources = resources or Resources()
+        self.unit = constants.SYSTEMD_UNIT_NAME
+        self.unit_path = constants.SYSTEMD_UNIT_DIR / f"{self.unit}.service"
+
+    @property
+    def binary(self) -> Path:
+        return constants.MIHOMO_BINARY_PATH
+
+    def _systemctl(self, *args: str, check: bool = True, capture_output: bool = False):
+        return utils.run_command(
+            ["systemctl", *args],
+            check=check,
+            capture_output=capture_output,
+            skip_execution_logging=capture_output,
+        )
+
+    def ensure_dependencies(self, auto_install: bool = False) -> bool:
+        logging.info("正在检查 systemd 环境...")
+        with utils.timed("systemd"):
+            try:
+                res = utils.run_command(
+                    ["systemctl", "--version"],
+                    capture_output=True,
+                    check=False,
+                    install_docker=True,
+                    skip_execution_logging=True,
+                )
+            except FileNotFoundError:
+                res = None
+        if res is None or res.returncode != 0:
+            logging.error("未检测到可用的 systemd，请改用 --runtime docker。")
+            sys.exit(1)
+        return False
+
+    # --- 二进制 ---
+
+    @staticmethod
+    def _version_of(image: str) -> str:
+        """从镜像标签推导 mihomo 版本，例如 metacubex/mihomo:v1.19.0 -> v1.19.0"""
+        ref = image.split("@", 1)[0]
+        tail = ref.rsplit("/", 1)[-1]
+        tag = tail.split(":", 1)[1] if ":" in tail else "latest"
+        return tag if tag.startswith("v") else "latest"
+
+    def _installed_version(self) -> Optional[str]:
+        marker = self.binary.with_suffix(".version")
+        try:
+            return marker.read_text(encoding="utf8").strip()
+        except FileNotFoundError:
+            return None
+
+    def _asset_url(self, version: str) -> tuple[str, str]:
+        arch = self.ARCH_NAMES.get(platform.machine().lower())
+        if not arch:
+            raise RuntimeError(f"不支持的 CPU 架构: {platform.machine()}")
+        url = (
+            f"{self.RELEASE_API}/latest"
+            if version == "latest"
+            else f"{self.RELEASE_API}/tags/{version}"
+        )
+        with tracing.span("GET mihomo release", "network"):
+            with urllib.request.urlopen(url, timeout=30) as resp:
+                release = json.load(resp)
+        tag = release["tag_name"]
+        candidates = [f"mihomo-linux-{arch}-{tag}.gz"]
+        if arch == "amd64" and prefetch.host_platform().variant in ("v3", "v4"):
+            # 支持 x86-64-v3 的 CPU 优先使用以 v3 指令集编译的版本
+            candidates.insert(0, f"mihomo-linux-amd64-v3-{tag}.gz")
+        assets = {asset.get("name"): asset for asset in release.get("assets", [])}
+        for wanted in candidates:
+            if wanted in assets:
+                return tag, assets[wanted]["browser_download_url"]
+        raise RuntimeError(f"发布 {tag} 中未找到 {candidates[-1]}")
+
+    @tracing.traced("SystemdRuntime.prepare")
+    def prepare(self, image: str):
+        version = self._version_of(image)
+        installed = self._installed_version()
+        if installed and version != "latest" and installed == version and self.binary.exists():
+            logging.info(f"mihomo {version} 已安装，跳过下载。")
+            return
+        try:
+            tag, url = self._asset_url(version)
+            if installed == tag and self.binary.exists():
+                logging.info(f"mihomo {tag} 已是最新版本。")
+                return
+            logging.info(f"正在下载 mihomo {tag}: {url}")
+            with tracing.span("download mihomo", "network"):
+                with urllib.request.urlopen(url, timeout=120) as resp:
+                    data = gzip.decompress(resp.read())
+        except (urllib.error.URLError, OSError, ValueError, RuntimeError) as e:
+            logging.error(f"下载 mihomo 失败: {e}")
+            sys.exit(1)
+        journal.atomic_write(self.binary, data, mode=0o755)
+        journal.atomic_write(self.binary.with_suffix(".version"), tag)
+        logging.info(f"mihomo {tag} 已安装到 {self.binary}")
+
+    # --- unit ---
+
+    def render_unit(self) -> str:
+        home = constants.BASE_DIR / "mihomo"
+        exec_start = " ".join(
+            shlex.quote(str(p)) for p in (self.binary, "-f", constants.CONFIG_PATH, "-d", home)
+        )
+        directives = "\n".join(self.resources.directives())
+        return (
+            "[Unit]\n"
+            f"Description={constants.TOOL_NAME} inbound (mihomo) managed by heyhy\n"
+            "After=network-online.target nss-lookup.target\n"
+            "Wants=network-online.target\n"
+            "\n"
+            "[Service]\n"
+            "Type=simple\n"
+            f"WorkingDirectory={constants.BASE_DIR}\n"
+            f"ExecStartPre=/bin/mkdir -p {shlex.quote(str(home))}\n"
+            f"ExecStart={exec_start}\n"
+            "Restart=always\n"
+            "RestartSec=3\n"
+            f"{directives}\n"
+            "\n"
+            "[Install]\n"
+            "WantedBy=multi-user.target\n"
+        )
+
+    def _write_unit(self) -> bool:
+        unit = self.render_unit()
+        if self.unit_path.is_file() and self.unit_path.read_text(encoding="utf8") == unit:
+            return False
+        journal.atomic_write(self.unit_path, unit)
+        self._systemctl("daemon-reload")
+        return True
+
+    # --- 生命周期 ---
+
+    def status(self, domain: str) -> Optional[str]:
+        properties = "LoadState,ActiveState,SubState,ActiveEnterTimestampMonotonic,ExecMainStatus"
+        try:
+            res = utils.run_command(
+                ["systemctl", "show", self.unit, f"--property={properties}"],
+                capture_output=True,
+                check=False,
+                install_docker=True,
+                skip_execution_logging=True,
+            )
+        except FileNotFoundError:
+            return None
+        if res.returncode != 0:
+            return None
+        props = dict(line.split("=", 1) for line in res.stdout.splitlines() if "=" in line)
+        if props.get("LoadState") == "not-found":
+            return ""
+        if props.get("ActiveState") == "active":
+            since = int(props.get("ActiveEnterTimestampMonotonic") or 0) / 1e6
+            uptime = time.monotonic() - since if since else 0
+            return f"Up {dockerapi.human_duration(uptime)} ({props.get('SubState', 'running')})"
+        return f"Exited ({props.get('ExecMainStatus', '0')}) [{props.get('ActiveState')}]"
+
+    def start(self):
+        self._write_unit()
+        self._systemctl("enable", "--now", self.unit)
+
+    def stop(self, purge: bool = False):
+        if purge:
+            self._systemctl("disable", "--now", self.unit, check=False)
+            if self.unit_path.exists():
+                self.unit_path.unlink()
+                self._systemctl("daemon-reload", check=False)
+        else:
+            self._systemctl("stop", self.unit, check=False)
+
+    def restart(self):
+        self._write_unit()
+        self._systemctl("restart", self.unit)
+
+    def recreate(self):
+        if not self.binary.exists():
+            self.prepare(_image_of(_load_compose()))
+        self._write_unit()
+        self._systemctl("enable", self.unit, check=False)
+        self._systemctl("restart", self.unit)
+
+    def logs(self, follow: bool = True):
+        cmd = ["journalctl", "-u", self.unit, "-n", "200", "--no-pager"]
+        utils.run_command(cmd + (["-f"] if follow else []), stream_output=True)
+
+    def dry_run(self, image: str, mihomo_text: str, report):
+        if not self.binary.exists():
+            report.warning("dry-run", f"mihomo 二进制尚未安装，跳过试运行: {self.binary}")
+            return
+        constants.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=constants.CACHE_DIR, prefix="preflight-", suffix=".yaml", encoding="utf8"
+        ) as f:
+            f.write(mihomo_text)
+            f.flush()
+            try:
+                proc = subprocess.run(
+                    [str(self.binary), "-t", "-f", f.name, "-d", str(constants.CACHE_DIR)],
+                    capture_output=True,
+                    text=True,
+                    timeout=constants.PREFLIGHT_DRY_RUN_TIMEOUT,
+                )
+            except subprocess.TimeoutExpired:
+                report.error("dry-run", f"试运行超时 ({constants.PREFLIGHT_DRY_RUN_TIMEOUT}s)。")
+                return
+        if proc.returncode != 0:
+            output = (proc.stderr or proc.stdout).strip().splitlines()
+            report.error(
+                "dry-run", f"mihomo 试运行失败: {output[-1] if output else proc.returncode}"
+            )
+
+
+def create_runtime(config: Optional[RuntimeConfig] = None) -> Runtime:
+    config = config or RuntimeConfig.load()
+    if config.backend == "systemd":
+        return SystemdRuntime(config.resources)
+    if config.backend != "docker":
+        raise ValueError(f"不支持的运行时: {config.backend}，可选 {', '.join(RUNTIME_BACKENDS)}")
+    return DockerRuntime()
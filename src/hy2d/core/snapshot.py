@@ -0,0 +1,54 @@
+"""check 的状态快照
+
+`check` 需要的实时数据（公网 IP、服务运行状态）分别要访问外部 IP 服务与调用 docker/systemctl。
+install、update 与每次实时 check 都会把这些数据连同采集时间写入快照文件，
+`check --snapshot` 在条目未超过各自的 TTL 时直接使用快照，不发起任何网络请求或子进程。
+客户端配置始终由本地配置文件渲染，与服务端配置保持一致。
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from hy2d.core import constants, journal
+
+# 各条目的有效期 (秒)
+TTL = {
+    "public_ip": constants.SNAPSHOT_PUBLIC_IP_TTL,
+    "status": constants.SNAPSHOT_STATUS_TTL,
+}
+
+
+def _path() -> Path:
+    return constants.CACHE_DIR / "check-snapshot.json"
+
+
+def load() -> dict:
+    try:
+        return json.loads(_path().read_text(encoding="utf8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def get(key: str, domain: str) -> Optional[tuple[Any, float]]:
+    """返回 (值, 已缓存秒数)；条目不存在、属于其他域名或已过期时返回 None"""
+    entry = load().get(key)
+    if not entry or entry.get("domain") != domain:
+        return None
+    age = time.time() - entry["time"]
+    if age > TTL.get(key, 0):
+        return None
+    return entry["value"], age
+
+
+def put(domain: str, **values):
+    """写入（覆盖）若干条目；值为 None 的条目不写入"""
+    values = {k: v for k, v in values.items() if v is not None}
+    if not values:
+        return
+    data = load()
+    now = time.time()
+    for key, value in values.items():
+        data[key] = {"value": value, "time": now, "domain": domain}
+    journal.atomic_write(_path(), json.dumps(data, indent=2, ensure_ascii=False), mode=0o600)
@@ -0,0 +1,160 @@
+"""客户端订阅端点
+
+一个轻量的 HTTP(S) 服务：
+- /rulesets/<name>.yaml: 所有用户共享的 classical 规则集，带 ETag 与长缓存，客户端只需下载一次；
+- /sub/<token>: 某个用户的 Clash.Meta 配置，规则以 rule-providers 引用上面的规则集，不再内联。
+
+token 由控制器 secret 与用户名经 HMAC 派生，不在 URL 中暴露密码；
+配置通过 models.load_deployment() 读取（按文件状态缓存），修改密码或端口后无需重启服务。
+
+双栈部署中，客户端经由哪个地址族访问订阅端点，下发的配置就优先使用该地址族连接节点：
+能通过 IPv6 拉取订阅的客户端通常也能以更短的路径（无 NAT64/CGNAT）经 IPv6 连接节点。
+"""
+
+import hashlib
+import hmac
+import ipaddress
+import logging
+import socket
+import ssl
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from hy2d.core import models, renderers
+
+
+def subscription_token(secret: str, username: str) -> str:
+    return hmac.new(secret.encode(), username.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+
+
+def client_ip_version(address: str) -> str:
+    """按订阅请求的来源地址选择地址族偏好，IPv4 映射地址 (::ffff:a.b.c.d) 视为 IPv4"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return "dual"
+    if ip.version == 6 and ip.ipv4_mapped is None:
+        return "ipv6-prefer"
+    return "ipv4-prefer"
+
+
+def user_profiles(
+    public_ip: str, base_url: str, ip_version: Optional[str] = None
+) -> dict[str, models.ClientProfile]:
+    """token -> 用户的客户端配置信息"""
+    deployment = models.load_deployment()
+    if not deployment.secret:
+        # 没有密钥时 token 只是用户名的公开哈希，任何人都能算出
+        raise ValueError("服务配置中没有控制器 secret，无法派生订阅 token")
+    secret = deployment.secret
+    profiles = {}
+    for listener in deployment.listeners:
+        # 每个 listener 的 obfs、alpn 等参数各不相同
+        profile = deployment.client_profile(public_ip, listener=listener, ip_version=ip_version)
+        for username, password in listener.users.items():
+            token = subscription_token(secret, username)
+            profiles[token] = replace(profile, password=password, ruleset_url=base_url)
+    return profiles
+
+
+class SubscriptionHandler(BaseHTTPRequestHandler):
+    server: "SubscriptionServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        logging.debug(f"{self.address_string()} - {fmt % args}")
+
+    def _reply(self, status: int, body: bytes = b"", headers: Optional[dict] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _reply_cached(self, body: bytes, cache_control: str, **headers):
+        etag = _etag(body)
+        headers = {
+            "Content-Type": "text/yaml; charset=utf-8",
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            **headers,
+        }
+        if self.headers.get("If-None-Match") == etag:
+            return self._reply(304, headers=headers)
+        self._reply(200, body, headers)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/rulesets/") and path.endswith(".yaml"):
+            name = path[len("/rulesets/") : -len(".yaml")]
+            payload = renderers.compiled_rulesets(renderers.client_rules()).get(name)
+            if payload is None:
+                return self._reply(404)
+            return self._reply_cached(
+                payload.encode("utf8"), f"public, max-age={renderers.RULESET_INTERVAL}"
+            )
+
+        if path.startswith("/sub/"):
+            try:
+                profiles = user_profiles(
+                    self.server.public_ip,
+                    self.server.base_url,
+                    client_ip_version(self.client_address[0]),
+                )
+            except (FileNotFoundError, ValueError, KeyError) as e:
+                logging.error(f"读取服务配置失败: {e}")
+                return self._reply(503)
+            profile = profiles.get(path[len("/sub/") :])
+            if profile is None:
+                return self._reply(404)
+            body = renderers.render("clash-meta", profile).encode("utf8")
+            return self._reply_cached(
+                body,
+                "private, no-cache",
+                **{
+                    "Content-Disposition": f'attachment; filename="{profile.name}.yaml"',
+                    # Clash 系客户端据此决定订阅的自动更新间隔 (小时)
+                    "profile-update-interval": "24",
+                },
+            )
+        self._reply(404)
+
+    do_HEAD = do_GET
+
+
+class SubscriptionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        public_ip: str,
+        base_url: str,
+        certfile: Optional[str] = None,
+        keyfile: Optional[str] = None,
+    ):
+        if ":" in address[0]:
+            self.address_family = socket.AF_INET6
+        super().__init__(address, SubscriptionHandler)
+        self.public_ip = public_ip
+        self.base_url = base_url.rstrip("/")
+        if certfile:
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(certfile, keyfile)
+            # 握手推迟到处理线程中的首次读取，慢速客户端不会阻塞 accept
+            self.socket = context.wrap_socket(
+                self.socket, server_side=True, do_handshake_on_connect=False
+            )
+
+    def server_bind(self):
+        # 监听 :: 时同时接受 IPv4 连接（以 IPv4 映射地址出现）
+        if self.address_family == socket.AF_INET6:
+            self.socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+        super().server_bind()
@@ -0,0 +1,171 @@
+"""轻量级调用追踪
+
+在命令执行、网络请求、YAML 读写与管理器各步骤外层记录 span（名称、分类、起止时间、父子关系）。
+默认关闭，关闭时 span() 只有一次布尔判断的开销。通过全局选项 `--profile` 开启，结束时输出
+火焰图风格的耗时分解，并可写出 Chrome trace-event JSON（在 chrome://tracing 或 Perfetto 中打开）。
+"""
+
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+_enabled = False
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_spans: list["Span"] = []
+_current: ContextVar[Optional[int]] = ContextVar("heyhy_span", default=None)
+_origin = time.perf_counter()
+
+
+@dataclass
+class Span:
+    id: int
+    name: str
+    category: str
+    parent: Optional[int]
+    start: float
+    end: float = 0.0
+    thread: int = 0
+    args: dict = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def enable():
+    global _enabled, _origin
+    _enabled = True
+    _origin = time.perf_counter()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def spans() -> list[Span]:
+    with _lock:
+        return list(_spans)
+
+
+@contextmanager
+def span(name: str, category: str = "step", **args):
+    """记录一个 span；嵌套调用（包括 asyncio 任务）自动形成父子关系"""
+    if not _enabled:
+        yield None
+        return
+    s = Span(
+        id=next(_ids),
+        name=name,
+        category=category,
+        parent=_current.get(),
+        start=time.perf_counter(),
+        thread=threading.get_ident(),
+        args=args,
+    )
+    token = _current.set(s.id)
+    try:
+        yield s
+    finally:
+        s.end = time.perf_counter()
+        _current.reset(token)
+        with _lock:
+            _spans.append(s)
+
+
+def traced(name: Optional[str] = None, category: str = "step"):
+    """以 span 包裹函数调用的装饰器"""
+
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with span(label, category):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _children(all_spans: list[Span]) -> dict[Optional[int], list[Span]]:
+    children: dict[Optional[int], list[Span]] = {}
+    for s in sorted(all_spans, key=lambda s: s.start):
+        children.setdefault(s.parent, []).append(s)
+    return children
+
+
+def render_flame(width: int = 40) -> list[str]:
+    """
+    生成火焰图风格的文本：每行一个 span，按调用层级缩进，
+    条形长度与占总耗时的比例成正比，并给出自身耗时 (self)。
+    """
+    all_spans = spans()
+    if not all_spans:
+        return []
+    children = _children(all_spans)
+    roots = children.get(None, [])
+    total = max(s.end for s in all_spans) - min(s.start for s in roots or all_spans)
+    total = total or 1e-9
+
+    lines = []
+
+    def walk(s: Span, depth: int):
+        kids = children.get(s.id, [])
+        self_time = s.duration - sum(k.duration for k in kids)
+        bar = "█" * max(1, round(s.duration / total * width))
+        label = f"{'  ' * depth}{s.name}"
+        detail = f" [{s.category}]" if s.category != "step" else ""
+        lines.append(
+            f"{label:<48.48} {bar:<{width}} {s.duration * 1000:9.1f}ms "
+            f"(self {max(self_time, 0) * 1000:.1f}ms){detail}"
+        )
+        for kid in kids:
+            walk(kid, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+    return lines
+
+
+def summarize_by_category() -> dict[str, float]:
+    """按分类统计叶子 span 的耗时，用于判断时间主要花在命令、网络还是 YAML 上"""
+    all_spans = spans()
+    parents = {s.parent for s in all_spans}
+    totals: dict[str, float] = {}
+    for s in all_spans:
+        if s.id not in parents:
+            totals[s.category] = totals.get(s.category, 0.0) + s.duration
+    return dict(sorted(totals.items(), key=lambda kv: -kv[1]))
+
+
+def write_chrome_trace(path: Path):
+    """写出 Chrome trace-event 格式 (ph=X 完整事件)"""
+    pid = os.getpid()
+    events = [
+        {
+            "name": s.name,
+            "cat": s.category,
+            "ph": "X",
+            "ts": round((s.start - _origin) * 1e6, 3),
+            "dur": round(s.duration * 1e6, 3),
+            "pid": pid,
+            "tid": s.thread,
+            "args": {k: str(v) for k, v in s.args.items()},
+        }
+        for s in spans()
+    ]
+    Path(path).write_text(
+        json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf8"
+    )
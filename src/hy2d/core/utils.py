@@ -1,12 +1,21 @@
 """核心工具函数"""
 
+import asyncio
+import ipaddress
 import logging
+import os
 import secrets
+import socket
 import string
 import subprocess
 import sys
+import time
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Awaitable, Callable, Optional, Sequence, Union
+
+from hy2d.core import output, tracing
 
 DOCKER_INSTALL_SCRIPT = """
 echo ">>> 正在使用官方脚本 (get.docker.com) 安装 Docker..."
@@ -15,6 +24,71 @@ curl -fsSL https://get.docker.com | sh
 echo ">>> Docker 安装脚本执行完毕。"
 """
 
+# 新安装的依赖可能位于这些目录中（如 snap 安装的 certbot、get.docker.com 安装的插件）
+SYSTEM_BIN_DIRS = (
+    "/usr/local/sbin",
+    "/usr/local/bin",
+    "/usr/sbin",
+    "/usr/bin",
+    "/sbin",
+    "/bin",
+    "/snap/bin",
+)
+
+# 各项环境检查的耗时记录 (标签 -> 秒)
+check_timings: dict[str, float] = {}
+
+
+@contextmanager
+def timed(label: str):
+    """记录一段检查的耗时到 check_timings"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        check_timings[label] = check_timings.get(label, 0.0) + duration
+        logging.debug(f"{label} 耗时 {duration:.2f}s")
+
+
+def _read_environment_path() -> list[str]:
+    """读取 /etc/environment 中的 PATH（包管理器安装后可能更新该文件）"""
+    try:
+        with open("/etc/environment", encoding="utf8") as f:
+            for line in f:
+                key, _, value = line.strip().partition("=")
+                if key == "PATH":
+                    return [d for d in value.strip("'\"").split(os.pathsep) if d]
+    except OSError:
+        pass
+    return []
+
+
+def refresh_environment() -> list[str]:
+    """
+    在当前进程中刷新 PATH，使刚安装的命令无需重启进程即可被找到。
+    :return: 新加入 PATH 的目录
+    """
+    current = [d for d in os.environ.get("PATH", "").split(os.pathsep) if d]
+    added = []
+    for directory in [*_read_environment_path(), *SYSTEM_BIN_DIRS]:
+        if directory not in current and directory not in added and os.path.isdir(directory):
+            added.append(directory)
+    if added:
+        os.environ["PATH"] = os.pathsep.join(current + added)
+        logging.debug(f"已将 {', '.join(added)} 加入 PATH。")
+    return added
+
+
+def _span_name(command: Sequence[str]) -> str:
+    """以命令名及其子命令作为 span 名称，例如 `docker pull`、`certbot certonly`"""
+    words = [os.path.basename(command[0])] if command else []
+    for word in command[1:3]:
+        if word.startswith("-"):
+            break
+        words.append(word)
+    return " ".join(words)
+
 
 def run_command(
     command: list[str],
@@ -44,52 +118,315 @@ def run_command(
     """
     if not skip_execution_logging:
         logging.info(f"执行命令: {' '.join(command)}")
+    # --output json|yaml 时标准输出只属于最终的结构化文档：子进程输出被捕获，
+    # 失败时经由下方的错误日志写入文档的 messages；实时输出改写到标准错误
+    structured = output.structured()
+    if structured and not stream_output:
+        capture_output = True
+
+    with tracing.span(_span_name(command), "command", command=" ".join(command)):
+        try:
+            if stream_output:
+                stdout = sys.stderr if structured else None
+                with subprocess.Popen(command, cwd=cwd, text=True, stdout=stdout) as process:
+                    process.wait()
+                    return subprocess.CompletedProcess(command, process.returncode)
+            else:
+                return subprocess.run(
+                    command, cwd=cwd, capture_output=capture_output, text=True, check=check
+                )
+        except FileNotFoundError:
+            logging.error(f"命令未找到: {command[0]}。请确保它已安装并在您的 PATH 中。")
+            if install_docker:
+                raise FileNotFoundError
+            sys.exit(1)
+        except subprocess.CalledProcessError as e:
+            logging.error(f"命令执行失败，返回码: {e.returncode}")
+            if e.stdout:
+                logging.error(f"STDOUT:\n{e.stdout}")
+            if e.stderr:
+                logging.error(f"STDERR:\n{e.stderr}")
+            if propagate_exception:
+                raise e
+            sys.exit(1)
+
+
+@dataclass
+class CommandResult:
+    """异步命令的执行结果与耗时"""
+
+    command: list[str]
+    returncode: Optional[int]
+    stdout: str = ""
+    stderr: str = ""
+    started: float = 0.0
+    duration: float = 0.0
+    timed_out: bool = False
+    cancelled: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+# 异步命令的执行记录（按完成顺序），用于耗时分析
+command_log: list[CommandResult] = []
+
+LineCallback = Callable[[str, str], Union[None, Awaitable[None]]]
+
+
+async def _pump(stream: asyncio.StreamReader, name: str, sink: Optional[list], on_line):
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        text = line.decode("utf8", errors="replace")
+        if sink is not None:
+            sink.append(text)
+        if on_line is not None:
+            ret = on_line(name, text.rstrip("\n"))
+            if asyncio.iscoroutine(ret):
+                await ret
+
+
+async def _terminate(proc: asyncio.subprocess.Process):
+    if proc.returncode is not None:
+        return
+    proc.kill()
+    await proc.wait()
+
+
+async def arun_command(
+    command: Sequence[str],
+    cwd: Optional[Path] = None,
+    timeout: Optional[float] = None,
+    capture_output: bool = True,
+    on_line: Optional[LineCallback] = None,
+    check: bool = False,
+    env: Optional[dict] = None,
+) -> CommandResult:
+    """
+    异步执行命令。与 run_command 不同，该函数从不调用 sys.exit，便于组合与并发。
+
+    Args:
+        command: 命令列表.
+        cwd: 执行命令的工作目录.
+        timeout: 超时秒数，超时后终止子进程.
+        capture_output: 是否在结果中保留完整输出；为 False 时输出只交给 on_line 逐行处理.
+        on_line: 逐行回调 (stream, line)，stream 为 "stdout" 或 "stderr"，可以是协程函数.
+        check: 非零退出码时抛出 CalledProcessError，超时抛出 TimeoutExpired.
+        env: 子进程环境变量.
+
+    Returns:
+        CommandResult 对象，包含返回码、输出与耗时.
+    """
+    command = list(command)
+    with tracing.span(_span_name(command), "command", command=" ".join(command)):
+        return await _arun_command(command, cwd, timeout, capture_output, on_line, check, env)
+
+
+async def _arun_command(command, cwd, timeout, capture_output, on_line, check, env):
+    started = time.perf_counter()
+    stdout: Optional[list[str]] = [] if capture_output else None
+    stderr: Optional[list[str]] = [] if capture_output else None
+    result = CommandResult(command, None, started=started)
 
     try:
-        if stream_output:
-            with subprocess.Popen(command, cwd=cwd, text=True) as process:
-                process.wait()
-                return subprocess.CompletedProcess(command, process.returncode)
-        else:
-            return subprocess.run(
-                command, cwd=cwd, capture_output=capture_output, text=True, check=check
-            )
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=cwd,
+            env=env,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
     except FileNotFoundError:
-        logging.error(f"命令未找到: {command[0]}。请确保它已安装并在您的 PATH 中。")
-        if install_docker:
-            raise FileNotFoundError
-        sys.exit(1)
-    except subprocess.CalledProcessError as e:
-        logging.error(f"命令执行失败，返回码: {e.returncode}")
-        if e.stdout:
-            logging.error(f"STDOUT:\n{e.stdout}")
-        if e.stderr:
-            logging.error(f"STDERR:\n{e.stderr}")
-        if propagate_exception:
-            raise e
-        sys.exit(1)
+        result.returncode = 127
+        result.stderr = f"命令未找到: {command[0]}"
+        result.duration = time.perf_counter() - started
+        command_log.append(result)
+        if check:
+            raise
+        return result
 
+    async def communicate():
+        await asyncio.gather(
+            _pump(proc.stdout, "stdout", stdout, on_line),
+            _pump(proc.stderr, "stderr", stderr, on_line),
+        )
+        return await proc.wait()
 
-def get_public_ip() -> str:
-    """获取本机的公网出口 IP"""
-    logging.info("正在检测本机公网 IP...")
-    ip_services = ["ip.sb", "ifconfig.me", "api.ipify.org", "icanhazip.com"]
-    for service in ip_services:
+    try:
+        result.returncode = await asyncio.wait_for(communicate(), timeout)
+    except asyncio.TimeoutError:
+        result.timed_out = True
+        await _terminate(proc)
+        result.returncode = proc.returncode
+    except asyncio.CancelledError:
+        result.cancelled = True
+        await asyncio.shield(_terminate(proc))
+        result.returncode = proc.returncode
+        raise
+    finally:
+        result.stdout = "".join(stdout or [])
+        result.stderr = "".join(stderr or [])
+        result.duration = time.perf_counter() - started
+        command_log.append(result)
+        logging.debug(
+            f"命令 {' '.join(command)} 结束 (返回码 {result.returncode}, {result.duration:.2f}s)"
+        )
+
+    if check and result.timed_out:
+        raise subprocess.TimeoutExpired(command, timeout, result.stdout, result.stderr)
+    if check and result.returncode != 0:
+        raise subprocess.CalledProcessError(
+            result.returncode, command, result.stdout, result.stderr
+        )
+    return result
+
+
+async def agather_commands(
+    commands: Sequence[Sequence[str]], limit: int = 8, **kwargs
+) -> list[CommandResult]:
+    """并发执行多条命令（最多 limit 条同时运行），按输入顺序返回结果"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run_one(command):
+        async with semaphore:
+            return await arun_command(command, **kwargs)
+
+    return list(await asyncio.gather(*(run_one(c) for c in commands)))
+
+
+def run_commands(
+    commands: Sequence[Sequence[str]], limit: int = 8, **kwargs
+) -> list[CommandResult]:
+    """在同步代码中并发执行多条相互独立的命令"""
+    return asyncio.run(agather_commands(commands, limit=limit, **kwargs))
+
+
+def read_sysctl(keys: Sequence[str], timeout: float = 5) -> dict[str, Optional[str]]:
+    """并发读取多个内核参数，读取失败的参数值为 None"""
+    results = run_commands([["sysctl", "-n", key] for key in keys], timeout=timeout)
+    return {key: (r.stdout.strip() if r.ok else None) for key, r in zip(keys, results)}
+
+
+# 同时支持 IPv4 与 IPv6 的出口 IP 查询服务 (api.ipify.org 仅支持 IPv4)
+IP_SERVICES = ("ip.sb", "ifconfig.me", "api64.ipify.org", "icanhazip.com")
+
+
+@dataclass
+class PublicAddresses:
+    """本机的公网出口地址，某个协议族不可用时为 None"""
+
+    ipv4: Optional[str] = None
+    ipv6: Optional[str] = None
+
+    @property
+    def primary(self) -> Optional[str]:
+        return self.ipv4 or self.ipv6
+
+    @property
+    def dual_stack(self) -> bool:
+        return bool(self.ipv4 and self.ipv6)
+
+
+async def _adetect_family(
+    flag: str, timeout: float, deadline: Optional[float] = None
+) -> Optional[str]:
+    """同一协议族内按顺序尝试，成功即止；deadline 为该协议族的总耗时上限"""
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline if deadline is not None else None
+    for service in IP_SERVICES:
+        limit = timeout if end is None else min(timeout, end - loop.time())
+        if limit <= 0:
+            break
+        result = await arun_command(
+            ["curl", "-s", flag, "-m", f"{limit:.1f}", service], timeout=limit + 1
+        )
+        if not result.ok:
+            continue
         try:
-            result = run_command(
-                ["curl", "-s", "--ipv4", service],
-                capture_output=True,
-                check=True,
-                propagate_exception=True,
-            )
-            ip = result.stdout.strip()
-            if ip:
-                logging.info(f"成功获取公网 IP: {ip}")
-                return ip
-        except (subprocess.CalledProcessError, FileNotFoundError):
+            # 统一为压缩形式，便于与 DNS 解析结果比较；同时过滤掉异常的响应内容
+            return ipaddress.ip_address(result.stdout.strip()).compressed
+        except ValueError:
             continue
-    logging.error("无法自动获取公网 IP，请使用 --ip 参数手动指定。")
-    raise RuntimeError("所有 IP 服务都无法访问。")
+    return None
+
+
+async def adetect_public_addresses(timeout: float = 5) -> PublicAddresses:
+    """
+    并发检测 IPv4 与 IPv6 出口地址。
+    IPv6 路由不通时每个服务都要等到超时，因此 IPv6 整体只等待一个 timeout。
+    """
+    ipv4, ipv6 = await asyncio.gather(
+        _adetect_family("--ipv4", timeout),
+        _adetect_family("--ipv6", timeout, deadline=timeout),
+    )
+    return PublicAddresses(ipv4=ipv4, ipv6=ipv6)
+
+
+async def adetect_primary_address(timeout: float = 5) -> Optional[str]:
+    """优先 IPv4：IPv4 检测成功即返回，不等待 IPv6；IPv4 不可用时使用 IPv6 的结果"""
+    ipv6 = asyncio.ensure_future(_adetect_family("--ipv6", timeout, deadline=timeout))
+    try:
+        return await _adetect_family("--ipv4", timeout) or await ipv6
+    finally:
+        if not ipv6.done():
+            ipv6.cancel()
+            with suppress(asyncio.CancelledError):
+                await ipv6
+
+
+@tracing.traced("get_public_addresses", "network")
+def get_public_addresses(timeout: float = 5) -> PublicAddresses:
+    """检测本机的 IPv4 与 IPv6 公网出口地址"""
+    logging.info("正在检测本机公网 IP (IPv4 / IPv6)...")
+    addresses = asyncio.run(adetect_public_addresses(timeout))
+    for family, ip in (("IPv4", addresses.ipv4), ("IPv6", addresses.ipv6)):
+        if ip:
+            logging.info(f"成功获取公网 {family}: {ip}")
+    return addresses
+
+
+@tracing.traced("get_public_ip", "network")
+def get_public_ip() -> str:
+    """获取本机的公网出口 IP，优先 IPv4，仅有 IPv6 的主机返回 IPv6"""
+    logging.info("正在检测本机公网 IP...")
+    ip = asyncio.run(adetect_primary_address())
+    if not ip:
+        logging.error("无法自动获取公网 IP，请使用 --ip 参数手动指定。")
+        raise RuntimeError("所有 IP 服务都无法访问。")
+    logging.info(f"成功获取公网 IP: {ip}")
+    return ip
+
+
+@tracing.traced("resolve_domain", "network")
+def resolve_domain(domain: str) -> dict[str, set[str]]:
+    """通过 getaddrinfo 解析域名的 A 与 AAAA 记录"""
+    records: dict[str, set[str]] = {"ipv4": set(), "ipv6": set()}
+    try:
+        infos = socket.getaddrinfo(domain, None, proto=socket.IPPROTO_UDP)
+    except socket.gaierror:
+        return records
+    for family, _, _, _, sockaddr in infos:
+        if family == socket.AF_INET:
+            records["ipv4"].add(sockaddr[0])
+        elif family == socket.AF_INET6:
+            records["ipv6"].add(ipaddress.ip_address(sockaddr[0]).compressed)
+    return records
+
+
+def ipv6_available() -> bool:
+    """本机内核是否启用了 IPv6 (能否绑定 ::)"""
+    if not socket.has_ipv6:
+        return False
+    try:
+        with socket.socket(socket.AF_INET6, socket.SOCK_DGRAM) as s:
+            s.bind(("::", 0))
+        return True
+    except OSError:
+        return False
 
 
 def generate_password(length: int = 16) -> str:
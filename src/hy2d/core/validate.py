@@ -0,0 +1,293 @@
+"""重启前的配置预检
+
+在 `compose down` 停掉正在运行的实例之前，检查候选配置是否能正常启动：
+- Mihomo listener 与 docker-compose 的结构校验；
+- listener UDP 端口是否可绑定；
+- 证书与私钥是否可读、是否过期；
+- （可选）在一次性容器中用新镜像试运行新配置 (`mihomo -t`)。
+
+结构与证书这类确定性检查的结果按配置内容哈希缓存，重复预检不会重复执行；
+端口绑定与试运行取决于主机与镜像的当前状态（如 :latest 标签可能已指向新镜像），始终实时检查。
+"""
+
+import json
+import os
+import re
+import socket
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from hy2d.core import certs, configs, constants, journal, utils
+from hy2d.core.constants import COMPOSE_SERVICE_NAME, MIHOMO_LISTEN_TYPE
+
+IMAGE_REF_RE = re.compile(
+    r"^(?:[a-z0-9.-]+(?::[0-9]+)?/)?[a-z0-9]+(?:[._-][a-z0-9]+)*"
+    r"(?:/[a-z0-9]+(?:[._-][a-z0-9]+)*)*(?::[\w][\w.-]{0,127})?(?:@sha256:[a-f0-9]{64})?$"
+)
+
+
+@dataclass
+class Issue:
+    level: str  # "error" | "warning"
+    check: str
+    message: str
+
+
+@dataclass
+class Report:
+    issues: list[Issue] = field(default_factory=list)
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not any(i.level == "error" for i in self.issues)
+
+    def error(self, check: str, message: str):
+        self.issues.append(Issue("error", check, message))
+
+    def warning(self, check: str, message: str):
+        self.issues.append(Issue("warning", check, message))
+
+
+def check_mihomo_schema(cfg, report: Report):
+    if not isinstance(cfg, dict):
+        report.error("schema", "Mihomo 配置必须是一个映射。")
+        return
+    listeners = cfg.get("listeners")
+    if not isinstance(listeners, list) or not listeners:
+        report.error("schema", "Mihomo 配置缺少 listeners。")
+        return
+
+    names, ports = set(), set()
+    for i, listener in enumerate(listeners):
+        where = f"listeners[{i}]"
+        if not isinstance(listener, dict):
+            report.error("schema", f"{where} 必须是一个映射。")
+            continue
+        for key in ("name", "type", "listen", "masquerade", "certificate", "private-key"):
+            if not isinstance(listener.get(key), str) or not listener.get(key):
+                report.error("schema", f"{where}.{key} 缺失或不是字符串。")
+        if listener.get("type") != MIHOMO_LISTEN_TYPE:
+            report.error("schema", f"{where}.type 必须为 {MIHOMO_LISTEN_TYPE}。")
+        port = listener.get("port")
+        if not isinstance(port, int) or not 0 < port < 65536:
+            report.error("schema", f"{where}.port 必须是 1-65535 之间的整数。")
+        elif port in ports:
+            report.error("schema", f"{where}.port {port} 与其他 listener 重复。")
+        else:
+            ports.add(port)
+        users = listener.get("users")
+        if not isinstance(users, dict) or not users:
+            report.error("schema", f"{where}.users 必须是非空映射。")
+        elif not all(isinstance(k, str) and isinstance(v, str) and v for k, v in users.items()):
+            report.error("schema", f"{where}.users 的用户名与密码必须是非空字符串。")
+        if listener.get("name") in names:
+            report.error("schema", f"{where}.name 重复。")
+        names.add(listener.get("name"))
+
+
+def check_compose_schema(cfg, report: Report):
+    service = (
+        (cfg or {}).get("services", {}).get(COMPOSE_SERVICE_NAME) if isinstance(cfg, dict) else None
+    )
+    if not isinstance(service, dict):
+        report.error("schema", f"docker-compose 缺少服务 {COMPOSE_SERVICE_NAME}。")
+        return
+    image = service.get("image")
+    if not isinstance(image, str) or not IMAGE_REF_RE.match(image):
+        report.error("schema", f"镜像名称无效: {image!r}")
+    if not service.get("container_name"):
+        report.error("schema", "docker-compose 缺少 container_name。")
+    if not isinstance(service.get("command"), list):
+        report.error("schema", "docker-compose 的 command 必须是列表。")
+    if not isinstance(service.get("volumes"), list):
+        report.error("schema", "docker-compose 的 volumes 必须是列表。")
+
+
+def check_certificates(cfg, report: Report):
+    seen = set()
+    for listener in (cfg or {}).get("listeners") or []:
+        if not isinstance(listener, dict):
+            continue
+        cert_path, key_path = listener.get("certificate"), listener.get("private-key")
+        if not cert_path or not key_path or (cert_path, key_path) in seen:
+            continue
+        seen.add((cert_path, key_path))
+
+        for label, path in (("证书", cert_path), ("私钥", key_path)):
+            if not os.path.isfile(path):
+                report.error("cert", f"{label}文件不存在: {path}")
+            elif not os.access(path, os.R_OK):
+                report.error("cert", f"{label}文件不可读: {path}")
+
+        if os.access(key_path, os.R_OK):
+            with open(key_path, "r", encoding="utf8", errors="ignore") as f:
+                if "PRIVATE KEY-----" not in f.read(4096):
+                    report.error("cert", f"私钥文件不是 PEM 格式: {key_path}")
+
+        if not os.access(cert_path, os.R_OK):
+            continue
+        try:
+            info = certs.load_cert_info(Path(cert_path))
+        except (ValueError, FileNotFoundError) as e:
+            report.error("cert", str(e))
+            continue
+        if info.expired:
+            report.error("cert", f"证书已过期: {cert_path}")
+        elif info.days_left < constants.CERT_EXPIRY_WARNING_DAYS:
+            report.warning("cert", f"证书将在 {info.days_left:.0f} 天后过期: {cert_path}")
+
+
+def check_udp_ports(cfg, report: Report, allow_ports: frozenset = frozenset()):
+    """
+    检查 listener 的 UDP 端口能否绑定。
+    allow_ports 为当前正在运行的实例所占用的端口，这些端口被占用是预期之内的。
+    """
+    for listener in (cfg or {}).get("listeners") or []:
+        if not isinstance(listener, dict) or not isinstance(listener.get("port"), int):
+            continue
+        port = listener["port"]
+        if port in allow_ports:
+            continue
+        listen = listener.get("listen") or "0.0.0.0"
+        family = socket.AF_INET6 if ":" in listen else socket.AF_INET
+        if listen == "::" and not utils.ipv6_available():
+            # 内核未启用 IPv6 时 Mihomo 会将 :: 回退为 IPv4 通配地址
+            listen, family = "0.0.0.0", socket.AF_INET
+        try:
+            with socket.socket(family, socket.SOCK_DGRAM) as s:
+                s.bind((listen, port))
+        except PermissionError:
+            report.error("port", f"无权限绑定 UDP {listen}:{port}。")
+        except OSError as e:
+            report.error("port", f"UDP 端口 {listen}:{port} 不可用: {e.strerror or e}")
+
+
+def dry_run_image(image: str, mihomo_text: str, report: Report):
+    """在一次性容器中用新镜像测试新配置"""
+    constants.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=constants.CACHE_DIR, prefix="preflight-", suffix=".yaml", encoding="utf8"
+    ) as f:
+        f.write(mihomo_text)
+        f.flush()
+        cmd = [
+            "docker",
+            "run",
+            "--rm",
+            "--network",
+            "none",
+            "-v",
+            "/etc/letsencrypt/:/etc/letsencrypt/:ro",
+            "-v",
+            f"{f.name}:/app/config.yaml:ro",
+            image,
+            "-t",
+            "-f",
+            "/app/config.yaml",
+            "-d",
+            "/",
+        ]
+        try:
+            proc = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=constants.PREFLIGHT_DRY_RUN_TIMEOUT,
+            )
+        except FileNotFoundError:
+            report.error("dry-run", "未找到 docker 命令，无法试运行镜像。")
+            return
+        except subprocess.TimeoutExpired:
+            report.error("dry-run", f"试运行超时 ({constants.PREFLIGHT_DRY_RUN_TIMEOUT}s)。")
+            return
+
+    if proc.returncode != 0:
+        output = (proc.stderr or proc.stdout).strip().splitlines()
+        report.error(
+            "dry-run", f"镜像 {image} 试运行失败: {output[-1] if output else proc.returncode}"
+        )
+
+
+def _cache_key(mihomo_cfg: dict, compose_cfg: dict) -> str:
+    parts = [configs.dump_yaml(mihomo_cfg), configs.dump_yaml(compose_cfg)]
+    # 证书续期后需要重新检查；按天失效以便及时发现即将过期的证书
+    for listener in mihomo_cfg.get("listeners") or []:
+        for key in ("certificate", "private-key"):
+            path = listener.get(key) if isinstance(listener, dict) else None
+            try:
+                st = os.stat(path) if path else None
+                parts.append(f"{path}:{st.st_mtime_ns}:{st.st_size}" if st else "")
+            except OSError:
+                parts.append(f"{path}:missing")
+    parts.append(time.strftime("%Y-%m-%d"))
+    return configs.content_hash("\n".join(parts))
+
+
+def _cache_path() -> Path:
+    return constants.CACHE_DIR / "preflight.json"
+
+
+def _load_cache() -> dict:
+    try:
+        return json.loads(_cache_path().read_text(encoding="utf8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_cache(key: str, report: Report):
+    cache = _load_cache()
+    cache[key] = {"time": time.time(), "issues": [asdict(i) for i in report.issues]}
+    # 只保留最近的记录
+    recent = sorted(cache.items(), key=lambda kv: kv[1]["time"])[-32:]
+    journal.atomic_write(_cache_path(), json.dumps(dict(recent)), mode=0o600)
+
+
+def preflight(
+    mihomo_cfg: dict,
+    compose_cfg: dict,
+    *,
+    dry_run: bool = False,
+    running_cfg: Optional[dict] = None,
+    runtime=None,
+) -> Report:
+    """
+    预检候选配置。
+    :param mihomo_cfg: 候选 Mihomo 配置
+    :param compose_cfg: 候选 docker-compose 配置
+    :param dry_run: 是否在一次性容器中试运行新镜像
+    :param running_cfg: 当前正在运行的 Mihomo 配置，其端口在绑定检查中视为可用
+    :param runtime: 运行时后端，试运行由其执行；默认在一次性容器中试运行
+    """
+    key = _cache_key(mihomo_cfg, compose_cfg)
+    cached = _load_cache().get(key)
+
+    if cached is not None:
+        report = Report(issues=[Issue(**i) for i in cached["issues"]], cached=True)
+    else:
+        report = Report()
+        check_mihomo_schema(mihomo_cfg, report)
+        check_compose_schema(compose_cfg, report)
+        check_certificates(mihomo_cfg, report)
+        _save_cache(key, report)
+
+    # 试运行的结果取决于标签当前指向的镜像与 docker 环境，失败也可能只是暂时的，不缓存
+    if dry_run and report.ok:
+        image = compose_cfg["services"][COMPOSE_SERVICE_NAME]["image"]
+        if runtime is not None:
+            runtime.dry_run(image, configs.dump_yaml(mihomo_cfg), report)
+        else:
+            dry_run_image(image, configs.dump_yaml(mihomo_cfg), report)
+
+    # 端口占用是瞬时状态，始终实时检查（开销仅为一次 bind 调用）
+    allow_ports = frozenset(
+        listener.get("port")
+        for listener in ((running_cfg or {}).get("listeners") or [])
+        if isinstance(listener, dict)
+    )
+    check_udp_ports(mihomo_cfg, report, allow_ports)
+    return report
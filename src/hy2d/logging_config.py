@@ -2,11 +2,20 @@
 
 import logging
 
-from rich.logging import RichHandler
 
+def setup_logging(structured: bool = False):
+    """
+    配置全局日志记录器。
+    structured 为 True 时 (--output json|yaml) 不加载 rich，只收集 WARNING 及以上的日志。
+    """
+    if structured:
+        from hy2d.core.output import CollectingHandler
+
+        logging.basicConfig(level=logging.WARNING, handlers=[CollectingHandler()])
+        return
+
+    from rich.logging import RichHandler
 
-def setup_logging():
-    """配置全局日志记录器"""
     logging.basicConfig(
         level=logging.INFO,
         format="%(message)s",
@@ -1,10 +1,35 @@
 """heyhy 服务管理脚本 - 主入口"""
 
+import logging
+import sys
 from importlib import metadata
+from pathlib import Path
+from typing import Annotated, Optional
 
 import typer
 
-from hy2d.cli import install, log, remove, start, stop, update, check, self_
+from hy2d.cli import (
+    install,
+    log,
+    remove,
+    start,
+    stop,
+    update,
+    check,
+    self_,
+    fleet,
+    apply,
+    rollback,
+    validate,
+    cert,
+    subscribe,
+    links,
+    probe,
+    masquerade,
+    capacity,
+    prefetch,
+)
+from hy2d.core import output, tracing
 from hy2d.logging_config import setup_logging
 
 app = typer.Typer(
@@ -16,11 +41,52 @@ app = typer.Typer(
 
 
 @app.callback(invoke_without_command=True)
-def main(ctx: typer.Context):
+def main(
+    ctx: typer.Context,
+    profile: Annotated[
+        bool, typer.Option("--profile", help="结束时输出各步骤、命令与网络请求的耗时分解")
+    ] = False,
+    trace_file: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--trace-file", help="将追踪数据写出为 Chrome trace-event JSON (隐含 --profile)"
+        ),
+    ] = None,
+    output_format: Annotated[
+        str,
+        typer.Option(
+            "--output",
+            help="输出格式: text | json | yaml。json/yaml 时每次运行只输出一份结构化文档",
+        ),
+    ] = "text",
+):
     """
     mihomo-hysteria2-inbound manager
     """
-    setup_logging()
+    try:
+        output.configure(output_format)
+    except ValueError as e:
+        raise typer.BadParameter(str(e), param_hint="--output") from None
+    setup_logging(structured=output.structured())
+    if output.structured():
+        # 子命令以 sys.exit 退出时 click 同样会关闭上下文，失败的运行也能输出文档；
+        # 此时正在传播的异常即为结束运行的原因，由它得到退出码
+        ctx.call_on_close(
+            lambda: output.flush(
+                ctx.invoked_subcommand or "heyhy", output.exit_code(sys.exc_info()[1])
+            )
+        )
+
+    if profile or trace_file:
+        tracing.enable()
+        root = tracing.span(ctx.invoked_subcommand or "heyhy", "cli")
+        root.__enter__()
+
+        def report():
+            root.__exit__(None, None, None)
+            _print_profile(trace_file)
+
+        ctx.call_on_close(report)
 
     # 如果没有提供子命令，显示帮助信息
     if ctx.invoked_subcommand is None:
@@ -28,6 +94,20 @@ def main(ctx: typer.Context):
         ctx.exit(0)
 
 
+def _print_profile(trace_file: Optional[Path]):
+    typer.echo("\n--- profile ---", err=True)
+    for line in tracing.render_flame():
+        typer.echo(line, err=True)
+    totals = tracing.summarize_by_category()
+    if totals:
+        typer.echo(
+            "按类别汇总: " + ", ".join(f"{k} {v * 1000:.1f}ms" for k, v in totals.items()), err=True
+        )
+    if trace_file:
+        tracing.write_chrome_trace(trace_file)
+        typer.echo(f"追踪数据已写入 {trace_file}", err=True)
+
+
 @app.command()
 def version():
     """
@@ -35,9 +115,16 @@ def version():
     """
     try:
         v = metadata.version("heyhy")
+        if output.structured():
+            output.emit("version", v)
+            return
         typer.echo(f"heyhy version {v}")
     except metadata.PackageNotFoundError:
-        typer.echo("Could not determine version. Is heyhy installed as a package?")
+        message = "Could not determine version. Is heyhy installed as a package?"
+        if output.structured():
+            logging.error(message)
+        else:
+            typer.echo(message)
         raise typer.Exit(code=1)
 
 
@@ -50,6 +137,17 @@ app.add_typer(start.app, name="start")
 app.add_typer(stop.app, name="stop")
 app.add_typer(update.app, name="update")
 app.add_typer(check.app, name="check")
+app.add_typer(fleet.app, name="fleet")
+app.add_typer(apply.app, name="apply")
+app.add_typer(rollback.app, name="rollback")
+app.add_typer(validate.app, name="validate")
+app.add_typer(cert.app, name="cert")
+app.add_typer(subscribe.app, name="subscribe")
+app.add_typer(links.app, name="links")
+app.add_typer(probe.app, name="probe")
+app.add_typer(masquerade.app, name="masquerade")
+app.add_typer(capacity.app, name="capacity")
+app.add_typer(prefetch.app, name="prefetch")
 
 if __name__ == "__main__":
     app()